@@ -6,111 +6,23 @@ This client communicates with the C++ server via UDP to manage facility bookings
 It provides a text-based console interface for users.
 
 Usage: python3 client.py <server_ip> <server_port>
+       python3 client.py <server_ip> <server_port> stats [--watch [interval]]
 """
 
+import os
 import socket
-import struct
 import sys
 import time
-from typing import List, Tuple, Optional
 from datetime import datetime, timedelta
+from typing import Optional
 
-# Message type constants (must match server)
-MSG_QUERY_AVAILABILITY = 1
-MSG_BOOK_FACILITY = 2
-MSG_CHANGE_BOOKING = 3
-MSG_MONITOR_FACILITY = 4
-MSG_GET_LAST_BOOKING_TIME = 5
-MSG_EXTEND_BOOKING = 6
-MSG_RESPONSE_SUCCESS = 100
-MSG_RESPONSE_ERROR = 101
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Booking operation types (for monitor notifications)
-OP_BOOK = 1
-OP_CHANGE = 2
-OP_EXTEND = 3
-
-# Network constants
-TIMEOUT_SECONDS = 3
-MAX_RETRIES = 3
-MAX_BUFFER_SIZE = 65507
-
-
-class ByteBuffer:
-    """Helper class for marshalling and unmarshalling data."""
-    
-    def __init__(self, data: bytes = b''):
-        self.buffer = bytearray(data)
-        self.read_pos = 0
-    
-    # Write operations
-    def write_uint8(self, val: int):
-        """Write an 8-bit unsigned integer."""
-        self.buffer.append(val & 0xFF)
-    
-    def write_uint16(self, val: int):
-        """Write a 16-bit unsigned integer in network byte order."""
-        self.buffer.extend(struct.pack('!H', val))
-    
-    def write_uint32(self, val: int):
-        """Write a 32-bit unsigned integer in network byte order."""
-        self.buffer.extend(struct.pack('!I', val))
-    
-    def write_time(self, val: int):
-        """Write a time_t value (as 32-bit unsigned int)."""
-        self.write_uint32(val)
-    
-    def write_string(self, s: str):
-        """Write a length-prefixed string."""
-        encoded = s.encode('utf-8')
-        self.write_uint16(len(encoded))
-        self.buffer.extend(encoded)
-    
-    # Read operations
-    def read_uint8(self) -> int:
-        """Read an 8-bit unsigned integer."""
-        if self.read_pos >= len(self.buffer):
-            raise ValueError("Buffer underflow")
-        val = self.buffer[self.read_pos]
-        self.read_pos += 1
-        return val
-    
-    def read_uint16(self) -> int:
-        """Read a 16-bit unsigned integer from network byte order."""
-        if self.read_pos + 2 > len(self.buffer):
-            raise ValueError("Buffer underflow")
-        val = struct.unpack('!H', self.buffer[self.read_pos:self.read_pos + 2])[0]
-        self.read_pos += 2
-        return val
-    
-    def read_uint32(self) -> int:
-        """Read a 32-bit unsigned integer from network byte order."""
-        if self.read_pos + 4 > len(self.buffer):
-            raise ValueError("Buffer underflow")
-        val = struct.unpack('!I', self.buffer[self.read_pos:self.read_pos + 4])[0]
-        self.read_pos += 4
-        return val
-    
-    def read_time(self) -> int:
-        """Read a time_t value (as 32-bit unsigned int)."""
-        return self.read_uint32()
-    
-    def read_string(self) -> str:
-        """Read a length-prefixed string."""
-        length = self.read_uint16()
-        if self.read_pos + length > len(self.buffer):
-            raise ValueError("Buffer underflow")
-        s = self.buffer[self.read_pos:self.read_pos + length].decode('utf-8')
-        self.read_pos += length
-        return s
-    
-    def get_data(self) -> bytes:
-        """Get the complete buffer as bytes."""
-        return bytes(self.buffer)
-    
-    def remaining(self) -> int:
-        """Get the number of unread bytes."""
-        return len(self.buffer) - self.read_pos
+from common.protocol import encode_request, decode_response, decode_notification, availability_slots
+from common.network_client import NetworkClient
+from common.server_stats import fetch_stats, format_stats, watch, StatsDelta
+from common.message_types import *
 
 
 class FacilityBookingClient:
@@ -120,44 +32,18 @@ class FacilityBookingClient:
         self.server_ip = server_ip
         self.server_port = server_port
         self.drop_rate = drop_rate
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.settimeout(TIMEOUT_SECONDS)
-        self.next_request_id = 1
-        
+        self.network = NetworkClient(server_ip, server_port, drop_rate)
+    
     def _get_next_request_id(self) -> int:
         """Get the next request ID and increment counter."""
-        request_id = self.next_request_id
-        self.next_request_id += 1
-        return request_id
+        return self.network.get_next_request_id()
     
     def _send_request(self, request_data: bytes, retries: int = MAX_RETRIES) -> Optional[bytes]:
         """
         Send a request to the server and wait for a response.
         Implements retry logic for at-least-once semantics.
         """
-        import random
-        
-        for attempt in range(retries):
-            try:
-                # Simulate packet drop on client side by not sending
-                if random.random() < self.drop_rate:
-                    print(f"[DROP] Request packet dropped (attempt {attempt + 1}/{retries})")
-                    # Fall through to timeout
-                else:
-                    # Send request
-                    self.sock.sendto(request_data, (self.server_ip, self.server_port))
-                
-                # Wait for response
-                response_data, _ = self.sock.recvfrom(MAX_BUFFER_SIZE)
-                return response_data
-                
-            except socket.timeout:
-                print(f"Timeout, retransmitting... (attempt {attempt + 2}/{retries})")
-                if attempt >= retries - 1:
-                    print("Request timeout after all retries")
-                    return None
-        
-        return None
+        return self.network.send_request(request_data, retries)
     
     def query_availability(self):
         """Query facility availability for specific days."""
@@ -173,44 +59,29 @@ class FacilityBookingClient:
             return
         
         # Build request
-        request = ByteBuffer()
-        request_id = self._get_next_request_id()
-        request.write_uint32(request_id)
-        request.write_uint8(MSG_QUERY_AVAILABILITY)
-        
-        # Build payload first to calculate length
-        payload = ByteBuffer()
-        payload.write_string(facility_name)
-        payload.write_uint16(len(days))
-        for day in days:
-            payload.write_uint32(day)
-        
-        request.write_uint16(len(payload.buffer))
-        request.buffer.extend(payload.buffer)
+        request_data = encode_request(MSG_QUERY_AVAILABILITY, self._get_next_request_id(),
+                                      facility_name=facility_name, days=days,
+                                      availability_format=AVAILABILITY_FORMAT_BITMAP)
         
         # Send request
-        response_data = self._send_request(request.get_data())
+        response_data = self._send_request(request_data)
         if not response_data:
             return
         
         # Parse response
-        response = ByteBuffer(response_data)
-        resp_request_id = response.read_uint32()
-        status = response.read_uint8()
+        response = decode_response(MSG_QUERY_AVAILABILITY, response_data)
         
-        if status == MSG_RESPONSE_ERROR:
-            error_msg = response.read_string()
+        if not response.ok:
+            error_msg = response.error
             print(f"Error: {error_msg}")
             return
         
         # Read available time slots
-        num_slots = response.read_uint16()
+        times = availability_slots(response)
+        num_slots = len(times) // 2
         print(f"\n{num_slots} available time slots found:")
         
-        for i in range(num_slots):
-            start_time = response.read_time()
-            end_time = response.read_time()
-            
+        for i, (start_time, end_time) in enumerate(zip(times[::2], times[1::2])):
             start_dt = datetime.fromtimestamp(start_time)
             end_dt = datetime.fromtimestamp(end_time)
             
@@ -242,36 +113,25 @@ class FacilityBookingClient:
             return
         
         # Build request
-        request = ByteBuffer()
-        request_id = self._get_next_request_id()
-        request.write_uint32(request_id)
-        request.write_uint8(MSG_BOOK_FACILITY)
-        
-        payload = ByteBuffer()
-        payload.write_string(facility_name)
-        payload.write_time(start_time)
-        payload.write_time(end_time)
-        
-        request.write_uint16(len(payload.buffer))
-        request.buffer.extend(payload.buffer)
+        request_data = encode_request(MSG_BOOK_FACILITY, self._get_next_request_id(),
+                                      facility_name=facility_name, start_time=start_time,
+                                      end_time=end_time)
         
         # Send request
-        response_data = self._send_request(request.get_data())
+        response_data = self._send_request(request_data)
         if not response_data:
             return
         
         # Parse response
-        response = ByteBuffer(response_data)
-        resp_request_id = response.read_uint32()
-        status = response.read_uint8()
+        response = decode_response(MSG_BOOK_FACILITY, response_data)
         
-        if status == MSG_RESPONSE_ERROR:
-            error_msg = response.read_string()
+        if not response.ok:
+            error_msg = response.error
             print(f"Error: {error_msg}")
             return
         
         # Read confirmation ID
-        confirmation_id = response.read_uint32()
+        confirmation_id = response.booking_id
         print(f"\n✓ Booking successful!")
         print(f"  Confirmation ID: {confirmation_id}")
         print(f"  Facility: {facility_name}")
@@ -289,34 +149,23 @@ class FacilityBookingClient:
             return
         
         # Build request
-        request = ByteBuffer()
-        request_id = self._get_next_request_id()
-        request.write_uint32(request_id)
-        request.write_uint8(MSG_CHANGE_BOOKING)
-        
-        payload = ByteBuffer()
-        payload.write_uint32(confirmation_id)
-        payload.write_uint32(offset_minutes & 0xFFFFFFFF)  # Handle negative as unsigned
-        
-        request.write_uint16(len(payload.buffer))
-        request.buffer.extend(payload.buffer)
+        request_data = encode_request(MSG_CHANGE_BOOKING, self._get_next_request_id(),
+                                      booking_id=confirmation_id, offset_minutes=offset_minutes)
         
         # Send request
-        response_data = self._send_request(request.get_data())
+        response_data = self._send_request(request_data)
         if not response_data:
             return
         
         # Parse response
-        response = ByteBuffer(response_data)
-        resp_request_id = response.read_uint32()
-        status = response.read_uint8()
+        response = decode_response(MSG_CHANGE_BOOKING, response_data)
         
-        if status == MSG_RESPONSE_ERROR:
-            error_msg = response.read_string()
+        if not response.ok:
+            error_msg = response.error
             print(f"Error: {error_msg}")
             return
         
-        message = response.read_string()
+        message = response.message
         print(f"\n✓ {message}")
     
     def monitor_facility(self):
@@ -332,34 +181,24 @@ class FacilityBookingClient:
             return
         
         # Build request
-        request = ByteBuffer()
-        request_id = self._get_next_request_id()
-        request.write_uint32(request_id)
-        request.write_uint8(MSG_MONITOR_FACILITY)
-        
-        payload = ByteBuffer()
-        payload.write_string(facility_name)
-        payload.write_uint32(duration_seconds)
-        
-        request.write_uint16(len(payload.buffer))
-        request.buffer.extend(payload.buffer)
+        request_data = encode_request(MSG_MONITOR_FACILITY, self._get_next_request_id(),
+                                      facility_name=facility_name, duration_seconds=duration_seconds,
+                                      availability_format=AVAILABILITY_FORMAT_BITMAP)
         
         # Send request
-        response_data = self._send_request(request.get_data())
+        response_data = self._send_request(request_data)
         if not response_data:
             return
         
         # Parse response
-        response = ByteBuffer(response_data)
-        resp_request_id = response.read_uint32()
-        status = response.read_uint8()
+        response = decode_response(MSG_MONITOR_FACILITY, response_data)
         
-        if status == MSG_RESPONSE_ERROR:
-            error_msg = response.read_string()
+        if not response.ok:
+            error_msg = response.error
             print(f"Error: {error_msg}")
             return
         
-        message = response.read_string()
+        message = response.message
         print(f"\n✓ {message}")
         print(f"Monitoring for {duration_seconds} seconds...")
         print("(Waiting for updates from server...)")
@@ -367,7 +206,7 @@ class FacilityBookingClient:
         
         # Listen for updates
         start_time_monitor = time.time()
-        self.sock.settimeout(1.0)  # Short timeout for checking elapsed time
+        self.network.sock.settimeout(1.0)  # Short timeout for checking elapsed time
         update_count = 0
         consecutive_timeouts = 0  # Track consecutive timeouts to detect connection issues
         processed_updates = set()  # Track processed updates to avoid duplicates
@@ -375,19 +214,17 @@ class FacilityBookingClient:
         try:
             while time.time() - start_time_monitor < duration_seconds:
                 try:
-                    update_data, _ = self.sock.recvfrom(MAX_BUFFER_SIZE)
+                    update_data, _ = self.network.sock.recvfrom(MAX_BUFFER_SIZE)
                     
                     # Parse update (server-initiated messages have request_id = 0)
-                    update = ByteBuffer(update_data)
-                    update_request_id = update.read_uint32()
-                    update_status = update.read_uint8()
+                    update = decode_notification(update_data)
                     
-                    if update_status == MSG_RESPONSE_SUCCESS:
-                        update_msg = update.read_string()
-                        operation = update.read_uint8()
-                        booking_id = update.read_uint32()
-                        start_time_slot = update.read_time()
-                        end_time_slot = update.read_time()
+                    if update.ok:
+                        update_msg = update.message
+                        operation = update.operation
+                        booking_id = update.booking_id
+                        start_time_slot = update.start_time
+                        end_time_slot = update.end_time
                         
                         # Check for duplicate updates
                         update_key = (booking_id, operation, start_time_slot, end_time_slot)
@@ -407,9 +244,9 @@ class FacilityBookingClient:
                         print(f"  Time Slot:  {start_dt.strftime('%Y-%m-%d %H:%M')} to {end_dt.strftime('%H:%M')}")
                         
                         # For change/extend operations, show old times
-                        if operation == 2 or operation == 3:  # OP_CHANGE or OP_EXTEND
-                            old_start_time = update.read_time()
-                            old_end_time = update.read_time()
+                        if operation == OP_CHANGE or operation == OP_EXTEND:
+                            old_start_time = update.old_start_time
+                            old_end_time = update.old_end_time
                             
                             old_start_dt = datetime.fromtimestamp(old_start_time)
                             old_end_dt = datetime.fromtimestamp(old_end_time)
@@ -421,7 +258,7 @@ class FacilityBookingClient:
                 except socket.timeout:
                     consecutive_timeouts += 1
                     if consecutive_timeouts >= 10:
-                        response_data = self._send_request(request.get_data())
+                        response_data = self._send_request(request_data)
                         if response_data:
                             # Parse response if needed, but for monitor, just continue
                             pass
@@ -437,7 +274,7 @@ class FacilityBookingClient:
             print("\n\nMonitoring interrupted by user")
         
         print(f"\nMonitoring period ended. Received {update_count} update(s).")
-        self.sock.settimeout(TIMEOUT_SECONDS)  # Restore original timeout
+        self.network.sock.settimeout(TIMEOUT_SECONDS)  # Restore original timeout
     
     def get_last_booking_time(self):
         """Get the last booking time for a facility (idempotent operation)."""
@@ -446,34 +283,24 @@ class FacilityBookingClient:
         facility_name = input("Enter facility name: ").strip()
         
         # Build request
-        request = ByteBuffer()
-        request_id = self._get_next_request_id()
-        request.write_uint32(request_id)
-        request.write_uint8(MSG_GET_LAST_BOOKING_TIME)
-        
-        payload = ByteBuffer()
-        payload.write_string(facility_name)
-        
-        request.write_uint16(len(payload.buffer))
-        request.buffer.extend(payload.buffer)
+        request_data = encode_request(MSG_GET_LAST_BOOKING_TIME, self._get_next_request_id(),
+                                      facility_name=facility_name)
         
         # Send request
-        response_data = self._send_request(request.get_data())
+        response_data = self._send_request(request_data)
         if not response_data:
             return
         
         # Parse response
-        response = ByteBuffer(response_data)
-        resp_request_id = response.read_uint32()
-        status = response.read_uint8()
+        response = decode_response(MSG_GET_LAST_BOOKING_TIME, response_data)
         
-        if status == MSG_RESPONSE_ERROR:
-            error_msg = response.read_string()
+        if not response.ok:
+            error_msg = response.error
             print(f"Error: {error_msg}")
             return
         
-        last_time = response.read_time()
-        message = response.read_string()
+        last_time = response.last_time
+        message = response.message
         
         if last_time == 0:
             print(f"\n{message}")
@@ -494,40 +321,48 @@ class FacilityBookingClient:
             return
         
         # Build request
-        request = ByteBuffer()
-        request_id = self._get_next_request_id()
-        request.write_uint32(request_id)
-        request.write_uint8(MSG_EXTEND_BOOKING)
-        
-        payload = ByteBuffer()
-        payload.write_uint32(confirmation_id)
-        payload.write_uint32(minutes_to_extend)
-        
-        request.write_uint16(len(payload.buffer))
-        request.buffer.extend(payload.buffer)
+        request_data = encode_request(MSG_EXTEND_BOOKING, self._get_next_request_id(),
+                                      booking_id=confirmation_id,
+                                      minutes_to_extend=minutes_to_extend)
         
         # Send request
-        response_data = self._send_request(request.get_data())
+        response_data = self._send_request(request_data)
         if not response_data:
             return
         
         # Parse response
-        response = ByteBuffer(response_data)
-        resp_request_id = response.read_uint32()
-        status = response.read_uint8()
+        response = decode_response(MSG_EXTEND_BOOKING, response_data)
         
-        if status == MSG_RESPONSE_ERROR:
-            error_msg = response.read_string()
+        if not response.ok:
+            error_msg = response.error
             print(f"Error: {error_msg}")
             return
         
-        new_end_time = response.read_time()
-        message = response.read_string()
+        new_end_time = response.new_end_time
+        message = response.message
         
         new_end_dt = datetime.fromtimestamp(new_end_time)
         print(f"\n✓ {message}")
         print(f"  New end time: {new_end_dt.strftime('%Y-%m-%d %H:%M:%S')}")
     
+    def show_stats(self, watch_interval: Optional[float] = None):
+        """Show the server's live metrics, once or every watch_interval seconds."""
+        if watch_interval is not None:
+            try:
+                watch(self.network, watch_interval)
+            except KeyboardInterrupt:
+                print()
+            return
+
+        print("\n=== Server Statistics ===")
+        response = fetch_stats(self.network)
+        if response is None:
+            return
+        if not response.ok:
+            print(f"Error: {response.error}")
+            return
+        print(format_stats(StatsDelta(response)))
+    
     def run(self):
         """Main client loop with menu interface."""
         print("=" * 60)
@@ -544,10 +379,11 @@ class FacilityBookingClient:
             print("  4. Monitor a facility")
             print("  5. Get last booking time (idempotent)")
             print("  6. Extend booking (non-idempotent)")
-            print("  7. Exit")
+            print("  7. Server statistics")
+            print("  8. Exit")
             print("=" * 60)
             
-            choice = input("Enter your choice (1-7): ").strip()
+            choice = input("Enter your choice (1-8): ").strip()
             
             try:
                 if choice == '1':
@@ -563,6 +399,8 @@ class FacilityBookingClient:
                 elif choice == '6':
                     self.extend_booking()
                 elif choice == '7':
+                    self.show_stats()
+                elif choice == '8':
                     print("\nGoodbye!")
                     break
                 else:
@@ -572,7 +410,7 @@ class FacilityBookingClient:
                 import traceback
                 traceback.print_exc()
         
-        self.sock.close()
+        self.network.close()
 
 
 def main():
@@ -580,6 +418,9 @@ def main():
     server_ip = "8.148.159.175"
     server_port = 8080
     drop_rate = 0.0
+    stats = False
+    watch_interval = None
+    usage = "Usage: python cli_client.py [server_ip] [server_port] [--drop-rate rate] [stats [--watch [interval]]]"
     
     # Parse command line arguments
     i = 1
@@ -599,9 +440,25 @@ def main():
             else:
                 print("Error: --drop-rate requires a value")
                 return
+        elif arg == "stats":
+            stats = True
+            i += 1
+        elif arg == "--watch" and stats:
+            watch_interval = 2.0
+            if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("--"):
+                try:
+                    watch_interval = float(sys.argv[i + 1])
+                    if watch_interval <= 0.0:
+                        print("Error: watch interval must be positive")
+                        return
+                    i += 1
+                except ValueError:
+                    print("Error: watch interval must be a number")
+                    return
+            i += 1
         elif arg.startswith("--"):
             print(f"Unknown option: {arg}")
-            print("Usage: python cli_client.py [server_ip] [server_port] [--drop-rate rate]")
+            print(usage)
             return
         else:
             # Positional arguments
@@ -615,7 +472,7 @@ def main():
                     return
             else:
                 print("Too many positional arguments")
-                print("Usage: python cli_client.py [server_ip] [server_port] [--drop-rate rate]")
+                print(usage)
                 return
             i += 1
     
@@ -624,6 +481,10 @@ def main():
         print(f"Packet drop rate: {drop_rate}")
     
     client = FacilityBookingClient(server_ip, server_port, drop_rate)
+    if stats:
+        client.show_stats(watch_interval)
+        client.network.close()
+        return
     client.run()
 
 
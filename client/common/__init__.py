@@ -5,5 +5,11 @@ Common package initialization
 from .byte_buffer import ByteBuffer
 from .message_types import *
 from .network_client import NetworkClient
+from .async_network_client import AsyncNetworkClient
+from .protocol import encode_request, decode_response, decode_notification
+from .batch import BatchRequest, parse_batch_response
+from .server_stats import fetch_stats, StatsDelta
 
-__all__ = ['ByteBuffer', 'NetworkClient']
+__all__ = ['ByteBuffer', 'NetworkClient', 'AsyncNetworkClient',
+           'encode_request', 'decode_response', 'decode_notification',
+           'BatchRequest', 'parse_batch_response', 'fetch_stats', 'StatsDelta']
@@ -0,0 +1,208 @@
+"""
+Async Network Client
+Handles concurrent UDP communication with server over a single socket
+"""
+
+import asyncio
+import random
+import struct
+import time
+from typing import Callable, Dict, Optional
+from .byte_buffer import with_options
+from .completion_tracker import CompletionTracker
+from .message_types import MAX_RETRIES, RTO_JITTER
+from .network_client import NetworkClient
+from .rtt_estimator import RttEstimator, RetryBudget, get_estimator
+
+
+class _ClientProtocol(asyncio.DatagramProtocol):
+    """Datagram protocol that forwards every response to its client."""
+
+    def __init__(self, client: 'AsyncNetworkClient'):
+        self.client = client
+
+    def datagram_received(self, data: bytes, addr):
+        self.client._dispatch_response(data)
+
+    def error_received(self, exc: Exception):
+        # ICMP errors (e.g. port unreachable) are treated like packet loss;
+        # pending requests will time out and retransmit.
+        pass
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self.client._fail_pending(exc or ConnectionError("Socket closed"))
+
+
+class AsyncNetworkClient:
+    """
+    Handles network communication with the server using asyncio.
+
+    Many requests can be in flight at once on one socket. Responses are
+    matched to their requests by the leading request_id, so callers can
+    simply gather many send_request() coroutines.
+    """
+
+    def __init__(self, server_ip: str, server_port: int, drop_rate: float = 0.0,
+                 notification_handler: Optional[Callable[[bytes], None]] = None):
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.drop_rate = drop_rate  # Packet drop rate (0.0-1.0)
+        self.notification_handler = notification_handler  # Called for request_id 0
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        # Created on first use, inside the event loop
+        self.connect_lock: Optional[asyncio.Lock] = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.next_request_id = 1
+        self.completions = CompletionTracker()
+        # Shared by all clients talking to the same server
+        self.rtt: RttEstimator = get_estimator(server_ip, server_port)
+        # Not shared: one client's retransmits must not starve the others
+        self.retry_budget = RetryBudget()
+
+    async def connect(self):
+        """
+        Create the datagram endpoint connected to the server, unless it
+        exists already. Concurrent first requests share one endpoint.
+        """
+        if self.connect_lock is None:
+            self.connect_lock = asyncio.Lock()
+        async with self.connect_lock:
+            if self.transport is not None:
+                return
+            loop = asyncio.get_running_loop()
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: _ClientProtocol(self),
+                remote_addr=(self.server_ip, self.server_port))
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def get_next_request_id(self) -> int:
+        """Get the next request ID and increment counter."""
+        request_id = self.next_request_id
+        self.next_request_id += 1
+        return request_id
+
+    async def send_request(self, request_data: bytes, retries: int = MAX_RETRIES,
+                           timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Send a request to the server and wait for its matching response.
+        Retransmits on timeout; other requests may be in flight concurrently.
+        Each transmission carries the attempt's timeout as a deadline and
+        acknowledges the requests this client has finished with. A "server
+        busy" reply is resent after its retry-after hint, without charging
+        the retry budget or the RTO.
+
+        Args:
+            request_data: The request data to send (starts with its request_id)
+            retries: Number of retry attempts
+            timeout: Optional fixed timeout in seconds per attempt (adaptive if None)
+        """
+        if self.transport is None:
+            await self.connect()
+
+        request_id = struct.unpack_from('!I', request_data)[0]
+        if request_id in self.pending:
+            raise ValueError(f"Request ID {request_id} already in flight")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending[request_id] = future
+        transmissions = 0
+        server_busy = False  # Last attempt was refused with a retry-after hint
+        self.retry_budget.on_request()
+        self.completions.start(request_id)
+
+        try:
+            for attempt in range(retries):
+                if transmissions > 0 and not server_busy and not self.retry_budget.try_retry():
+                    print(f"Retry budget exhausted, giving up on request {request_id}")
+                    return None
+
+                wait_time = timeout if timeout is not None else self.rtt.next_timeout()
+
+                # Simulate request packet drop
+                if random.random() < self.drop_rate:
+                    print(f"[DROP] Request {request_id} dropped (attempt {attempt + 1}/{retries})")
+                else:
+                    self.transport.sendto(with_options(request_data, wait_time,
+                                                      self.completions.acked_through()))
+                transmissions += 1
+
+                sent_at = time.monotonic()
+                try:
+                    # shield() keeps the future alive across retransmits
+                    response_data = await asyncio.wait_for(asyncio.shield(future), wait_time)
+                except asyncio.TimeoutError:
+                    server_busy = False
+                    if timeout is None:
+                        self.rtt.on_timeout()
+                    if attempt < retries - 1:
+                        print(f"Timeout for request {request_id}, retrying... (attempt {attempt + 2}/{retries})")
+                    else:
+                        print(f"Request {request_id} timeout after all retries")
+                    continue
+
+                retry_after = NetworkClient._busy_retry_after(response_data)
+                if retry_after is not None:
+                    server_busy = True
+                    # The busy reply resolved this future; the resend needs a fresh one
+                    future = loop.create_future()
+                    self.pending[request_id] = future
+                    if attempt < retries - 1:
+                        print(f"Server busy, retrying request {request_id} in {retry_after * 1000:.0f} ms "
+                              f"(attempt {attempt + 2}/{retries})")
+                        await asyncio.sleep(retry_after * (1 + random.random() * RTO_JITTER))
+                    else:
+                        print(f"Server busy after all retries for request {request_id}")
+                    continue
+
+                # Karn's rule: a reply to a retransmitted request is ambiguous
+                if transmissions == 1:
+                    self.rtt.add_sample(time.monotonic() - sent_at)
+                return response_data
+
+            return None
+        finally:
+            self.completions.finish(request_id)
+            self.pending.pop(request_id, None)
+            if not future.done():
+                future.cancel()
+
+    def get_rtt_stats(self) -> dict:
+        """Get a snapshot of the server's RTT estimator and this client's retry budget."""
+        return {**self.rtt.snapshot(), **self.retry_budget.snapshot()}
+
+    def _dispatch_response(self, data: bytes):
+        """Route an incoming datagram to the request waiting for it."""
+        if len(data) < 4:
+            return
+
+        request_id = struct.unpack_from('!I', data)[0]
+        if request_id == 0:
+            # Server-initiated monitor notification
+            if self.notification_handler:
+                self.notification_handler(data)
+            return
+
+        future = self.pending.get(request_id)
+        if future is not None and not future.done():
+            future.set_result(data)
+        # Otherwise a duplicate or late reply for a finished request: drop it
+
+    def _fail_pending(self, exc: Exception):
+        """Fail every outstanding request (socket closed)."""
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self.pending.clear()
+
+    def close(self):
+        """Close the socket."""
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
@@ -0,0 +1,121 @@
+"""
+Batch Request Builder
+Packs several operations into one MSG_BATCH datagram
+"""
+
+from typing import List, Tuple
+from .byte_buffer import ByteBuffer, REQUEST_OPTIONS_SIZE
+from .message_types import (MSG_BATCH, MSG_QUERY_AVAILABILITY, MSG_BOOK_FACILITY,
+                            MSG_CHANGE_BOOKING, MSG_EXTEND_BOOKING,
+                            MSG_GET_LAST_BOOKING_TIME, MSG_RESPONSE_SUCCESS,
+                            MAX_BUFFER_SIZE, MAX_BATCH_OPERATIONS)
+from .protocol import REQUEST_CODECS, RESPONSE_CODECS, Response
+
+# Operations the server accepts inside a batch
+BATCHABLE_TYPES = (MSG_QUERY_AVAILABILITY, MSG_BOOK_FACILITY, MSG_CHANGE_BOOKING,
+                   MSG_EXTEND_BOOKING, MSG_GET_LAST_BOOKING_TIME)
+
+# request_id + message type + payload length + operation count
+_BATCH_HEADER_SIZE = 4 + 1 + 2 + 2
+# Sub-request type + sub-payload length
+_SUB_HEADER_SIZE = 1 + 2
+
+
+class BatchRequest:
+    """
+    Builds a batch request holding several sub-requests.
+
+    The server executes the sub-requests in order and returns one response
+    holding a sub-response (status + payload) for each of them.
+    """
+
+    def __init__(self):
+        self.operations: List[Tuple[int, bytes]] = []
+        self.size = _BATCH_HEADER_SIZE
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def add(self, message_type: int, **fields) -> int:
+        """Append a sub-request and return its index in the batch."""
+        if message_type not in BATCHABLE_TYPES:
+            raise ValueError(f"Message type {message_type} cannot be batched")
+        if len(self.operations) >= MAX_BATCH_OPERATIONS:
+            raise ValueError(f"Batch already holds {MAX_BATCH_OPERATIONS} operations")
+        payload = ByteBuffer()
+        REQUEST_CODECS[message_type].encode_payload(payload, fields)
+        data = payload.get_data()
+        new_size = self.size + _SUB_HEADER_SIZE + len(data)
+        # Leave room for the request options sent after the payload
+        if new_size > MAX_BUFFER_SIZE - REQUEST_OPTIONS_SIZE:
+            raise ValueError("Batch exceeds maximum datagram size")
+        self.operations.append((message_type, data))
+        self.size = new_size
+        return len(self.operations) - 1
+
+    def add_query_availability(self, facility_name: str, days: List[int]) -> int:
+        """Add an availability query."""
+        return self.add(MSG_QUERY_AVAILABILITY, facility_name=facility_name, days=days)
+
+    def add_book_facility(self, facility_name: str, start_time: int, end_time: int) -> int:
+        """Add a booking."""
+        return self.add(MSG_BOOK_FACILITY, facility_name=facility_name,
+                        start_time=start_time, end_time=end_time)
+
+    def add_change_booking(self, booking_id: int, offset_minutes: int) -> int:
+        """Add a booking change (time offset in minutes, may be negative)."""
+        return self.add(MSG_CHANGE_BOOKING, booking_id=booking_id, offset_minutes=offset_minutes)
+
+    def add_extend_booking(self, booking_id: int, minutes_to_extend: int) -> int:
+        """Add a booking extension."""
+        return self.add(MSG_EXTEND_BOOKING, booking_id=booking_id,
+                        minutes_to_extend=minutes_to_extend)
+
+    def add_get_last_booking_time(self, facility_name: str) -> int:
+        """Add a last booking time query."""
+        return self.add(MSG_GET_LAST_BOOKING_TIME, facility_name=facility_name)
+
+    def build(self, request_id: int) -> memoryview:
+        """Marshal the batch into a complete request datagram."""
+        request = ByteBuffer().begin_message(request_id, MSG_BATCH)
+        request.write_uint16(len(self.operations))
+        for message_type, data in self.operations:
+            request.write_uint8(message_type)
+            request.write_uint16(len(data))
+            request.buffer.extend(data)
+        return request.finish()
+
+    def decode_response(self, data) -> List[Response]:
+        """
+        Decode a batch response into one typed response per sub-request,
+        in the order they were added. Sub-responses carry the batch's
+        request_id. Raises ValueError if the batch itself failed.
+        """
+        response = data if isinstance(data, ByteBuffer) else ByteBuffer.from_view(data)
+        request_id = response.read_uint32()
+        status = response.read_uint8()
+        if status != MSG_RESPONSE_SUCCESS:
+            raise ValueError(response.read_string() if response.remaining() >= 2 else "Batch failed")
+        return [RESPONSE_CODECS[message_type].decode_body(sub_response, request_id)
+                for (message_type, _), sub_response
+                in zip(self.operations, parse_batch_response(response))]
+
+
+def parse_batch_response(response: ByteBuffer) -> List[ByteBuffer]:
+    """
+    Split a batch response into its sub-responses.
+
+    The buffer must be positioned just after the top-level status byte.
+    Each returned ByteBuffer starts at its own status byte.
+    """
+    num_ops = response.read_uint16()
+    sub_responses = []
+    for _ in range(num_ops):
+        length = response.read_uint16()
+        if response.remaining() < length:
+            raise ValueError("Buffer underflow")
+        start = response.read_pos
+        # Views share the response's memory instead of copying each sub-response
+        sub_responses.append(ByteBuffer.from_view(memoryview(response.buffer)[start:start + length]))
+        response.read_pos += length
+    return sub_responses
@@ -3,6 +3,27 @@ Byte Buffer for Marshalling and Unmarshalling
 """
 
 import struct
+import sys
+from array import array
+from typing import Optional
+from .message_types import (SLOTS_PER_DAY, SLOT_DURATION_SECONDS, OPTION_NONE, OPTION_DEADLINE,
+                            OPTION_ACK, REQUEST_OPTION_SLOTS)
+
+# Precompiled network byte order codecs
+_UINT16 = struct.Struct('!H')
+_UINT32 = struct.Struct('!I')
+# Request header: request_id, message type, payload length
+_REQUEST_HEADER = struct.Struct('!IBH')
+_PAYLOAD_LENGTH_OFFSET = 5
+# Request option after the payload: option, value
+_REQUEST_OPTION = struct.Struct('!BI')
+# Bytes finish() reserves after the payload for with_options() to fill in
+REQUEST_OPTIONS_SIZE = REQUEST_OPTION_SLOTS * _REQUEST_OPTION.size
+
+# array typecode holding 32-bit unsigned values on this platform
+_UINT32_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+_UINT64_TYPECODE = 'Q'
+_NEEDS_BYTESWAP = sys.byteorder == 'little'
 
 
 class ByteBuffer:
@@ -11,6 +32,56 @@ class ByteBuffer:
     def __init__(self, data: bytes = b''):
         self.buffer = bytearray(data)
         self.read_pos = 0
+        self.frame_start = None  # Offset of the open request frame, if any
+    
+    @classmethod
+    def from_view(cls, data, length: Optional[int] = None) -> 'ByteBuffer':
+        """
+        Create a read-only buffer that decodes in place without copying.
+        
+        Accepts any bytes-like object, e.g. a bytearray filled by
+        socket.recvfrom_into(); length limits the view to the received bytes.
+        The underlying data must not change while the buffer is being read.
+        """
+        view = memoryview(data).cast('B')
+        if length is not None:
+            view = view[:length]
+        buf = cls.__new__(cls)
+        buf.buffer = view
+        buf.read_pos = 0
+        buf.frame_start = None
+        return buf
+    
+    # Request framing
+    def begin_message(self, request_id: int, message_type: int) -> 'ByteBuffer':
+        """
+        Start a request frame: write the header with a placeholder payload
+        length, then write the payload directly after it and call finish().
+        """
+        self.frame_start = len(self.buffer)
+        self.buffer.extend(_REQUEST_HEADER.pack(request_id, message_type, 0))
+        return self
+    
+    def finish(self) -> memoryview:
+        """
+        Back-patch the payload length of the open frame in place and return
+        a view of the complete request (no copy).
+        
+        The view ends with REQUEST_OPTIONS_SIZE bytes of padding options
+        (outside the payload length), which with_options() overwrites in
+        place on each transmission. The buffer cannot grow while the
+        returned view is alive.
+        """
+        if self.frame_start is None:
+            raise ValueError("No message in progress")
+        payload_length = len(self.buffer) - self.frame_start - _REQUEST_HEADER.size
+        if payload_length > 0xFFFF:
+            raise ValueError("Payload too large")
+        _UINT16.pack_into(self.buffer, self.frame_start + _PAYLOAD_LENGTH_OFFSET, payload_length)
+        self.buffer.extend(bytes(REQUEST_OPTIONS_SIZE))  # OPTION_NONE slots
+        frame = memoryview(self.buffer)[self.frame_start:]
+        self.frame_start = None
+        return frame
     
     # Write operations
     def write_uint8(self, val: int):
@@ -19,11 +90,11 @@ class ByteBuffer:
     
     def write_uint16(self, val: int):
         """Write a 16-bit unsigned integer in network byte order."""
-        self.buffer.extend(struct.pack('!H', val))
+        self.buffer.extend(_UINT16.pack(val))
     
     def write_uint32(self, val: int):
         """Write a 32-bit unsigned integer in network byte order."""
-        self.buffer.extend(struct.pack('!I', val))
+        self.buffer.extend(_UINT32.pack(val))
     
     def write_time(self, val: int):
         """Write a time_t value (as 32-bit unsigned int)."""
@@ -48,7 +119,7 @@ class ByteBuffer:
         """Read a 16-bit unsigned integer from network byte order."""
         if self.read_pos + 2 > len(self.buffer):
             raise ValueError("Buffer underflow")
-        val = struct.unpack('!H', self.buffer[self.read_pos:self.read_pos + 2])[0]
+        val = _UINT16.unpack_from(self.buffer, self.read_pos)[0]
         self.read_pos += 2
         return val
     
@@ -56,7 +127,7 @@ class ByteBuffer:
         """Read a 32-bit unsigned integer from network byte order."""
         if self.read_pos + 4 > len(self.buffer):
             raise ValueError("Buffer underflow")
-        val = struct.unpack('!I', self.buffer[self.read_pos:self.read_pos + 4])[0]
+        val = _UINT32.unpack_from(self.buffer, self.read_pos)[0]
         self.read_pos += 4
         return val
     
@@ -64,12 +135,55 @@ class ByteBuffer:
         """Read a time_t value (as 32-bit unsigned int)."""
         return self.read_uint32()
     
+    def read_uint32_array(self, count: int) -> array:
+        """Read count 32-bit unsigned integers in one pass."""
+        size = count * 4
+        if self.read_pos + size > len(self.buffer):
+            raise ValueError("Buffer underflow")
+        values = array(_UINT32_TYPECODE)
+        values.frombytes(memoryview(self.buffer)[self.read_pos:self.read_pos + size])
+        if _NEEDS_BYTESWAP:
+            values.byteswap()
+        self.read_pos += size
+        return values
+    
+    def read_uint64_array(self, count: int) -> array:
+        """Read count 64-bit unsigned integers in one pass."""
+        size = count * 8
+        if self.read_pos + size > len(self.buffer):
+            raise ValueError("Buffer underflow")
+        values = array(_UINT64_TYPECODE)
+        values.frombytes(memoryview(self.buffer)[self.read_pos:self.read_pos + size])
+        if _NEEDS_BYTESWAP:
+            values.byteswap()
+        self.read_pos += size
+        return values
+    
+    def read_time_pairs(self, count: int) -> array:
+        """
+        Read count (start, end) time pairs in one pass.
+        
+        Returns a flat array of 2 * count uint32 values laid out as
+        [start0, end0, start1, end1, ...].
+        """
+        return self.read_uint32_array(count * 2)
+    
+    def read_day_masks(self, count: int) -> array:
+        """
+        Read count bitmap-encoded days in one pass.
+        
+        Returns a flat array of 2 * count uint32 values laid out as
+        [day_start0, mask0, day_start1, mask1, ...]; bit i of a mask means
+        the slot starting at day_start + i * SLOT_DURATION_SECONDS is free.
+        """
+        return self.read_uint32_array(count * 2)
+    
     def read_string(self) -> str:
         """Read a length-prefixed string."""
         length = self.read_uint16()
         if self.read_pos + length > len(self.buffer):
             raise ValueError("Buffer underflow")
-        s = self.buffer[self.read_pos:self.read_pos + length].decode('utf-8')
+        s = str(self.buffer[self.read_pos:self.read_pos + length], 'utf-8')
         self.read_pos += length
         return s
     
@@ -80,3 +194,49 @@ class ByteBuffer:
     def remaining(self) -> int:
         """Get the number of unread bytes."""
         return len(self.buffer) - self.read_pos
+
+
+def expand_day_masks(day_masks) -> array:
+    """
+    Expand [day_start, mask, ...] bitmaps into the flat
+    [start0, end0, start1, end1, ...] layout of read_time_pairs().
+    """
+    times = array(_UINT32_TYPECODE)
+    for day_start, mask in zip(day_masks[::2], day_masks[1::2]):
+        for slot in range(SLOTS_PER_DAY):
+            if mask >> slot & 1:
+                start = day_start + slot * SLOT_DURATION_SECONDS
+                times.append(start)
+                times.append(start + SLOT_DURATION_SECONDS)
+    return times
+
+
+def with_options(frame, timeout: float, acked_through: int = 0):
+    """
+    Fill in the request options of a frame from finish() and return it.
+    
+    The deadline option tells the server to drop the request instead of
+    processing it if it is still queued after timeout seconds, when no one
+    waits for the reply. A non-zero acked_through adds the acknowledgement
+    option: the client has finished with every request up to that ID, so
+    the server may release their cached replies.
+    
+    The options overwrite the slots finish() reserved, in place, so each
+    retransmission sends the same buffer without copying it. A frame
+    without reserved slots (or a read-only one) is copied once instead.
+    """
+    payload_length = _UINT16.unpack_from(frame, _PAYLOAD_LENGTH_OFFSET)[0]
+    reserved = len(frame) - _REQUEST_HEADER.size - payload_length == REQUEST_OPTIONS_SIZE
+    if not (reserved and isinstance(frame, memoryview) and not frame.readonly):
+        copy = bytearray(memoryview(frame)[:_REQUEST_HEADER.size + payload_length])
+        copy.extend(bytes(REQUEST_OPTIONS_SIZE))
+        frame = memoryview(copy)
+    
+    offset = len(frame) - REQUEST_OPTIONS_SIZE
+    budget_ms = min(max(int(timeout * 1000), 1), 0xFFFFFFFF)
+    _REQUEST_OPTION.pack_into(frame, offset, OPTION_DEADLINE, budget_ms)
+    if acked_through > 0:
+        _REQUEST_OPTION.pack_into(frame, offset + _REQUEST_OPTION.size, OPTION_ACK, acked_through)
+    else:
+        _REQUEST_OPTION.pack_into(frame, offset + _REQUEST_OPTION.size, OPTION_NONE, 0)
+    return frame
@@ -0,0 +1,41 @@
+"""
+Completion Tracker
+Tells the server which request IDs a client has finished with
+"""
+
+import threading
+from typing import Set
+
+
+class CompletionTracker:
+    """
+    Tracks the requests one client socket has in flight and computes the
+    acknowledgement piggybacked on its next request: the highest request
+    ID up to which the client will never retransmit anything again.
+
+    IDs that were allocated but never sent do not hold the value back,
+    since the server has never seen them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight: Set[int] = set()
+        self.highest_finished = 0
+
+    def start(self, request_id: int):
+        """Record that request_id is about to be sent."""
+        with self.lock:
+            self.in_flight.add(request_id)
+
+    def finish(self, request_id: int):
+        """Record that the client stopped waiting for request_id (answered or given up)."""
+        with self.lock:
+            self.in_flight.discard(request_id)
+            self.highest_finished = max(self.highest_finished, request_id)
+
+    def acked_through(self) -> int:
+        """Highest ID such that no request at or below it is still in flight (0 if none)."""
+        with self.lock:
+            if self.in_flight:
+                return min(min(self.in_flight) - 1, self.highest_finished)
+            return self.highest_finished
@@ -10,6 +10,8 @@ MSG_CHANGE_BOOKING = 3
 MSG_MONITOR_FACILITY = 4
 MSG_GET_LAST_BOOKING_TIME = 5
 MSG_EXTEND_BOOKING = 6
+MSG_BATCH = 7
+MSG_STATS = 8  # Live server metrics snapshot (see server_stats.py)
 
 # Legacy/deprecated constants (not supported by server)
 MSG_MONITOR_UPDATES = 5  # Same as GET_LAST_BOOKING_TIME
@@ -18,6 +20,24 @@ MSG_CANCEL_BOOKING = 4   # Same as MONITOR_FACILITY
 # Response message types
 MSG_RESPONSE_SUCCESS = 100
 MSG_RESPONSE_ERROR = 101
+MSG_RESPONSE_BUSY = 102  # Refused unprocessed: message string + retry after ms (u32)
+
+# Request options appended after the payload: [option: u8] [value: u32]
+OPTION_NONE = 0  # Padding: a reserved option slot left unused
+OPTION_DEADLINE = 1  # Milliseconds the client waits for this copy of the request
+OPTION_ACK = 2  # Highest request_id up to which the client has finished every request
+
+# Availability encodings (must match AvailabilityFormat on the server)
+AVAILABILITY_FORMAT_SLOT_LIST = 0  # count + (start, end) pair per free slot
+AVAILABILITY_FORMAT_BITMAP = 1     # days + (9:00 of day, free slot mask) per day
+
+# Bookable half-hour slots: 9:00 to 18:00, bit i of a day mask is slot i
+SLOTS_PER_DAY = 18
+SLOT_DURATION_SECONDS = 1800
+
+# Latency histograms in a stats response: bucket i counts [2^i, 2^(i+1)) us,
+# bucket 0 also counts 0 and the last bucket is open-ended
+LATENCY_BUCKETS = 24
 
 # Booking operation types (for monitor notifications)
 OP_BOOK = 1
@@ -28,3 +48,13 @@ OP_EXTEND = 3
 TIMEOUT_SECONDS = 3
 MAX_RETRIES = 3
 MAX_BUFFER_SIZE = 65507
+REQUEST_OPTION_SLOTS = 2  # Option slots reserved after every request payload
+MAX_BATCH_OPERATIONS = 1024  # Larger batches are refused without running anything
+
+# Adaptive retransmission timeout (see rtt_estimator.py)
+INITIAL_RTO_SECONDS = 1.0   # Used until the first RTT sample
+MIN_RTO_SECONDS = 0.05
+MAX_RTO_SECONDS = 10.0
+RTO_JITTER = 0.25           # Up to +25% random jitter per attempt
+RETRY_BUDGET_RATIO = 0.2    # Retry tokens earned per request
+RETRY_BUDGET_MAX = 10       # Burst of retries allowed
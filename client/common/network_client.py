@@ -5,21 +5,33 @@ Handles UDP communication with server
 
 import socket
 import random
-from typing import Optional
-from .byte_buffer import ByteBuffer
-from .message_types import TIMEOUT_SECONDS, MAX_RETRIES, MAX_BUFFER_SIZE
+import struct
+import time
+from typing import Callable, Optional
+from .byte_buffer import ByteBuffer, with_options
+from .completion_tracker import CompletionTracker
+from .message_types import (TIMEOUT_SECONDS, MAX_RETRIES, MAX_BUFFER_SIZE, MSG_RESPONSE_BUSY,
+                            RTO_JITTER)
+from .rtt_estimator import RttEstimator, RetryBudget, get_estimator
 
 
 class NetworkClient:
     """Handles network communication with the server."""
     
-    def __init__(self, server_ip: str, server_port: int, drop_rate: float = 0.0):
+    def __init__(self, server_ip: str, server_port: int, drop_rate: float = 0.0,
+                 notification_handler: Optional[Callable[[bytes], None]] = None):
         self.server_ip = server_ip
         self.server_port = server_port
         self.drop_rate = drop_rate  # Packet drop rate (0.0-1.0)
+        self.notification_handler = notification_handler  # Called for request_id 0
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.settimeout(TIMEOUT_SECONDS)
         self.next_request_id = 1
+        self.completions = CompletionTracker()
+        # Shared by all clients talking to the same server
+        self.rtt: RttEstimator = get_estimator(server_ip, server_port)
+        # Not shared: one client's retransmits must not starve the others
+        self.retry_budget = RetryBudget()
     
     def get_next_request_id(self) -> int:
         """Get the next request ID and increment counter."""
@@ -31,50 +43,168 @@ class NetworkClient:
         """
         Send a request to the server and wait for a response.
         Implements retry logic for at-least-once semantics.
+
+        Only a datagram carrying this request's request_id is returned.
+        Late replies to earlier requests are discarded and monitor
+        notifications (request_id 0) go to notification_handler; either
+        way the client keeps waiting out the current attempt's deadline
+        without retransmitting.
+        
+        Each attempt waits for the adaptive retransmission timeout from the
+        server's RttEstimator. Retransmits back off exponentially with
+        jitter and stop early once the retry budget is exhausted.
+        
+        Every transmission carries the attempt's timeout as a deadline, so
+        the server skips the request if it is still queued once this client
+        has stopped waiting for it. It also acknowledges every request this
+        client has finished with, so an at-most-once server can release
+        their cached replies early.
+        
+        A "server busy" reply uses up an attempt: the client waits the
+        retry-after time the server suggested (plus jitter) and resends,
+        without touching the RTO or the retry budget.
         
         Args:
             request_data: The request data to send
             retries: Number of retry attempts
-            timeout: Optional custom timeout in seconds (uses default if None)
+            timeout: Optional fixed timeout in seconds per attempt (adaptive if None)
+        """
+        return self._transact(request_data, retries, timeout, None)
+    
+    def send_request_into(self, request_data: bytes, buffer: bytearray, retries: int = MAX_RETRIES,
+                          timeout: Optional[float] = None) -> Optional[memoryview]:
+        """
+        Like send_request(), but receives the response with recvfrom_into()
+        directly into a caller-supplied buffer (at least MAX_BUFFER_SIZE bytes).
+        
+        Returns a memoryview of the received bytes, valid until the buffer is
+        reused; decode it in place with ByteBuffer.from_view().
         """
+        return self._transact(request_data, retries, timeout, buffer)
+    
+    def _transact(self, request_data: bytes, retries: int, timeout: Optional[float],
+                  buffer: Optional[bytearray]):
+        """Send with retransmission and wait for the matching response."""
         # Save original timeout
         original_timeout = self.sock.gettimeout()
+        request_id = struct.unpack_from('!I', request_data)[0]
+        transmissions = 0
+        server_busy = False  # Last attempt was refused with a retry-after hint
+        self.retry_budget.on_request()
+        self.completions.start(request_id)
         
         try:
-            # Set custom timeout if provided
-            if timeout is not None:
-                self.sock.settimeout(timeout)
-            
             for attempt in range(retries):
-                try:
-                    # Simulate request packet drop
-                    if random.random() < self.drop_rate:
-                        print(f"[DROP] Request dropped (attempt {attempt + 1}/{retries})")
-                        # Simulate timeout for dropped packet
-                        if attempt < retries - 1:
-                            continue
-                        else:
-                            return None
-                    
-                    # Send request
-                    self.sock.sendto(request_data, (self.server_ip, self.server_port))
-                    
-                    # Wait for response
-                    response_data, _ = self.sock.recvfrom(MAX_BUFFER_SIZE)
-                    return response_data
-                    
-                except socket.timeout:
+                # Simulate request packet drop
+                if random.random() < self.drop_rate:
+                    print(f"[DROP] Request dropped (attempt {attempt + 1}/{retries})")
+                    # Simulate timeout for dropped packet
                     if attempt < retries - 1:
-                        print(f"Timeout, retrying... (attempt {attempt + 2}/{retries})")
+                        continue
                     else:
-                        print("Request timeout after all retries")
                         return None
+                
+                if transmissions > 0 and not server_busy and not self.retry_budget.try_retry():
+                    print("Retry budget exhausted, giving up")
+                    return None
+                
+                # Send request
+                attempt_timeout = timeout if timeout is not None else self.rtt.next_timeout()
+                sent_at = time.monotonic()
+                self.sock.sendto(with_options(request_data, attempt_timeout,
+                                              self.completions.acked_through()),
+                                 (self.server_ip, self.server_port))
+                transmissions += 1
+                
+                # Wait for the matching response
+                response_data = self._receive_matching(request_id, attempt_timeout, buffer)
+                retry_after = self._busy_retry_after(response_data)
+                if retry_after is not None:
+                    server_busy = True
+                    if attempt < retries - 1:
+                        print(f"Server busy, retrying in {retry_after * 1000:.0f} ms "
+                              f"(attempt {attempt + 2}/{retries})")
+                        time.sleep(retry_after * (1 + random.random() * RTO_JITTER))
+                    else:
+                        print("Server busy after all retries")
+                    continue
+                server_busy = False
+                
+                if response_data is not None:
+                    # Karn's rule: a reply to a retransmitted request is ambiguous
+                    if transmissions == 1:
+                        self.rtt.add_sample(time.monotonic() - sent_at)
+                    return response_data
+                
+                if timeout is None:
+                    self.rtt.on_timeout()
+                if attempt < retries - 1:
+                    print(f"Timeout, retrying... (attempt {attempt + 2}/{retries})")
+                else:
+                    print("Request timeout after all retries")
             
             return None
         finally:
+            # Answered or abandoned: never retransmitted again
+            self.completions.finish(request_id)
             # Always restore original timeout
             self.sock.settimeout(original_timeout)
     
+    @staticmethod
+    def _busy_retry_after(response_data) -> Optional[float]:
+        """Return the retry-after time in seconds if this is a "server busy" reply."""
+        if response_data is None or len(response_data) < 7 or response_data[4] != MSG_RESPONSE_BUSY:
+            return None
+        message_length = struct.unpack_from('!H', response_data, 5)[0]
+        offset = 7 + message_length
+        if len(response_data) < offset + 4:
+            return None
+        return struct.unpack_from('!I', response_data, offset)[0] / 1000.0
+    
+    def get_rtt_stats(self) -> dict:
+        """Get a snapshot of the server's RTT estimator and this client's retry budget."""
+        return {**self.rtt.snapshot(), **self.retry_budget.snapshot()}
+    
+    def _receive_matching(self, request_id: int, timeout: Optional[float],
+                          buffer: Optional[bytearray] = None):
+        """
+        Receive until a response for request_id arrives or the deadline passes.
+        Returns None on timeout. With a buffer, receives in place and returns
+        a memoryview of it.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        
+        while True:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.sock.settimeout(remaining)
+            
+            try:
+                if buffer is None:
+                    response_data, _ = self.sock.recvfrom(MAX_BUFFER_SIZE)
+                else:
+                    length, _ = self.sock.recvfrom_into(buffer)
+                    response_data = memoryview(buffer)[:length]
+            except socket.timeout:
+                return None
+            
+            if len(response_data) < 4:
+                continue
+            
+            response_id = struct.unpack_from('!I', response_data)[0]
+            if response_id == request_id:
+                return response_data
+            
+            if response_id == 0:
+                # Server-initiated monitor notification
+                if self.notification_handler:
+                    # Copy: a caller-supplied buffer is reused by the next receive
+                    self.notification_handler(bytes(response_data))
+            else:
+                print(f"[STALE] Discarded response for request {response_id} (waiting for {request_id})")
+    
     def close(self):
         """Close the socket."""
         self.sock.close()
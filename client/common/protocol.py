@@ -0,0 +1,281 @@
+"""
+Protocol Schema
+Declarative message table and the precompiled codecs generated from it
+
+Every request and response layout is described once here. Runs of
+fixed-width fields are compiled into a single struct.Struct, and each
+response layout gets its own __slots__ dataclass.
+"""
+
+import struct
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+from .byte_buffer import ByteBuffer, expand_day_masks
+from .message_types import (MSG_QUERY_AVAILABILITY, MSG_BOOK_FACILITY, MSG_CHANGE_BOOKING,
+                            MSG_MONITOR_FACILITY, MSG_GET_LAST_BOOKING_TIME,
+                            MSG_EXTEND_BOOKING, MSG_STATS, MSG_RESPONSE_SUCCESS, OP_CHANGE, OP_EXTEND,
+                            AVAILABILITY_FORMAT_SLOT_LIST, AVAILABILITY_FORMAT_BITMAP)
+
+# Field types
+U8 = 'u8'
+U16 = 'u16'
+U32 = 'u32'
+U64 = 'u64'
+I32 = 'i32'
+TIME = 'time'              # time_t sent as uint32
+STRING = 'string'          # uint16 length + UTF-8 bytes
+U32_LIST = 'u32_list'      # uint16 count + count * uint32
+U64_LIST = 'u64_list'      # uint16 count + count * uint64
+TIME_PAIRS = 'time_pairs'  # uint16 count + count * (start, end) uint32 pairs
+DAY_MASKS = 'day_masks'    # uint16 count + count * (day_start, free slot mask) uint32 pairs
+
+_FIXED_FORMATS = {U8: 'B', U16: 'H', U32: 'I', U64: 'Q', I32: 'i', TIME: 'I'}
+
+# A field is (name, type) or (name, type, (field, allowed_values)); the
+# condition makes the field present only when an earlier field has one of
+# the allowed values.
+Field = Tuple
+
+# Availability in whichever encoding the request negotiated
+_AVAILABILITY: Tuple[Field, ...] = (
+    ('availability_format', U8),
+    ('slots', TIME_PAIRS, ('availability_format', (AVAILABILITY_FORMAT_SLOT_LIST,))),
+    ('day_masks', DAY_MASKS, ('availability_format', (AVAILABILITY_FORMAT_BITMAP,))),
+)
+
+# Request payloads (after the request_id / type / length header)
+REQUEST_FIELDS: Dict[int, Tuple[Field, ...]] = {
+    MSG_QUERY_AVAILABILITY: (('facility_name', STRING), ('days', U32_LIST),
+                             ('availability_format', U8)),
+    MSG_BOOK_FACILITY: (('facility_name', STRING), ('start_time', TIME), ('end_time', TIME)),
+    MSG_CHANGE_BOOKING: (('booking_id', U32), ('offset_minutes', I32)),
+    MSG_MONITOR_FACILITY: (('facility_name', STRING), ('duration_seconds', U32),
+                           ('availability_format', U8)),
+    MSG_GET_LAST_BOOKING_TIME: (('facility_name', STRING),),
+    MSG_EXTEND_BOOKING: (('booking_id', U32), ('minutes_to_extend', U32)),
+    MSG_STATS: (),
+}
+
+# Values used for request fields the caller leaves out
+REQUEST_DEFAULTS: Dict[str, object] = {
+    'availability_format': AVAILABILITY_FORMAT_SLOT_LIST,
+}
+
+# Successful response bodies (after request_id and status)
+RESPONSE_FIELDS: Dict[int, Tuple[str, Tuple[Field, ...]]] = {
+    MSG_QUERY_AVAILABILITY: ('AvailabilityResponse', _AVAILABILITY),
+    MSG_BOOK_FACILITY: ('BookingResponse', (('booking_id', U32),)),
+    MSG_CHANGE_BOOKING: ('ChangeBookingResponse', (('message', STRING),)),
+    MSG_MONITOR_FACILITY: ('MonitorResponse', (('message', STRING),)),
+    MSG_GET_LAST_BOOKING_TIME: ('LastBookingTimeResponse', (('last_time', TIME), ('message', STRING))),
+    MSG_EXTEND_BOOKING: ('ExtendBookingResponse', (('new_end_time', TIME), ('message', STRING))),
+    # Counters are totals since the server started (see UDPServer::build_stats_response)
+    MSG_STATS: ('StatsResponse', (
+        ('uptime_seconds', U32),
+        ('requests_received', U64),
+        ('requests_processed', U64),
+        ('requests_shed', U64),
+        ('requests_expired', U64),
+        ('duplicates_ignored', U64),       # Already acknowledged by the client
+        ('duplicates_unavailable', U64),   # Ran before, reply evicted: answered with an error
+        ('requests_too_old', U64),         # Older than the replay window: answered with an error
+        ('duplicates_in_progress', U64),   # Arrived while the first copy was executing: dropped
+        ('queue_depth', U32),
+        ('queue_capacity', U32),
+        ('queue_high_water', U32),
+        ('queue_rejected', U64),
+        ('cache_entries', U32),
+        ('cache_clients', U32),
+        ('cache_bytes', U64),
+        ('cache_hits', U64),
+        ('cache_misses', U64),
+        ('monitors', U32),
+        ('bookings', U32),
+        ('persistence_lag', U32),
+        ('journal_records', U32),
+        ('requests_by_type', U64_LIST),    # Index 0 is message type 1
+        ('queue_wait_us', U64_LIST),       # LATENCY_BUCKETS histogram buckets
+        ('handler_time_us', U64_LIST),
+    )),
+}
+
+# Server-initiated monitor notification (request_id 0)
+NOTIFICATION_FIELDS: Tuple[str, Tuple[Field, ...]] = ('MonitorNotification', (
+    ('message', STRING),
+    ('operation', U8),
+    ('booking_id', U32),
+    ('start_time', TIME),
+    ('end_time', TIME),
+    ('old_start_time', TIME, ('operation', (OP_CHANGE, OP_EXTEND))),
+    ('old_end_time', TIME, ('operation', (OP_CHANGE, OP_EXTEND))),
+) + _AVAILABILITY)
+
+
+def _compile(fields: Sequence[Field]) -> list:
+    """
+    Turn a field list into codec segments:
+    (kind, names, struct_or_None, condition).
+    Consecutive fixed-width fields sharing a condition become one Struct.
+    """
+    segments = []
+    run_format, run_names, run_condition = '', [], None
+
+    def flush():
+        if run_names:
+            segments.append(('fixed', tuple(run_names), struct.Struct('!' + run_format), run_condition))
+
+    for field in fields:
+        name, ftype = field[0], field[1]
+        condition = field[2] if len(field) > 2 else None
+        if ftype in _FIXED_FORMATS:
+            if run_names and condition != run_condition:
+                flush()
+                run_format, run_names = '', []
+            run_format += _FIXED_FORMATS[ftype]
+            run_names.append(name)
+            run_condition = condition
+            continue
+        flush()
+        run_format, run_names, run_condition = '', [], None
+        segments.append((ftype, (name,), None, condition))
+    flush()
+    return segments
+
+
+class Response:
+    """Base class of generated responses."""
+    __slots__ = ()
+
+    @property
+    def ok(self) -> bool:
+        return self.status == MSG_RESPONSE_SUCCESS
+
+
+def _make_record(class_name: str, field_names: Sequence[str]) -> type:
+    """Create a __slots__ dataclass with the given fields."""
+    names = ('request_id', 'status', 'error') + tuple(field_names)
+    namespace = {'__slots__': names, '__annotations__': {n: object for n in names}}
+    return dataclass(type(class_name, (Response,), namespace))
+
+
+class RequestCodec:
+    """Encodes one request type using its precompiled segments."""
+
+    def __init__(self, message_type: int, fields: Sequence[Field]):
+        self.message_type = message_type
+        self.field_names = tuple(f[0] for f in fields)
+        self.segments = _compile(fields)
+        self.defaults = {n: REQUEST_DEFAULTS[n] for n in self.field_names if n in REQUEST_DEFAULTS}
+
+    def encode_payload(self, buf: ByteBuffer, values: Dict):
+        """Append the request payload to buf."""
+        if self.defaults:
+            values = {**self.defaults, **values}
+        for kind, names, codec, _ in self.segments:
+            if kind == 'fixed':
+                buf.buffer.extend(codec.pack(*[values[n] for n in names]))
+            elif kind == STRING:
+                buf.write_string(values[names[0]])
+            elif kind == U32_LIST:
+                items = values[names[0]]
+                buf.write_uint16(len(items))
+                buf.buffer.extend(struct.pack('!%dI' % len(items), *items))
+            elif kind in (TIME_PAIRS, DAY_MASKS):
+                items = values[names[0]]
+                buf.write_uint16(len(items) // 2)
+                buf.buffer.extend(struct.pack('!%dI' % len(items), *items))
+
+    def encode(self, request_id: int, values: Dict) -> memoryview:
+        """Build a complete request frame."""
+        buf = ByteBuffer().begin_message(request_id, self.message_type)
+        self.encode_payload(buf, values)
+        return buf.finish()
+
+
+class ResponseCodec:
+    """Decodes one response layout into its generated dataclass."""
+
+    def __init__(self, class_name: str, fields: Sequence[Field]):
+        self.field_names = tuple(f[0] for f in fields)
+        self.segments = _compile(fields)
+        self.record = _make_record(class_name, self.field_names)
+        self.empty = (None,) * len(self.field_names)
+
+    def decode(self, data) -> Response:
+        """Decode a complete response datagram (bytes, memoryview or ByteBuffer)."""
+        buf = data if isinstance(data, ByteBuffer) else ByteBuffer.from_view(data)
+        request_id = buf.read_uint32()
+        return self.decode_body(buf, request_id)
+
+    def decode_body(self, buf: ByteBuffer, request_id: int = 0) -> Response:
+        """Decode from the status byte onwards."""
+        status = buf.read_uint8()
+        if status != MSG_RESPONSE_SUCCESS:
+            error = buf.read_string() if buf.remaining() >= 2 else "Unknown error"
+            return self.record(request_id, status, error, *self.empty)
+
+        values = {}
+        for kind, names, codec, condition in self.segments:
+            if condition is not None and values.get(condition[0]) not in condition[1]:
+                continue
+            if kind == 'fixed':
+                if buf.read_pos + codec.size > len(buf.buffer):
+                    raise ValueError("Buffer underflow")
+                values.update(zip(names, codec.unpack_from(buf.buffer, buf.read_pos)))
+                buf.read_pos += codec.size
+            elif kind == STRING:
+                values[names[0]] = buf.read_string()
+            elif kind == U32_LIST:
+                values[names[0]] = buf.read_uint32_array(buf.read_uint16())
+            elif kind == U64_LIST:
+                values[names[0]] = buf.read_uint64_array(buf.read_uint16())
+            elif kind == TIME_PAIRS:
+                values[names[0]] = buf.read_time_pairs(buf.read_uint16())
+            elif kind == DAY_MASKS:
+                values[names[0]] = buf.read_day_masks(buf.read_uint16())
+
+        return self.record(request_id, status, None, *[values.get(n) for n in self.field_names])
+
+
+REQUEST_CODECS: Dict[int, RequestCodec] = {
+    message_type: RequestCodec(message_type, fields)
+    for message_type, fields in REQUEST_FIELDS.items()
+}
+
+RESPONSE_CODECS: Dict[int, ResponseCodec] = {
+    message_type: ResponseCodec(class_name, fields)
+    for message_type, (class_name, fields) in RESPONSE_FIELDS.items()
+}
+
+NOTIFICATION_CODEC = ResponseCodec(*NOTIFICATION_FIELDS)
+
+
+def encode_request(message_type: int, request_id: int, **fields) -> memoryview:
+    """Encode a request of the given type from keyword fields."""
+    return REQUEST_CODECS[message_type].encode(request_id, fields)
+
+
+def decode_response(message_type: int, data) -> Response:
+    """Decode the response to a request of the given type."""
+    return RESPONSE_CODECS[message_type].decode(data)
+
+
+def decode_notification(data) -> Response:
+    """Decode a server-initiated monitor notification."""
+    return NOTIFICATION_CODEC.decode(data)
+
+
+def availability_slots(response: Response):
+    """
+    Free slots of an availability response or notification as a flat
+    [start0, end0, start1, end1, ...] array, whichever format it was sent in.
+    """
+    if response.day_masks is not None:
+        return expand_day_masks(response.day_masks)
+    return response.slots
+
+
+def response_class(message_type: int) -> Optional[type]:
+    """Get the generated response dataclass for a message type."""
+    codec = RESPONSE_CODECS.get(message_type)
+    return codec.record if codec else None
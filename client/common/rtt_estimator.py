@@ -0,0 +1,132 @@
+"""
+RTT Estimator
+Adaptive retransmission timeout (RFC 6298 style) shared per server,
+and the per-client retry budget
+"""
+
+import random
+import threading
+import time
+from typing import Dict, Tuple
+from .message_types import (INITIAL_RTO_SECONDS, MIN_RTO_SECONDS, MAX_RTO_SECONDS,
+                            RTO_JITTER, RETRY_BUDGET_RATIO, RETRY_BUDGET_MAX)
+
+
+class RttEstimator:
+    """
+    Tracks smoothed RTT and RTT variance for one server and derives the
+    retransmission timeout from them.
+
+    Karn's rule: samples are only taken from requests that were sent
+    exactly once, and a backed-off timeout is kept until such a sample
+    arrives. Timers that fire within one RTO of the last backoff belong to
+    the same loss event (e.g. a lost burst of concurrent requests) and do
+    not back off again, so one burst doubles the RTO once, not once per
+    request. The estimate is shared by every client of the server in
+    the process; the retry budget is not (see RetryBudget).
+    """
+
+    ALPHA = 1 / 8  # Gain for smoothed RTT
+    BETA = 1 / 4   # Gain for RTT variance
+    K = 4          # Variance multiplier
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.srtt = None  # Smoothed RTT in seconds (None until first sample)
+        self.rttvar = None
+        self.rto = INITIAL_RTO_SECONDS
+        self.samples = 0
+        self.timeouts = 0
+        self.last_backoff = None  # Monotonic time of the last backoff
+
+    def add_sample(self, rtt: float):
+        """Update the estimate with an RTT measured on an unretransmitted request."""
+        with self.lock:
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+                self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+            self.rto = min(MAX_RTO_SECONDS, max(MIN_RTO_SECONDS, self.srtt + self.K * self.rttvar))
+            self.samples += 1
+
+    def on_timeout(self):
+        """Exponentially back off the timeout after a retransmission timer fires."""
+        now = time.monotonic()
+        with self.lock:
+            self.timeouts += 1
+            if self.last_backoff is not None and now - self.last_backoff < self.rto:
+                return  # Already backed off for this loss event
+            self.rto = min(MAX_RTO_SECONDS, self.rto * 2)
+            self.last_backoff = now
+
+    def next_timeout(self) -> float:
+        """Timeout for the next attempt, with random jitter added."""
+        with self.lock:
+            return self.rto * (1 + random.uniform(0, RTO_JITTER))
+
+    def snapshot(self) -> Dict:
+        """Current estimator state for reporting."""
+        with self.lock:
+            return {
+                'srtt_ms': self.srtt * 1000 if self.srtt is not None else None,
+                'rttvar_ms': self.rttvar * 1000 if self.rttvar is not None else None,
+                'rto_ms': self.rto * 1000,
+                'samples': self.samples,
+                'timeouts': self.timeouts,
+            }
+
+
+class RetryBudget:
+    """
+    Token-bucket retry budget so a struggling server is not flooded with
+    retransmits: every new request earns RETRY_BUDGET_RATIO tokens (up
+    to RETRY_BUDGET_MAX) and every retransmission spends one.
+
+    Each client owns its budget. A shared per-server bucket let one
+    client, or one burst of async requests, drain it for every other
+    client in the process, which then gave up after a single lost packet.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = float(RETRY_BUDGET_MAX)
+        self.retries_denied = 0
+
+    def on_request(self):
+        """Deposit into the budget for every new request."""
+        with self.lock:
+            self.tokens = min(RETRY_BUDGET_MAX, self.tokens + RETRY_BUDGET_RATIO)
+
+    def try_retry(self) -> bool:
+        """Withdraw one retry from the budget; False if it is exhausted."""
+        with self.lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.retries_denied += 1
+            return False
+
+    def snapshot(self) -> Dict:
+        """Current budget state for reporting."""
+        with self.lock:
+            return {
+                'retries_denied': self.retries_denied,
+                'retry_budget': self.tokens,
+            }
+
+
+_estimators: Dict[Tuple[str, int], RttEstimator] = {}
+_estimators_lock = threading.Lock()
+
+
+def get_estimator(server_ip: str, server_port: int) -> RttEstimator:
+    """Get the shared estimator for a server, creating it if needed."""
+    key = (server_ip, server_port)
+    with _estimators_lock:
+        estimator = _estimators.get(key)
+        if estimator is None:
+            estimator = RttEstimator()
+            _estimators[key] = estimator
+        return estimator
@@ -0,0 +1,157 @@
+"""
+Server Stats
+Polls the server's live metrics (MSG_STATS) and derives rates and latency percentiles
+"""
+
+import time
+from typing import Dict, List, Optional, Sequence
+from .message_types import (MSG_STATS, MSG_QUERY_AVAILABILITY, MSG_BOOK_FACILITY,
+                            MSG_CHANGE_BOOKING, MSG_MONITOR_FACILITY,
+                            MSG_GET_LAST_BOOKING_TIME, MSG_EXTEND_BOOKING, MSG_BATCH,
+                            LATENCY_BUCKETS)
+from .network_client import NetworkClient
+from .protocol import Response, encode_request, decode_response
+
+MESSAGE_TYPE_NAMES = {
+    MSG_QUERY_AVAILABILITY: 'query', MSG_BOOK_FACILITY: 'book', MSG_CHANGE_BOOKING: 'change',
+    MSG_MONITOR_FACILITY: 'monitor', MSG_GET_LAST_BOOKING_TIME: 'last_booking',
+    MSG_EXTEND_BOOKING: 'extend', MSG_BATCH: 'batch', MSG_STATS: 'stats',
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+def fetch_stats(network: NetworkClient) -> Optional[Response]:
+    """Request one metrics snapshot; None if the server did not answer."""
+    request = encode_request(MSG_STATS, network.get_next_request_id())
+    data = network.send_request(request)
+    return decode_response(MSG_STATS, data) if data else None
+
+
+def bucket_upper_bound_us(index: int) -> float:
+    """Largest latency counted by a histogram bucket (inf for the last one)."""
+    return float('inf') if index >= LATENCY_BUCKETS - 1 else float(2 ** (index + 1))
+
+
+def histogram_percentile(buckets: Sequence[int], percentile: float) -> Optional[float]:
+    """
+    Latency in microseconds below which the given percentage of samples
+    fall, as the upper bound of the bucket holding that sample (an
+    overestimate of at most 2x). None for an empty histogram.
+    """
+    total = sum(buckets)
+    if total == 0:
+        return None
+    rank = total * percentile / 100
+    seen = 0
+    for index, count in enumerate(buckets):
+        seen += count
+        if count and seen >= rank:
+            return bucket_upper_bound_us(index)
+    return bucket_upper_bound_us(len(buckets) - 1)
+
+
+def _difference(current: Sequence[int], previous: Optional[Sequence[int]]) -> List[int]:
+    if previous is None or len(previous) != len(current):
+        return list(current)
+    return [now - before for now, before in zip(current, previous)]
+
+
+class StatsDelta:
+    """
+    What happened between two snapshots: request rates and the latency
+    histograms of only the requests handled in between. Without a
+    previous snapshot, everything since the server started.
+
+    Uptime only has whole seconds, so pass the locally measured time
+    between the polls as elapsed when there is one.
+    """
+
+    def __init__(self, current: Response, previous: Optional[Response] = None,
+                 elapsed: Optional[float] = None):
+        self.current = current
+        if previous is None or current.uptime_seconds < previous.uptime_seconds:
+            previous, elapsed = None, None  # First poll, or the server restarted
+        if elapsed is None:
+            elapsed = max(current.uptime_seconds - (previous.uptime_seconds if previous else 0), 1)
+        self.seconds = max(elapsed, 1e-3)
+        self.received = current.requests_received - (previous.requests_received if previous else 0)
+        self.processed = current.requests_processed - (previous.requests_processed if previous else 0)
+        self.shed = current.requests_shed - (previous.requests_shed if previous else 0)
+        self.expired = current.requests_expired - (previous.requests_expired if previous else 0)
+        self.by_type = _difference(current.requests_by_type, previous.requests_by_type if previous else None)
+        self.queue_wait = _difference(current.queue_wait_us, previous.queue_wait_us if previous else None)
+        self.handler_time = _difference(current.handler_time_us, previous.handler_time_us if previous else None)
+
+    def rate(self, count: int) -> float:
+        return count / self.seconds
+
+    def type_counts(self) -> Dict[str, int]:
+        """Requests per message type name, skipping types with none."""
+        return {MESSAGE_TYPE_NAMES.get(index + 1, str(index + 1)): count
+                for index, count in enumerate(self.by_type) if count}
+
+    def percentiles(self, buckets: Sequence[int]) -> Dict[int, Optional[float]]:
+        return {p: histogram_percentile(buckets, p) for p in PERCENTILES}
+
+
+def format_latency(micros: Optional[float]) -> str:
+    if micros is None:
+        return '-'
+    if micros == float('inf'):
+        return f'>{format_latency(bucket_upper_bound_us(LATENCY_BUCKETS - 2))}'
+    if micros >= 1000000:
+        return f'{micros / 1000000:.1f}s'
+    if micros >= 1000:
+        return f'{micros / 1000:.1f}ms'
+    return f'{micros:.0f}us'
+
+
+def format_stats(delta: StatsDelta) -> str:
+    """Render a snapshot (and the interval leading up to it) as text."""
+    s = delta.current
+    lines = [
+        f"Uptime: {s.uptime_seconds}s  (interval {delta.seconds:.1f}s)",
+        f"Requests: {s.requests_received} received, {s.requests_processed} processed, "
+        f"{s.requests_shed} shed, {s.requests_expired} expired",
+        f"Duplicates: {s.duplicates_ignored} ignored (acknowledged), {s.duplicates_unavailable} reply evicted, "
+        f"{s.requests_too_old} older than the replay window, {s.duplicates_in_progress} still executing",
+        f"Rate: {delta.rate(delta.received):.1f} received/s, {delta.rate(delta.processed):.1f} processed/s, "
+        f"{delta.rate(delta.shed):.1f} shed/s, {delta.rate(delta.expired):.1f} expired/s",
+        f"Queue: {s.queue_depth}/{s.queue_capacity} (high water {s.queue_high_water}, "
+        f"{s.queue_rejected} rejected)",
+        f"Response cache: {s.cache_entries} entries, {s.cache_clients} clients, {s.cache_bytes} bytes, "
+        f"{s.cache_hits} hits / {s.cache_misses} misses",
+        f"Monitors: {s.monitors}  Bookings: {s.bookings}  "
+        f"Journal: {s.journal_records} records, {s.persistence_lag} not yet on disk",
+    ]
+    counts = delta.type_counts()
+    if counts:
+        lines.append("By type: " + ", ".join(f"{name} {count}" for name, count in counts.items()))
+    for label, buckets in (("Queue wait", delta.queue_wait), ("Handler time", delta.handler_time)):
+        values = delta.percentiles(buckets)
+        lines.append(f"{label}: " + "  ".join(f"p{p} <= {format_latency(v)}" for p, v in values.items())
+                     + f"  ({sum(buckets)} samples)")
+    return "\n".join(lines)
+
+
+def watch(network: NetworkClient, interval: float = 2.0, count: Optional[int] = None):
+    """Print a snapshot every interval seconds (count times, or until Ctrl+C)."""
+    previous, previous_time = None, 0.0
+    polled = 0
+    while count is None or polled < count:
+        if polled:
+            time.sleep(interval)
+        current = fetch_stats(network)
+        now = time.monotonic()
+        polled += 1
+        if current is None:
+            print("No response from server")
+            continue
+        if not current.ok:
+            print(f"Error: {current.error}")
+            return
+        print(f"\n=== Server stats @ {time.strftime('%H:%M:%S')} ===")
+        elapsed = now - previous_time if previous else None
+        print(format_stats(StatsDelta(current, previous, elapsed)))
+        previous, previous_time = current, now
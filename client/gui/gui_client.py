@@ -15,7 +15,7 @@ from tkinter import ttk, scrolledtext, messagebox
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from common.byte_buffer import ByteBuffer
+from common.protocol import encode_request, decode_response, decode_notification, availability_slots
 from common.network_client import NetworkClient
 from common.message_types import *
 
@@ -80,6 +80,8 @@ class TimeTableView(tk.Frame):
             times.append(f"{h:02d}:30")
         times.append("18:00")  # Add final end time
         
+        self.slot_times = times[:SLOTS_PER_DAY]  # Start time of each bitmap slot
+        
         for i, time in enumerate(times):
             # Time label in the first column - minimal
             tk.Label(
@@ -206,6 +208,17 @@ class TimeTableView(tk.Frame):
                 )
             
             current_min += 30  # Move to next 30-minute slot
+    
+    def mark_available_mask(self, day: int, free_mask: int):
+        """Mark available slots of a day from its bitmap (bit i = i-th 30-minute slot)"""
+        for slot, time in enumerate(self.slot_times):
+            if free_mask >> slot & 1:
+                self.time_slots[f"{day}-{time}"].config(
+                    text="○",
+                    bg='#e8f5e9',
+                    fg='#4caf50',
+                    highlightbackground='#c8e6c9'
+                )
 
 class FacilityBookingGUI:
     """Main GUI client class"""
@@ -284,6 +297,16 @@ class FacilityBookingGUI:
             font=("Helvetica Neue", 10)
         ).pack(side=tk.RIGHT, padx=30)
         
+        # Adaptive retransmission timeout - subtle
+        self.rtt_label = tk.Label(
+            top_bar, 
+            text="RTT: --", 
+            fg="#999999", 
+            bg="#ffffff", 
+            font=("Helvetica Neue", 10)
+        )
+        self.rtt_label.pack(side=tk.RIGHT)
+        
         # Thin separator line
         separator = tk.Frame(self.root, bg="#e5e5e5", height=1)
         separator.grid(row=1, column=0, sticky="ew")
@@ -1030,57 +1053,39 @@ class FacilityBookingGUI:
             self.timetable.clear_bookings()  # Clear previous display
             
             # Build request
-            request = ByteBuffer()
-            request_id = self.network.get_next_request_id()
-            request.write_uint32(request_id)
-            request.write_uint8(MSG_QUERY_AVAILABILITY)
-            
-            payload = ByteBuffer()
-            payload.write_string(facility_name)
-            payload.write_uint16(len(days))
-            for day in days:
-                payload.write_uint32(day)
-            
-            request.write_uint16(len(payload.buffer))
-            request.buffer.extend(payload.buffer)
+            request_data = encode_request(MSG_QUERY_AVAILABILITY, self.network.get_next_request_id(),
+                                          facility_name=facility_name, days=days,
+                                          availability_format=AVAILABILITY_FORMAT_BITMAP)
             
             # Send request
-            response_data = self.network.send_request(request.get_data())
+            response_data = self.network.send_request(request_data)
             if not response_data:
                 self.log("Request timeout")
                 return
             
             # Parse response
-            response = ByteBuffer(response_data)
-            resp_request_id = response.read_uint32()
-            status = response.read_uint8()
+            response = decode_response(MSG_QUERY_AVAILABILITY, response_data)
             
-            if status == MSG_RESPONSE_ERROR:
-                error_msg = response.read_string()
+            if not response.ok:
+                error_msg = response.error
                 self.log(f"Error: {error_msg}")
                 return
             
-            # Read and display available time slots
-            num_slots = response.read_uint16()
+            # Read and display available time slots (one bitmap per day)
+            day_masks = response.day_masks
+            num_slots = 0
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
             
-            for i in range(num_slots):
-                start_time = response.read_time()
-                end_time = response.read_time()
-                
-                start_dt = datetime.fromtimestamp(start_time)
-                end_dt = datetime.fromtimestamp(end_time)
+            for day_start, free_mask in zip(day_masks[::2], day_masks[1::2]):
+                num_slots += bin(free_mask).count('1')
                 
                 # 计算相对于今天的天数
-                today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                slot_day = (start_dt.replace(hour=0, minute=0, second=0, microsecond=0) - today).days
+                day_dt = datetime.fromtimestamp(day_start)
+                slot_day = (day_dt.replace(hour=0, minute=0, second=0, microsecond=0) - today).days
                 
                 # 在时间表中标记可用时段
                 if 0 <= slot_day <= 6:  # 只显示一周内的时段
-                    self.timetable.mark_available(
-                        slot_day,
-                        start_dt.strftime('%H:%M'),
-                        end_dt.strftime('%H:%M')
-                    )
+                    self.timetable.mark_available_mask(slot_day, free_mask)
             
             self.log(f"Query successful, found {num_slots} available slots")
             
@@ -1124,21 +1129,12 @@ class FacilityBookingGUI:
             self.log(f"Booking {facility_name}...")
             
             # Build request
-            request = ByteBuffer()
-            request_id = self.network.get_next_request_id()
-            request.write_uint32(request_id)
-            request.write_uint8(MSG_BOOK_FACILITY)
-            
-            payload = ByteBuffer()
-            payload.write_string(facility_name)
-            payload.write_time(start_time)
-            payload.write_time(end_time)
-            
-            request.write_uint16(len(payload.buffer))
-            request.buffer.extend(payload.buffer)
+            request_data = encode_request(MSG_BOOK_FACILITY, self.network.get_next_request_id(),
+                                          facility_name=facility_name, start_time=start_time,
+                                          end_time=end_time)
             
             # Send request
-            response_data = self.network.send_request(request.get_data())
+            response_data = self.network.send_request(request_data)
             if not response_data:
                 self.book_result.delete('1.0', tk.END)
                 self.book_result.insert(tk.END, "Request timeout\n")
@@ -1146,19 +1142,17 @@ class FacilityBookingGUI:
                 return
             
             # Parse response
-            response = ByteBuffer(response_data)
-            resp_request_id = response.read_uint32()
-            status = response.read_uint8()
+            response = decode_response(MSG_BOOK_FACILITY, response_data)
             
-            if status == MSG_RESPONSE_ERROR:
-                error_msg = response.read_string()
+            if not response.ok:
+                error_msg = response.error
                 self.book_result.delete('1.0', tk.END)
                 self.book_result.insert(tk.END, f"Booking failed: {error_msg}\n")
                 self.log(f"Booking failed: {error_msg}")
                 return
             
             # Read confirmation ID
-            confirmation_id = response.read_uint32()
+            confirmation_id = response.booking_id
             result_text = f"✓ Booking successful!\n\n"
             result_text += f"Confirmation ID: {confirmation_id}\n"
             result_text += f"Facility: {facility_name}\n"
@@ -1189,20 +1183,11 @@ class FacilityBookingGUI:
             self.log(f"Change booking ID {confirmation_id}...")
             
             # Build request
-            request = ByteBuffer()
-            request_id = self.network.get_next_request_id()
-            request.write_uint32(request_id)
-            request.write_uint8(MSG_CHANGE_BOOKING)
-            
-            payload = ByteBuffer()
-            payload.write_uint32(confirmation_id)
-            payload.write_uint32(offset_minutes & 0xFFFFFFFF)
-            
-            request.write_uint16(len(payload.buffer))
-            request.buffer.extend(payload.buffer)
+            request_data = encode_request(MSG_CHANGE_BOOKING, self.network.get_next_request_id(),
+                                          booking_id=confirmation_id, offset_minutes=offset_minutes)
             
             # Send request
-            response_data = self.network.send_request(request.get_data())
+            response_data = self.network.send_request(request_data)
             if not response_data:
                 self.change_result.delete('1.0', tk.END)
                 self.change_result.insert(tk.END, "Request timeout\n")
@@ -1210,18 +1195,16 @@ class FacilityBookingGUI:
                 return
             
             # Parse response
-            response = ByteBuffer(response_data)
-            resp_request_id = response.read_uint32()
-            status = response.read_uint8()
+            response = decode_response(MSG_CHANGE_BOOKING, response_data)
             
-            if status == MSG_RESPONSE_ERROR:
-                error_msg = response.read_string()
+            if not response.ok:
+                error_msg = response.error
                 self.change_result.delete('1.0', tk.END)
                 self.change_result.insert(tk.END, f"Change failed: {error_msg}\n")
                 self.log(f"Change failed: {error_msg}")
                 return
             
-            message = response.read_string()
+            message = response.message
             self.change_result.delete('1.0', tk.END)
             self.change_result.insert(tk.END, f"✓ {message}\n")
             self.log("Booking changed successfully")
@@ -1243,19 +1226,11 @@ class FacilityBookingGUI:
             self.log(f"Querying {facility_name} last booking time...")
             
             # Build request
-            request = ByteBuffer()
-            request_id = self.network.get_next_request_id()
-            request.write_uint32(request_id)
-            request.write_uint8(MSG_GET_LAST_BOOKING_TIME)
-            
-            payload = ByteBuffer()
-            payload.write_string(facility_name)
-            
-            request.write_uint16(len(payload.buffer))
-            request.buffer.extend(payload.buffer)
+            request_data = encode_request(MSG_GET_LAST_BOOKING_TIME, self.network.get_next_request_id(),
+                                          facility_name=facility_name)
             
             # Send request
-            response_data = self.network.send_request(request.get_data())
+            response_data = self.network.send_request(request_data)
             if not response_data:
                 self.ops_result.delete('1.0', tk.END)
                 self.ops_result.insert(tk.END, "Request timeout\n")
@@ -1263,19 +1238,17 @@ class FacilityBookingGUI:
                 return
             
             # Parse response
-            response = ByteBuffer(response_data)
-            resp_request_id = response.read_uint32()
-            status = response.read_uint8()
+            response = decode_response(MSG_GET_LAST_BOOKING_TIME, response_data)
             
-            if status == MSG_RESPONSE_ERROR:
-                error_msg = response.read_string()
+            if not response.ok:
+                error_msg = response.error
                 self.ops_result.delete('1.0', tk.END)
                 self.ops_result.insert(tk.END, f"Error: {error_msg}\n")
                 self.log(f"Error: {error_msg}")
                 return
             
-            last_time = response.read_time()
-            message = response.read_string()
+            last_time = response.last_time
+            message = response.message
             
             result_text = f"Facility: {facility_name}\n"
             if last_time == 0:
@@ -1302,20 +1275,12 @@ class FacilityBookingGUI:
             self.log(f"Extend booking ID {confirmation_id}...")
             
             # Build request
-            request = ByteBuffer()
-            request_id = self.network.get_next_request_id()
-            request.write_uint32(request_id)
-            request.write_uint8(MSG_EXTEND_BOOKING)
-            
-            payload = ByteBuffer()
-            payload.write_uint32(confirmation_id)
-            payload.write_uint32(minutes_to_extend)
-            
-            request.write_uint16(len(payload.buffer))
-            request.buffer.extend(payload.buffer)
+            request_data = encode_request(MSG_EXTEND_BOOKING, self.network.get_next_request_id(),
+                                          booking_id=confirmation_id,
+                                          minutes_to_extend=minutes_to_extend)
             
             # Send request
-            response_data = self.network.send_request(request.get_data())
+            response_data = self.network.send_request(request_data)
             if not response_data:
                 self.ops_result.delete('1.0', tk.END)
                 self.ops_result.insert(tk.END, "Request timeout\n")
@@ -1323,19 +1288,17 @@ class FacilityBookingGUI:
                 return
             
             # Parse response
-            response = ByteBuffer(response_data)
-            resp_request_id = response.read_uint32()
-            status = response.read_uint8()
+            response = decode_response(MSG_EXTEND_BOOKING, response_data)
             
-            if status == MSG_RESPONSE_ERROR:
-                error_msg = response.read_string()
+            if not response.ok:
+                error_msg = response.error
                 self.ops_result.delete('1.0', tk.END)
                 self.ops_result.insert(tk.END, f"Extension failed: {error_msg}\n")
                 self.log(f"Extension failed: {error_msg}")
                 return
             
-            new_end_time = response.read_time()
-            message = response.read_string()
+            new_end_time = response.new_end_time
+            message = response.message
             
             new_end_dt = datetime.fromtimestamp(new_end_time)
             result_text = f"✓ {message}\n"
@@ -1363,20 +1326,12 @@ class FacilityBookingGUI:
             self.log(f"Registering monitor for {facility_name}...")
             
             # Build request
-            request = ByteBuffer()
-            request_id = self.network.get_next_request_id()
-            request.write_uint32(request_id)
-            request.write_uint8(MSG_MONITOR_FACILITY)
-            
-            payload = ByteBuffer()
-            payload.write_string(facility_name)
-            payload.write_uint32(duration)
-            
-            request.write_uint16(len(payload.buffer))
-            request.buffer.extend(payload.buffer)
+            request_data = encode_request(MSG_MONITOR_FACILITY, self.network.get_next_request_id(),
+                                          facility_name=facility_name, duration_seconds=duration,
+                                          availability_format=AVAILABILITY_FORMAT_BITMAP)
             
             # Send request
-            response_data = self.network.send_request(request.get_data())
+            response_data = self.network.send_request(request_data)
             if not response_data:
                 self.monitor_result.delete('1.0', tk.END)
                 self.monitor_result.insert(tk.END, "Request timeout\n")
@@ -1384,18 +1339,16 @@ class FacilityBookingGUI:
                 return
             
             # Parse response
-            response = ByteBuffer(response_data)
-            resp_request_id = response.read_uint32()
-            status = response.read_uint8()
+            response = decode_response(MSG_MONITOR_FACILITY, response_data)
             
-            if status == MSG_RESPONSE_ERROR:
-                error_msg = response.read_string()
+            if not response.ok:
+                error_msg = response.error
                 self.monitor_result.delete('1.0', tk.END)
                 self.monitor_result.insert(tk.END, f"Registration failed: {error_msg}\n")
                 self.log(f"Registration failed: {error_msg}")
                 return
             
-            message = response.read_string()
+            message = response.message
             self.monitor_result.delete('1.0', tk.END)
             self.monitor_result.insert(tk.END, f"✓ {message}\n")
             self.monitor_result.insert(tk.END, f"Monitoring {facility_name} for {duration} seconds\n\n")
@@ -1504,16 +1457,14 @@ class FacilityBookingGUI:
     def process_monitor_update(self, data):
         """Process a monitor update from server"""
         try:
-            response = ByteBuffer(data)
-            request_id = response.read_uint32()
-            status = response.read_uint8()
-            
-            if status == MSG_RESPONSE_SUCCESS:
-                message = response.read_string()
-                operation = response.read_uint8()
-                booking_id = response.read_uint32()
-                start_time = response.read_time()
-                end_time = response.read_time()
+            update = decode_notification(data)
+            
+            if update.ok:
+                message = update.message
+                operation = update.operation
+                booking_id = update.booking_id
+                start_time = update.start_time
+                end_time = update.end_time
                 
                 start_dt = datetime.fromtimestamp(start_time)
                 end_dt = datetime.fromtimestamp(end_time)
@@ -1524,40 +1475,37 @@ class FacilityBookingGUI:
                 
                 # For change/extend operations, show old times
                 if operation == OP_CHANGE or operation == OP_EXTEND:
-                    old_start_time = response.read_time()
-                    old_end_time = response.read_time()
+                    old_start_time = update.old_start_time
+                    old_end_time = update.old_end_time
                     
                     old_start_dt = datetime.fromtimestamp(old_start_time)
                     old_end_dt = datetime.fromtimestamp(old_end_time)
                     
                     update_text += f"Previous: {old_start_dt.strftime('%Y-%m-%d %H:%M')} to {old_end_dt.strftime('%H:%M')}\n"
                 
-                # Read updated availability information
-                num_slots = response.read_uint16()
+                # Read updated availability information (one bitmap per day)
+                day_masks = update.day_masks
+                times = availability_slots(update)
+                num_slots = len(times) // 2
                 update_text += f"\nUpdated Availability ({num_slots} slots):\n"
                 
                 # Clear previous availability display on timetable
                 self.root.after(0, lambda: self.timetable.clear_bookings())
                 
-                for i in range(num_slots):
-                    slot_start = response.read_time()
-                    slot_end = response.read_time()
-                    
+                # Calculate day offsets and update timetable display
+                today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+                for day_start, free_mask in zip(day_masks[::2], day_masks[1::2]):
+                    day_dt = datetime.fromtimestamp(day_start)
+                    slot_day = (day_dt.replace(hour=0, minute=0, second=0, microsecond=0) - today).days
+                    if 0 <= slot_day <= 6:
+                        self.root.after(0, lambda d=slot_day, m=free_mask:
+                                      self.timetable.mark_available_mask(d, m))
+                
+                # Add first few slots to text display
+                for slot_start, slot_end in zip(times[:10:2], times[1:10:2]):
                     slot_start_dt = datetime.fromtimestamp(slot_start)
                     slot_end_dt = datetime.fromtimestamp(slot_end)
-                    
-                    # Calculate day offset
-                    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                    slot_day = (slot_start_dt.replace(hour=0, minute=0, second=0, microsecond=0) - today).days
-                    
-                    # Update timetable display
-                    if 0 <= slot_day <= 6:
-                        self.root.after(0, lambda d=slot_day, s=slot_start_dt.strftime('%H:%M'), e=slot_end_dt.strftime('%H:%M'): 
-                                      self.timetable.mark_available(d, s, e))
-                    
-                    # Add first few slots to text display
-                    if i < 5:  # Show first 5 slots in text
-                        update_text += f"  {slot_start_dt.strftime('%m-%d %H:%M')}-{slot_end_dt.strftime('%H:%M')}\n"
+                    update_text += f"  {slot_start_dt.strftime('%m-%d %H:%M')}-{slot_end_dt.strftime('%H:%M')}\n"
                 
                 if num_slots > 5:
                     update_text += f"  ... and {num_slots - 5} more slots\n"
@@ -1582,9 +1530,20 @@ class FacilityBookingGUI:
         self.monitor_result.see(tk.END)
         self.monitor_result.update_idletasks()  # Force UI update
             
+    def update_rtt_label(self):
+        """Refresh the RTT estimator display periodically"""
+        stats = self.network.get_rtt_stats()
+        if stats['srtt_ms'] is None:
+            text = f"RTT: --  RTO: {stats['rto_ms']:.0f} ms"
+        else:
+            text = f"RTT: {stats['srtt_ms']:.1f} ms  RTO: {stats['rto_ms']:.0f} ms"
+        self.rtt_label.config(text=text)
+        self.root.after(2000, self.update_rtt_label)
+            
     def run(self):
         """Run GUI main loop"""
         self.log("Client started")
+        self.update_rtt_label()
         # 启动后自动加载第一周的数据
         self.root.after(500, self.query_availability)
         self.root.mainloop()
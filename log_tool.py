@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+服务器日志查看/统计工具
+读取服务器的结构化日志 (--log-format text 或 json, 格式见 server/include/logger.h)
+
+  text: 2026-01-01 09:00:00.123 DEBUG [2] event key=value ...
+  json: {"ts": 1767229200.123456, "level": "debug", "thread": 2, "event": "...", ...}
+
+tail 按条件过滤并以统一的文本格式输出 (-f 持续跟踪新增内容);
+summary 统计各级别/事件的记录数、每秒记录数、请求类型和设施分布以及警告和错误。
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+USAGE = ("用法: python log_tool.py tail <log> [-f] [--level <debug|info|warn|error>] [--event <name>] "
+         "| summary <log>")
+
+LEVELS = ["debug", "info", "warn", "error"]
+SERVER_TZ = timezone(timedelta(hours=8))
+FOLLOW_INTERVAL = 0.2  # Seconds between polls with -f
+
+# Request types as logged in the "type" field of "request" records
+MESSAGE_TYPE_NAMES = {
+    1: "查询可用时间", 2: "预订", 3: "修改预订", 4: "监控",
+    5: "最后预订时间", 6: "延长预订", 7: "批量", 8: "统计",
+}
+
+TEXT_LINE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d+) (\w+)\s+\[(\d+)\] (\S+)(.*)$")
+TEXT_FIELD = re.compile(r'(\w+)=("(?:[^"\\]|\\.)*"|\S*)')
+
+Record = Dict[str, object]
+
+
+def parse_value(text: str) -> object:
+    if text.startswith('"'):
+        return json.loads(text)
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_line(line: str) -> Optional[Record]:
+    """Parse one log line in either format; returns None for other output (banners, statistics)."""
+    line = line.strip()
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        return record if isinstance(record, dict) and "event" in record else None
+
+    match = TEXT_LINE.match(line)
+    if not match:
+        return None
+    clock, level, thread, event, rest = match.groups()
+    local = datetime.strptime(clock, "%Y-%m-%d %H:%M:%S.%f").replace(tzinfo=SERVER_TZ)
+    record: Record = {"ts": local.timestamp(), "level": level.lower(), "thread": int(thread), "event": event}
+    for key, value in TEXT_FIELD.findall(rest):
+        record[key] = parse_value(value)
+    return record
+
+
+def read_records(lines: Iterable[str]) -> Iterator[Record]:
+    for line in lines:
+        record = parse_line(line)
+        if record is not None:
+            yield record
+
+
+def follow(f: TextIO) -> Iterator[str]:
+    """Yield lines as they are appended, like tail -f."""
+    pending = ""
+    while True:
+        chunk = f.readline()
+        if not chunk:
+            time.sleep(FOLLOW_INTERVAL)
+            continue
+        pending += chunk
+        if pending.endswith("\n"):
+            yield pending
+            pending = ""
+
+
+def format_value(value: object) -> str:
+    # Quote strings the way the server's text format does
+    if isinstance(value, str) and (not value or re.search(r'[\s"=\\]', value)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def format_time(ts: float, pattern: str = "%Y-%m-%d %H:%M:%S") -> str:
+    return datetime.fromtimestamp(ts, SERVER_TZ).strftime(pattern)
+
+
+def format_record(record: Record) -> str:
+    clock = format_time(float(record["ts"]), "%H:%M:%S.%f")[:-3]
+    fields = " ".join(f"{key}={format_value(value)}" for key, value in record.items()
+                      if key not in ("ts", "level", "thread", "event"))
+    return f"{clock} {str(record['level']).upper():<5} [{record['thread']}] {record['event']} {fields}".rstrip()
+
+
+def tail(path: str, options: List[str]):
+    keep_following = "-f" in options
+    min_level = options[options.index("--level") + 1] if "--level" in options else "debug"
+    event = options[options.index("--event") + 1] if "--event" in options else None
+    if min_level not in LEVELS:
+        raise ValueError(f"未知日志级别: {min_level}")
+    threshold = LEVELS.index(min_level)
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        lines = follow(f) if keep_following else f
+        for record in read_records(lines):
+            if record["level"] in LEVELS and LEVELS.index(record["level"]) < threshold:
+                continue
+            if event is not None and record["event"] != event:
+                continue
+            print(format_record(record), flush=keep_following)
+
+
+def summary(path: str, _options: List[str]):
+    levels: Counter = Counter()
+    events: Counter = Counter()
+    types: Counter = Counter()
+    facilities: Counter = Counter()
+    per_second: Counter = Counter()
+    problems: List[Record] = []
+    first = last = None
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for record in read_records(f):
+            ts = float(record["ts"])
+            first = ts if first is None else min(first, ts)
+            last = ts if last is None else max(last, ts)
+            levels[record["level"]] += 1
+            events[record["event"]] += 1
+            per_second[int(ts)] += 1
+            if record["event"] == "request" and "type" in record:
+                types[MESSAGE_TYPE_NAMES.get(record["type"], str(record["type"]))] += 1
+            if "facility" in record:
+                facilities[record["facility"]] += 1
+            if record["level"] in ("warn", "error"):
+                problems.append(record)
+
+    total = sum(levels.values())
+    if total == 0:
+        print(f"{path}: 没有日志记录")
+        return
+
+    span = last - first
+    print(f"日志: {path}")
+    print(f"记录: {total}, 时间范围: {format_time(first)} - {format_time(last)} ({span:.1f} 秒)")
+    busiest, busiest_count = per_second.most_common(1)[0]
+    print(f"平均每秒记录: {total / max(span, 1.0):.1f}, 峰值: {busiest_count} ({format_time(busiest, '%H:%M:%S')})")
+    print("注意: debug 记录可能经过采样 (--log-sample), 仅反映采样到的请求")
+
+    print(f"\n{'级别':<12}{'记录数':>10}")
+    for level in LEVELS:
+        if levels[level]:
+            print(f"{level:<12}{levels[level]:>10}")
+
+    print(f"\n{'事件':<28}{'记录数':>10}")
+    for event, count in events.most_common():
+        print(f"{event:<28}{count:>10}")
+
+    if types:
+        print(f"\n{'请求类型':<24}{'请求数':>10}")
+        for name, count in types.most_common():
+            print(f"{name:<24}{count:>10}")
+
+    if facilities:
+        print(f"\n{'设施':<24}{'记录数':>10}")
+        for name, count in facilities.most_common(10):
+            print(f"{name:<24}{count:>10}")
+
+    if problems:
+        print(f"\n警告和错误 ({len(problems)} 条, 显示最后 10 条):")
+        for record in problems[-10:]:
+            print(f"  {format_record(record)}")
+
+
+if __name__ == "__main__":
+    commands = {"tail": tail, "summary": summary}
+    if len(sys.argv) < 3 or sys.argv[1] not in commands:
+        print(USAGE)
+        sys.exit(1)
+    try:
+        commands[sys.argv[1]](sys.argv[2], sys.argv[3:])
+    except BrokenPipeError:
+        # Output piped into head etc. was closed early
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    except (OSError, ValueError, IndexError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
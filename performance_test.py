@@ -9,17 +9,36 @@ import sys
 import time
 import threading
 import random
+import socket
+import multiprocessing
 from datetime import datetime
 from typing import List, Dict, Tuple
 import json
 from collections import defaultdict
+from queue import Empty
 
 # 添加client模块到路径
 sys.path.insert(0, '/Users/gigg1ty/Documents/GitHub/Distributed_Facility_Booking_System/client')
 from common.network_client import NetworkClient
-from common.byte_buffer import ByteBuffer
+from common.batch import BatchRequest
+from common.protocol import encode_request, decode_response
 from common.message_types import *
 
+USAGE = ("用法: python performance_test.py <server_ip> <server_port> [num_threads] [ops_per_thread] "
+         "[--drop-rate rate] [--batch size] [--query-scaling max_bookings] [--contention max_clients] "
+         "[--pps processes]")
+
+# 查询扩展性基准: 预订数量阶梯
+QUERY_SCALING_STAGES = [100, 1000, 10000, 100000, 1000000]
+
+# 锁竞争基准: 每个并发客户端数阶梯的运行时间（秒）
+CONTENTION_STAGE_SECONDS = 5.0
+# 协议中的时间字段为 u32, 所有基准预订都必须落在此之前
+MAX_PROTOCOL_TIME = 2 ** 32 - 1
+
+# 包速率基准: 运行时间（秒）与每个进程保持的未完成请求数
+PPS_TEST_SECONDS = 5.0
+PPS_WINDOW = 32
 
 class PerformanceMetrics:
     """性能指标收集器"""
@@ -108,6 +127,8 @@ class FacilityTestClient:
         self.metrics = metrics
         self.client = NetworkClient(server_ip, server_port, drop_rate)
         self.request_id_counter = 1
+        # 复用的接收缓冲区，响应通过 recvfrom_into 原地解码（零拷贝）
+        self.recv_buffer = bytearray(MAX_BUFFER_SIZE)
     
     def _get_next_request_id(self) -> int:
         """获取下一个请求ID"""
@@ -121,38 +142,22 @@ class FacilityTestClient:
         marshal_start = time.time()
         
         # 构建请求
-        request = ByteBuffer()
-        request_id = self._get_next_request_id()
-        request.write_uint32(request_id)
-        request.write_uint8(MSG_QUERY_AVAILABILITY)
-        
-        # 构建payload
-        payload = ByteBuffer()
-        payload.write_string(facility_name)
-        payload.write_uint16(len(days))
-        for day in days:
-            payload.write_uint32(day)
-        
-        request.write_uint16(len(payload.buffer))
-        request.buffer.extend(payload.buffer)
-        request_data = request.get_data()
+        request_data = encode_request(MSG_QUERY_AVAILABILITY, self._get_next_request_id(),
+                                      facility_name=facility_name, days=days)
         
         marshal_time = time.time() - marshal_start
         
         # 发送请求并测量总时间
         start_time = time.time()
-        response_data = self.client.send_request(request_data)
+        response_data = self.client.send_request_into(request_data, self.recv_buffer)
         duration = time.time() - start_time
         
         # 测量unmarshalling时间
         unmarshal_start = time.time()
         success = False
         if response_data:
-            response = ByteBuffer(response_data)
-            resp_request_id = response.read_uint32()
-            status = response.read_uint8()
-            if status == MSG_RESPONSE_SUCCESS:
-                success = True
+            response = decode_response(MSG_QUERY_AVAILABILITY, response_data)
+            success = response.ok
         unmarshal_time = time.time() - unmarshal_start
         
         self.metrics.add_request(duration, success, "QUERY", marshal_time, unmarshal_time)
@@ -163,68 +168,106 @@ class FacilityTestClient:
         marshal_start = time.time()
         
         # 构建请求
-        request = ByteBuffer()
-        request_id = self._get_next_request_id()
-        request.write_uint32(request_id)
-        request.write_uint8(MSG_BOOK_FACILITY)
-        
-        # 构建payload
-        payload = ByteBuffer()
-        payload.write_string(facility_name)
-        payload.write_time(start_time)
-        payload.write_time(end_time)
-        
-        request.write_uint16(len(payload.buffer))
-        request.buffer.extend(payload.buffer)
-        request_data = request.get_data()
+        request_data = encode_request(MSG_BOOK_FACILITY, self._get_next_request_id(),
+                                      facility_name=facility_name,
+                                      start_time=start_time, end_time=end_time)
         
         marshal_time = time.time() - marshal_start
         
         start = time.time()
-        response_data = self.client.send_request(request_data)
+        response_data = self.client.send_request_into(request_data, self.recv_buffer)
         duration = time.time() - start
         
         unmarshal_start = time.time()
         success = False
         booking_id = 0
         if response_data:
-            response = ByteBuffer(response_data)
-            resp_request_id = response.read_uint32()
-            status = response.read_uint8()
-            if status == MSG_RESPONSE_SUCCESS:
-                booking_id = response.read_uint32()
+            response = decode_response(MSG_BOOK_FACILITY, response_data)
+            if response.ok:
+                booking_id = response.booking_id
                 success = True
         unmarshal_time = time.time() - unmarshal_start
         
         self.metrics.add_request(duration, success, "BOOK", marshal_time, unmarshal_time)
         return success, booking_id
+    
+    def run_batch(self, operations: List[Tuple]) -> List[bool]:
+        """在一个MSG_BATCH数据报中执行多个操作"""
+        marshal_start = time.time()
+        
+        batch = BatchRequest()
+        names = []
+        for op in operations:
+            if op[0] == 'query':
+                batch.add_query_availability(op[1], op[2])
+                names.append("QUERY")
+            else:
+                batch.add_book_facility(op[1], op[2], op[3])
+                names.append("BOOK")
+        request_data = batch.build(self._get_next_request_id())
+        
+        marshal_time = time.time() - marshal_start
+        
+        start = time.time()
+        response_data = self.client.send_request_into(request_data, self.recv_buffer)
+        duration = time.time() - start
+        
+        unmarshal_start = time.time()
+        results = [False] * len(operations)
+        if response_data:
+            try:
+                results = [sub_response.ok for sub_response in batch.decode_response(response_data)]
+            except ValueError:
+                pass
+        unmarshal_time = time.time() - unmarshal_start
+        
+        # 每个子操作单独计入统计，延迟为整个批次的往返时间
+        n = len(operations)
+        for name, success in zip(names, results):
+            self.metrics.add_request(duration, success, name, marshal_time / n, unmarshal_time / n)
+        return results
+
+
+def random_operation(facilities: List[str]) -> Tuple:
+    """生成一个随机操作（主要是查询和预订）"""
+    operation = random.choice(['query', 'query', 'book'])  # 更多查询操作
+    facility = random.choice(facilities)
+    
+    if operation == 'query':
+        # 查询未来0-7天的可用性
+        days = [random.randint(0, 7) for _ in range(random.randint(1, 3))]
+        return ('query', facility, days)
+    
+    # 预订从现在开始的某个时间
+    from datetime import datetime, timedelta
+    start_dt = datetime.now() + timedelta(days=random.randint(0, 7), hours=random.randint(0, 23))
+    start_time = int(start_dt.timestamp())
+    duration = random.randint(1, 4) * 3600  # 1-4小时
+    end_time = start_time + duration
+    return ('book', facility, start_time, end_time)
 
 
 def worker_thread(client: FacilityTestClient, operations_per_thread: int, 
-                  facilities: List[str], progress_lock: threading.Lock):
-    """工作线程：执行随机操作"""
+                  facilities: List[str], progress_lock: threading.Lock, batch_size: int = 1):
+    """工作线程：执行随机操作（batch_size > 1 时每个数据报打包多个操作）"""
     booking_ids = []
     
-    for i in range(operations_per_thread):
+    done = 0
+    while done < operations_per_thread:
         try:
-            # 随机选择操作类型（主要是查询和预订）
-            operation = random.choice(['query', 'query', 'book'])  # 更多查询操作
-            facility = random.choice(facilities)
-            
-            if operation == 'query':
-                # 查询未来0-7天的可用性
-                days = [random.randint(0, 7) for _ in range(random.randint(1, 3))]
-                client.query_availability(facility, days)
-            elif operation == 'book':
-                # 预订从现在开始的某个时间
-                from datetime import datetime, timedelta
-                start_dt = datetime.now() + timedelta(days=random.randint(0, 7), hours=random.randint(0, 23))
-                start_time = int(start_dt.timestamp())
-                duration = random.randint(1, 4) * 3600  # 1-4小时
-                end_time = start_time + duration
-                success, booking_id = client.book_facility(facility, start_time, end_time)
-                if success and booking_id > 0:
-                    booking_ids.append(booking_id)
+            if batch_size > 1:
+                count = min(batch_size, operations_per_thread - done)
+                done += count
+                client.run_batch([random_operation(facilities) for _ in range(count)])
+            else:
+                done += 1
+                op = random_operation(facilities)
+                if op[0] == 'query':
+                    client.query_availability(op[1], op[2])
+                else:
+                    success, booking_id = client.book_facility(op[1], op[2], op[3])
+                    if success and booking_id > 0:
+                        booking_ids.append(booking_id)
             
             # 短暂休息以模拟真实场景
             time.sleep(random.uniform(0.001, 0.01))
@@ -253,7 +296,8 @@ def print_live_stats(metrics: PerformanceMetrics, start_time: float,
 
 
 def run_performance_test(server_ip: str, server_port: int, 
-                         num_threads: int, operations_per_thread: int, drop_rate: float = 0.0):
+                         num_threads: int, operations_per_thread: int, drop_rate: float = 0.0,
+                         batch_size: int = 1):
     """运行性能测试"""
     print("=" * 80)
     print("多线程并发性能测试")
@@ -264,6 +308,8 @@ def run_performance_test(server_ip: str, server_port: int,
     print(f"总操作数: {num_threads * operations_per_thread}")
     if drop_rate > 0.0:
         print(f"丢包率: {drop_rate}")
+    if batch_size > 1:
+        print(f"批量大小: {batch_size} 操作/数据报")
     print("=" * 80)
     
     # 测试设施列表（使用服务器中实际存在的设施）
@@ -293,7 +339,7 @@ def run_performance_test(server_ip: str, server_port: int,
     threads = []
     for client in clients:
         thread = threading.Thread(target=worker_thread, 
-                                 args=(client, operations_per_thread, facilities, progress_lock))
+                                 args=(client, operations_per_thread, facilities, progress_lock, batch_size))
         threads.append(thread)
         thread.start()
     
@@ -341,6 +387,19 @@ def run_performance_test(server_ip: str, server_port: int,
         percentage = count / stats['total_requests'] * 100
         print(f"   {op}: {count} ({percentage:.1f}%)")
     
+    rtt_stats = clients[0].client.get_rtt_stats() if clients else {}
+    if rtt_stats:
+        print(f"\n📡 RTT 估计 (自适应重传超时):")
+        if rtt_stats['srtt_ms'] is not None:
+            print(f"   SRTT: {rtt_stats['srtt_ms']:.2f} ms")
+            print(f"   RTTVAR: {rtt_stats['rttvar_ms']:.2f} ms")
+        print(f"   RTO: {rtt_stats['rto_ms']:.2f} ms")
+        print(f"   样本数: {rtt_stats['samples']}")
+        print(f"   超时次数: {rtt_stats['timeouts']}")
+        # 重试预算按客户端独立计算
+        retries_denied = sum(c.client.get_rtt_stats()['retries_denied'] for c in clients)
+        print(f"   重试预算拒绝: {retries_denied}")
+    
     print("\n" + "=" * 80)
     
     # 保存测试结果
@@ -352,19 +411,358 @@ def run_performance_test(server_ip: str, server_port: int,
                 'server': f"{server_ip}:{server_port}",
                 'threads': num_threads,
                 'operations_per_thread': operations_per_thread,
+                'batch_size': batch_size,
                 'total_operations': num_threads * operations_per_thread
             },
             'statistics': stats,
+            'rtt_estimator': rtt_stats,
             'duration_seconds': total_duration,
             'timestamp': datetime.now().isoformat()
         }, f, indent=2)
     
     print(f"\n✅ 测试结果已保存到: {result_file}")
 
+def run_query_scaling_benchmark(server_ip: str, server_port: int, max_bookings: int,
+                                queries_per_stage: int = 200, facility: str = "Lab_102"):
+    """
+    查询扩展性基准：逐步把设施的预订数增加到 max_bookings，
+    每个阶梯测量查询（未来7天）的延迟，验证查询开销不随预订历史增长。
+    预订放在查询窗口之外（30天后），且会持久化到服务器数据中。
+    """
+    stages = [n for n in QUERY_SCALING_STAGES if n <= max_bookings] or [max_bookings]
+    
+    print("=" * 80)
+    print("查询扩展性基准")
+    print("=" * 80)
+    print(f"服务器: {server_ip}:{server_port}")
+    print(f"设施: {facility}")
+    print(f"预订阶梯: {', '.join(str(n) for n in stages)}")
+    print(f"每阶梯查询数: {queries_per_stage}")
+    print("⚠️  基准预订会写入服务器数据")
+    print("=" * 80)
+    
+    client = NetworkClient(server_ip, server_port)
+    recv_buffer = bytearray(MAX_BUFFER_SIZE)
+    days = list(range(7))
+    
+    # 从30天后的整点开始，每个预订占一个30分钟时段
+    base_time = (int(time.time()) // 3600 + 30 * 24) * 3600
+    next_slot = 0
+    booked = 0
+    results = []
+    
+    print(f"\n{'预订数':>10} {'填充耗时(s)':>12} {'平均(ms)':>10} {'P50(ms)':>10} {'P99(ms)':>10}")
+    for target in stages:
+        # 批量填充预订直到达到阶梯目标（已被占用的时段会预订失败并跳过）
+        fill_start = time.time()
+        while booked < target:
+            batch = BatchRequest()
+            for _ in range(min(50, target - booked)):
+                start = base_time + next_slot * 1800
+                batch.add_book_facility(facility, start, start + 1800)
+                next_slot += 1
+            response_data = client.send_request(batch.build(client.get_next_request_id()), timeout=30.0)
+            if not response_data:
+                print("填充预订超时，基准终止")
+                client.close()
+                return results
+            booked += sum(1 for sub_response in batch.decode_response(response_data) if sub_response.ok)
+        fill_time = time.time() - fill_start
+        
+        # 测量查询延迟
+        latencies = []
+        for _ in range(queries_per_stage):
+            request_data = encode_request(MSG_QUERY_AVAILABILITY, client.get_next_request_id(),
+                                          facility_name=facility, days=days,
+                                          availability_format=AVAILABILITY_FORMAT_BITMAP)
+            start = time.perf_counter()
+            response_data = client.send_request_into(request_data, recv_buffer)
+            elapsed = time.perf_counter() - start
+            if response_data and decode_response(MSG_QUERY_AVAILABILITY, response_data).ok:
+                latencies.append(elapsed * 1000)
+        
+        if not latencies:
+            print(f"{booked:>10} 查询全部失败")
+            continue
+        latencies.sort()
+        stage = {
+            'bookings': booked,
+            'fill_seconds': fill_time,
+            'queries': len(latencies),
+            'avg_ms': sum(latencies) / len(latencies),
+            'p50_ms': latencies[len(latencies) // 2],
+            'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        }
+        results.append(stage)
+        print(f"{booked:>10} {fill_time:>12.2f} {stage['avg_ms']:>10.3f} "
+              f"{stage['p50_ms']:>10.3f} {stage['p99_ms']:>10.3f}")
+    
+    client.close()
+    
+    result_file = f"test_result_query_scaling_{int(time.time())}.json"
+    with open(result_file, 'w') as f:
+        json.dump({
+            'test_config': {
+                'server': f"{server_ip}:{server_port}",
+                'facility': facility,
+                'max_bookings': max_bookings,
+                'queries_per_stage': queries_per_stage
+            },
+            'stages': results,
+            'timestamp': datetime.now().isoformat()
+        }, f, indent=2)
+    
+    print(f"\n✅ 测试结果已保存到: {result_file}")
+    return results
+
+
+def contention_worker(server_ip: str, server_port: int, facility: str, region_start: int,
+                      region_hours: int, duration: float, results):
+    """
+    锁竞争基准的客户端进程：在自己的时间区域内循环 预订 -> 修改 -> 查询，
+    不同进程的预订互不冲突，只在服务器的锁上竞争。
+    """
+    client = NetworkClient(server_ip, server_port)
+    recv_buffer = bytearray(MAX_BUFFER_SIZE)
+    requests = 0
+    successes = 0
+    slot = 0
+    
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        # 每个预订占 1 小时区间中的前 30 分钟；区域用完后回绕，之后的预订因冲突失败
+        start = region_start + (slot % region_hours) * 3600
+        slot += 1
+        response_data = client.send_request_into(
+            encode_request(MSG_BOOK_FACILITY, client.get_next_request_id(),
+                           facility_name=facility, start_time=start, end_time=start + 1800),
+            recv_buffer)
+        requests += 1
+        if not response_data:
+            continue
+        response = decode_response(MSG_BOOK_FACILITY, response_data)
+        if not response.ok:
+            continue
+        successes += 1
+        
+        response_data = client.send_request_into(
+            encode_request(MSG_CHANGE_BOOKING, client.get_next_request_id(),
+                           booking_id=response.booking_id, offset_minutes=30),
+            recv_buffer)
+        requests += 1
+        if response_data and decode_response(MSG_CHANGE_BOOKING, response_data).ok:
+            successes += 1
+        
+        response_data = client.send_request_into(
+            encode_request(MSG_QUERY_AVAILABILITY, client.get_next_request_id(),
+                           facility_name=facility, days=list(range(7)),
+                           availability_format=AVAILABILITY_FORMAT_BITMAP),
+            recv_buffer)
+        requests += 1
+        if response_data and decode_response(MSG_QUERY_AVAILABILITY, response_data).ok:
+            successes += 1
+    
+    client.close()
+    results.put((requests, successes))
+
+
+def run_contention_benchmark(server_ip: str, server_port: int, max_clients: int,
+                             duration: float = CONTENTION_STAGE_SECONDS):
+    """
+    锁竞争基准：并发客户端数从 1 倍增到 max_clients，客户端轮流分配到不同设施，
+    执行混合的预订/修改/查询负载，测量吞吐量随并发数的扩展情况。
+    客户端使用独立进程，避免 Python GIL 限制负载生成。
+    """
+    facilities = ["Conference_Room_A", "Conference_Room_B", "Lab_101", "Lab_102", "Auditorium"]
+    stages = []
+    clients = 1
+    while clients < max_clients:
+        stages.append(clients)
+        clients *= 2
+    stages.append(max_clients)
+    
+    print("=" * 80)
+    print("锁竞争基准")
+    print("=" * 80)
+    print(f"服务器: {server_ip}:{server_port}")
+    print(f"并发客户端阶梯: {', '.join(str(n) for n in stages)}")
+    print(f"每阶梯运行时间: {duration:.0f}s")
+    print("提示: 服务器建议使用 --durability enqueue 运行，以排除 fsync 的影响；"
+          "负载机需要足够的 CPU 核数")
+    print("⚠️  基准预订会写入服务器数据")
+    print("=" * 80)
+    
+    # 每个客户端进程占用一段独立的未来时间，所有区域都在 u32 时间范围内
+    base_time = (int(time.time()) // 3600 + 365 * 24) * 3600
+    region_hours = (MAX_PROTOCOL_TIME - base_time) // 3600 // sum(stages)
+    
+    results = []
+    region = 0
+    print(f"\n{'客户端数':>8} {'请求数':>10} {'成功率':>8} {'吞吐量(req/s)':>14} {'加速比':>8} {'扩展效率':>8}")
+    for clients in stages:
+        queue = multiprocessing.Queue()
+        processes = []
+        for i in range(clients):
+            process = multiprocessing.Process(
+                target=contention_worker,
+                args=(server_ip, server_port, facilities[i % len(facilities)],
+                      base_time + region * region_hours * 3600, region_hours, duration, queue))
+            region += 1
+            processes.append(process)
+        
+        start = time.time()
+        for process in processes:
+            process.start()
+        # 进程异常退出时不会上报结果，不能无限等待
+        counts = []
+        while len(counts) < len(processes):
+            try:
+                counts.append(queue.get(timeout=1.0))
+            except Empty:
+                if not any(process.is_alive() for process in processes):
+                    break
+        for process in processes:
+            process.join()
+        elapsed = time.time() - start
+        crashed = sum(1 for process in processes if process.exitcode != 0)
+        if crashed:
+            print(f"⚠️  {crashed} 个客户端进程异常退出，本阶梯结果不完整")
+        
+        requests = sum(c[0] for c in counts)
+        successes = sum(c[1] for c in counts)
+        throughput = requests / elapsed
+        baseline = results[0]['throughput'] if results else throughput
+        speedup = throughput / baseline
+        stage = {
+            'clients': clients,
+            'requests': requests,
+            'success_rate': successes / requests if requests else 0.0,
+            'throughput': throughput,
+            'speedup': speedup,
+            'efficiency': speedup / clients,
+        }
+        results.append(stage)
+        print(f"{clients:>8} {requests:>10} {stage['success_rate'] * 100:>7.1f}% "
+              f"{throughput:>14.1f} {speedup:>8.2f} {stage['efficiency'] * 100:>7.1f}%")
+    
+    result_file = f"test_result_contention_{int(time.time())}.json"
+    with open(result_file, 'w') as f:
+        json.dump({
+            'test_config': {
+                'server': f"{server_ip}:{server_port}",
+                'max_clients': max_clients,
+                'stage_seconds': duration
+            },
+            'stages': results,
+            'timestamp': datetime.now().isoformat()
+        }, f, indent=2)
+    
+    print(f"\n✅ 测试结果已保存到: {result_file}")
+    return results
+
+
+def packet_rate_worker(server_ip: str, server_port: int, facility: str, window: int,
+                       duration: float, results):
+    """
+    包速率基准的客户端进程：不经过 NetworkClient 的停等模式，而是保持 window 个
+    未完成的查询请求，每收到一个回复立即补发一个，使服务器的接收队列持续有积压。
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.2)
+    server = (server_ip, server_port)
+    recv_buffer = bytearray(MAX_BUFFER_SIZE)
+    request_id = 0
+    sent = 0
+    received = 0
+    
+    def send_one():
+        nonlocal request_id, sent
+        request_id = request_id % 0xFFFFFFFF + 1
+        sock.sendto(encode_request(MSG_QUERY_AVAILABILITY, request_id,
+                                   facility_name=facility, days=[0],
+                                   availability_format=AVAILABILITY_FORMAT_BITMAP), server)
+        sent += 1
+    
+    deadline = time.time() + duration
+    for _ in range(window):
+        send_one()
+    while time.time() < deadline:
+        try:
+            sock.recv_into(recv_buffer)
+            received += 1
+            send_one()
+        except socket.timeout:
+            # 回复丢失: 重新填满窗口
+            for _ in range(window):
+                send_one()
+    
+    sock.close()
+    results.put((sent, received))
+
+
+def run_packet_rate_benchmark(server_ip: str, server_port: int, processes: int,
+                              window: int = PPS_WINDOW, duration: float = PPS_TEST_SECONDS):
+    """
+    包速率基准：多个进程以流水线方式发送小查询，测量服务器每秒处理的数据包数。
+    用于比较服务器 --io-batch 1（逐包 recvfrom/sendto）与批量 recvmmsg/sendmmsg。
+    """
+    facilities = ["Conference_Room_A", "Conference_Room_B", "Lab_101", "Lab_102", "Auditorium"]
+    
+    print("=" * 80)
+    print("包速率基准")
+    print("=" * 80)
+    print(f"服务器: {server_ip}:{server_port}")
+    print(f"客户端进程: {processes}, 每进程未完成请求: {window}, 运行时间: {duration:.0f}s")
+    print("=" * 80)
+    
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(
+        target=packet_rate_worker,
+        args=(server_ip, server_port, facilities[i % len(facilities)], window, duration, queue))
+        for i in range(processes)]
+    
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    counts = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    
+    sent = sum(c[0] for c in counts)
+    received = sum(c[1] for c in counts)
+    results = {
+        'processes': processes,
+        'window': window,
+        'sent': sent,
+        'received': received,
+        'sent_pps': sent / elapsed,
+        'received_pps': received / elapsed,
+    }
+    print(f"\n发送: {sent} 包 ({results['sent_pps']:.1f} pps)")
+    print(f"收到回复: {received} 包 ({results['received_pps']:.1f} pps)")
+    print(f"回复率: {received / sent * 100 if sent else 0.0:.1f}%")
+    
+    result_file = f"test_result_pps_{int(time.time())}.json"
+    with open(result_file, 'w') as f:
+        json.dump({
+            'test_config': {
+                'server': f"{server_ip}:{server_port}",
+                'processes': processes,
+                'window': window,
+                'duration_seconds': duration
+            },
+            'results': results,
+            'timestamp': datetime.now().isoformat()
+        }, f, indent=2)
+    
+    print(f"\n✅ 测试结果已保存到: {result_file}")
+    return results
+
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print("用法: python performance_test.py <server_ip> <server_port> [num_threads] [ops_per_thread] [--drop-rate rate]")
+        print(USAGE)
         print("示例: python performance_test.py 127.0.0.1 8080 50 100 --drop-rate 0.1")
         sys.exit(1)
     
@@ -373,6 +771,10 @@ if __name__ == "__main__":
     num_threads = 50
     ops_per_thread = 100
     drop_rate = 0.0
+    batch_size = 1
+    query_scaling = 0
+    contention = 0
+    pps = 0
     
     # Parse additional arguments
     i = 3
@@ -392,9 +794,65 @@ if __name__ == "__main__":
             else:
                 print("错误: --drop-rate 需要一个值")
                 sys.exit(1)
+        elif arg == "--batch":
+            if i + 1 < len(sys.argv):
+                try:
+                    batch_size = int(sys.argv[i + 1])
+                    if batch_size < 1:
+                        print("错误: batch 必须大于等于 1")
+                        sys.exit(1)
+                    i += 2
+                except ValueError:
+                    print("错误: batch 必须是一个整数")
+                    sys.exit(1)
+            else:
+                print("错误: --batch 需要一个值")
+                sys.exit(1)
+        elif arg == "--query-scaling":
+            if i + 1 < len(sys.argv):
+                try:
+                    query_scaling = int(sys.argv[i + 1])
+                    if query_scaling < 1:
+                        print("错误: query-scaling 必须大于等于 1")
+                        sys.exit(1)
+                    i += 2
+                except ValueError:
+                    print("错误: query-scaling 必须是一个整数")
+                    sys.exit(1)
+            else:
+                print("错误: --query-scaling 需要一个值")
+                sys.exit(1)
+        elif arg == "--contention":
+            if i + 1 < len(sys.argv):
+                try:
+                    contention = int(sys.argv[i + 1])
+                    if contention < 1:
+                        print("错误: contention 必须大于等于 1")
+                        sys.exit(1)
+                    i += 2
+                except ValueError:
+                    print("错误: contention 必须是一个整数")
+                    sys.exit(1)
+            else:
+                print("错误: --contention 需要一个值")
+                sys.exit(1)
+        elif arg == "--pps":
+            if i + 1 < len(sys.argv):
+                try:
+                    pps = int(sys.argv[i + 1])
+                    if pps < 1:
+                        print("错误: pps 必须大于等于 1")
+                        sys.exit(1)
+                    i += 2
+                except ValueError:
+                    print("错误: pps 必须是一个整数")
+                    sys.exit(1)
+            else:
+                print("错误: --pps 需要一个值")
+                sys.exit(1)
         elif arg.startswith("--"):
             print(f"未知选项: {arg}")
-            print("用法: python performance_test.py <server_ip> <server_port> [num_threads] [ops_per_thread] [--drop-rate rate]")
+            print(USAGE)
             sys.exit(1)
         else:
             # Positional arguments
@@ -404,8 +862,15 @@ if __name__ == "__main__":
                 ops_per_thread = int(arg)
             else:
                 print("位置参数过多")
-                print("用法: python performance_test.py <server_ip> <server_port> [num_threads] [ops_per_thread] [--drop-rate rate]")
+                print(USAGE)
                 sys.exit(1)
             i += 1
     
-    run_performance_test(server_ip, server_port, num_threads, ops_per_thread, drop_rate)
+    if query_scaling:
+        run_query_scaling_benchmark(server_ip, server_port, query_scaling)
+    elif contention:
+        run_contention_benchmark(server_ip, server_port, contention)
+    elif pps:
+        run_packet_rate_benchmark(server_ip, server_port, pps)
+    else:
+        run_performance_test(server_ip, server_port, num_threads, ops_per_thread, drop_rate, batch_size)
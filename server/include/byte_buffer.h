@@ -27,6 +27,7 @@ public:
     void write_uint8(uint8_t val);
     void write_uint16(uint16_t val);
     void write_uint32(uint32_t val);
+    void write_uint64(uint64_t val);
     void write_time(time_t val);
     void write_string(const std::string &str);
     void write_bytes(const uint8_t *data, size_t len);
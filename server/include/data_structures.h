@@ -6,8 +6,11 @@
 #ifndef DATA_STRUCTURES_H
 #define DATA_STRUCTURES_H
 
+#include <map>
+#include <memory>
 #include <string>
 #include <vector>
+#include <unordered_map>
 #include <ctime>
 #include <netinet/in.h>
 
@@ -27,6 +30,20 @@ struct TimeSlot
     time_t end_time;
 };
 
+// Bookable half-hour slots: 9:00 to 18:00 (UTC+8), 18 per day
+const int SLOT_DURATION = 1800;
+const int SLOTS_PER_DAY = 18;
+const int FIRST_SLOT_HOUR = 9;
+const uint32_t ALL_SLOTS_MASK = (1u << SLOTS_PER_DAY) - 1;
+
+// Availability of one day as a bitmap: bit i set means the slot starting
+// at day_start + i * SLOT_DURATION is free
+struct DayAvailability
+{
+    time_t day_start;
+    uint32_t free_mask;
+};
+
 // Booking operation type for monitor notification
 enum BookingOperation
 {
@@ -51,6 +68,33 @@ struct ClientInfo
 {
     sockaddr_in address;
     time_t expiry_time;
+    uint8_t availability_format; // Encoding negotiated at registration
+    bool format_negotiated;      // False for clients that sent no format byte
+};
+
+// Slot occupancy of one day: how many bookings overlap each slot, and a
+// mask with bit i set while count[i] > 0
+struct DayOccupancy
+{
+    uint32_t busy_mask = 0;
+    uint16_t count[SLOTS_PER_DAY] = {};
+};
+
+// Read-only copy of a facility's busy masks for queries. Writers never
+// modify a published view: they copy the top-level index and the chunks
+// they touch, then swap in the new view (copy-on-write).
+const time_t SCHEDULE_CHUNK_SECONDS = 64 * 86400;
+
+struct ScheduleChunk
+{
+    std::unordered_map<time_t, uint32_t> busy_masks; // Keyed by 9:00 of the day
+};
+
+struct ScheduleView
+{
+    // Keyed by day_start / SCHEDULE_CHUNK_SECONDS
+    std::unordered_map<time_t, std::shared_ptr<const ScheduleChunk>> chunks;
+    time_t last_booking_end = 0;
 };
 
 // Facility structure
@@ -58,6 +102,16 @@ struct Facility
 {
     std::string name;
     std::vector<Booking> bookings;
+    std::unordered_map<time_t, DayOccupancy> occupancy; // Keyed by 9:00 of the day
+    std::shared_ptr<const ScheduleView> view;            // Use std::atomic_load/store
+    time_t last_booking_end = 0;                         // Latest end_time of any booking
+
+    // Conflict-check index: positions in bookings by start time and by ID.
+    // No booking is longer than longest_booking, so only bookings starting
+    // in (start - longest_booking, end) can overlap [start, end).
+    std::multimap<time_t, size_t> by_start;
+    std::unordered_map<uint32_t, size_t> positions;
+    time_t longest_booking = 0;
 };
 
 // Client address for deduplication (used as map key)
@@ -74,11 +128,4 @@ struct ClientAddr
     }
 };
 
-// Response cache entry for at-most-once semantics
-struct CachedResponse
-{
-    std::vector<uint8_t> response_data;
-    time_t timestamp;
-};
-
 #endif // DATA_STRUCTURES_H
@@ -0,0 +1,31 @@
+/**
+ * Datagram I/O
+ * Batched UDP sends with sendmmsg
+ */
+
+#ifndef DATAGRAM_IO_H
+#define DATAGRAM_IO_H
+
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+#include <netinet/in.h>
+
+// Datagrams per recvmmsg/sendmmsg call unless --io-batch says otherwise
+const size_t DEFAULT_IO_BATCH = 32;
+
+// One outgoing datagram; the payload is owned by the caller
+struct OutgoingDatagram
+{
+    const uint8_t *data;
+    size_t size;
+    sockaddr_in address;
+};
+
+// Send every datagram using as few sendmmsg calls as possible. A datagram
+// the kernel rejects is skipped. Returns the number of datagrams sent; the
+// number of system calls made is added to *syscalls if given.
+size_t send_datagrams(int sockfd, const std::vector<OutgoingDatagram> &datagrams,
+                      uint64_t *syscalls = nullptr);
+
+#endif // DATAGRAM_IO_H
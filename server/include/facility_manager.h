@@ -8,44 +8,77 @@
 
 #include "data_structures.h"
 #include "json_storage.h"
+#include "persistence_worker.h"
+#include <atomic>
 #include <map>
 #include <string>
+#include <unordered_map>
 #include <vector>
 #include <memory>
 #include <mutex>
+#include <optional>
 #include <shared_mutex>
 
+class ByteBuffer;
+
+// Booking index shards; a booking lives in shard booking_id % BOOKING_SHARDS
+const size_t BOOKING_SHARDS = 16;
+
 class FacilityManager
 {
 private:
+    struct BookingShard
+    {
+        mutable std::shared_mutex mutex;
+        std::unordered_map<uint32_t, Booking> bookings;
+    };
+
+    // The set of facilities is fixed once initialize() returns, so the map
+    // itself is never locked; each facility's schedule has its own lock
     std::map<std::string, Facility> facilities;
-    std::map<uint32_t, Booking> bookings_by_id;
-    uint32_t next_booking_id;
+    mutable std::map<std::string, std::shared_mutex> facility_locks;
+    BookingShard booking_shards[BOOKING_SHARDS];
+    std::atomic<uint32_t> next_booking_id;
+    std::atomic<size_t> booking_count;
     std::unique_ptr<JsonStorage> storage;
-    
-    // Thread-safety: use shared_mutex for read-write lock
-    // Multiple threads can read simultaneously, but writes are exclusive
-    mutable std::shared_mutex facilities_mutex;
-    mutable std::shared_mutex bookings_mutex;
-    std::mutex storage_mutex;
+    // Owns all storage writes once started (declared after storage so it
+    // is destroyed first)
+    std::unique_ptr<PersistenceWorker> persistence;
+    DurabilityMode durability;
+    std::chrono::milliseconds commit_delay;
+
+    // Lock order: facility lock, then booking shard lock. A mutation holds
+    // its facility's lock exclusively, so bookings of different facilities
+    // are created and changed in parallel. Availability and last booking
+    // time queries read the facility's ScheduleView and take no lock.
 
 public:
     FacilityManager();
+    ~FacilityManager();
+
+    // Choose when mutations are acknowledged (call before initialize)
+    void set_durability(DurabilityMode mode, std::chrono::milliseconds delay);
 
     // Initialize facilities
     void initialize();
 
-    // Persistence
+    // Persistence: save_to_disk() writes a snapshot and truncates the journal
     void save_to_disk();
     void load_from_disk();
+    void begin_shutdown(); // Stop retrying failed journal writes
+    size_t persistence_lag(); // Journal records not yet on disk
+    size_t journal_records(); // Journal records since the last snapshot
+    size_t total_bookings() const { return booking_count; }
 
     // Facility queries (read-only, can be concurrent)
     bool facility_exists(const std::string &name) const;
     const Facility &get_facility(const std::string &name) const;
 
-    // Booking operations (may modify data, need exclusive access)
+    // Booking operations (mutations lock only the facility concerned)
     std::vector<TimeSlot> get_available_slots(const std::string &facility_name,
                                               const std::vector<uint32_t> &days);
+    std::vector<DayAvailability> get_availability(const std::string &facility_name,
+                                                  const std::vector<uint32_t> &days);
     uint32_t create_booking(const std::string &facility_name,
                             time_t start_time, time_t end_time);
     bool change_booking(uint32_t booking_id, int32_t offset_minutes);
@@ -53,11 +86,50 @@ public:
 
     // Booking queries (read-only, can be concurrent)
     bool booking_exists(uint32_t booking_id) const;
-    const Booking &get_booking(uint32_t booking_id) const;
+    std::optional<Booking> get_booking(uint32_t booking_id) const; // A copy taken under the lock
     time_t get_last_booking_time(const std::string &facility_name) const;
 
+    // Marshal availability in the given AvailabilityFormat
+    static void write_availability(ByteBuffer &buffer,
+                                   const std::vector<DayAvailability> &availability,
+                                   uint8_t format);
+
 private:
     bool time_ranges_overlap(time_t start1, time_t end1, time_t start2, time_t end2) const;
+
+    std::shared_mutex &facility_lock(const std::string &name) const;
+    BookingShard &booking_shard(uint32_t booking_id);
+    const BookingShard &booking_shard(uint32_t booking_id) const;
+    Facility *find_booking_facility(uint32_t booking_id);
+    void collect_bookings(std::map<uint32_t, Booking> &bookings) const;
+
+    // Journal (append-only log of mutations since the last snapshot)
+    void replay_journal(const std::vector<Booking> &records, std::map<uint32_t, Booking> &bookings);
+    void commit(uint64_t seq);
+    bool journal_needs_compaction();
+    uint64_t capture_snapshot(std::map<std::string, Facility> &facilities_copy,
+                              std::map<uint32_t, Booking> &bookings_copy);
+
+    // Occupancy bitmaps (callers hold the facility's lock exclusively)
+    static time_t slot_day_start(time_t t);
+    void update_occupancy(Facility &facility, time_t start_time, time_t end_time, int delta,
+                          std::vector<time_t> *touched_days = nullptr);
+    void rebuild_occupancy();
+
+    // Booking index (callers hold the facility's lock; exclusively to modify)
+    static void index_booking(Facility &facility, size_t position);
+    static void reindex_booking_start(Facility &facility, size_t position, time_t old_start);
+    static Booking *find_facility_booking(Facility &facility, uint32_t booking_id);
+    bool has_conflict(const Facility &facility, time_t start_time, time_t end_time,
+                      uint32_t ignored_booking_id = 0) const;
+
+    // Keep Facility::last_booking_end current after a booking's end moved
+    // from old_end (0 for a new booking) to new_end
+    static void update_last_booking_end(Facility &facility, time_t old_end, time_t new_end);
+
+    // Query views: republish the days a mutation touched (facility lock
+    // held exclusively); readers only std::atomic_load the view
+    void publish_view(Facility &facility, const std::vector<time_t> &touched_days);
 };
 
 #endif // FACILITY_MANAGER_H
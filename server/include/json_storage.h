@@ -1,6 +1,7 @@
 /**
  * JSON Storage Manager
- * Uses JSON files for data persistence
+ * Binary snapshot + JSON journal for data persistence; the legacy JSON
+ * snapshot files are still read when no binary snapshot exists
  * Simple, lightweight, zero dependencies (except json.hpp single header)
  */
 
@@ -11,6 +12,30 @@
 #include <string>
 #include <vector>
 #include <map>
+#include <cstdint>
+
+// Compact once the journal holds at least this many records and at least as
+// many records as there are bookings, so snapshot cost stays amortised O(1)
+const size_t JOURNAL_COMPACT_MIN_RECORDS = 10000;
+
+// Binary snapshot layout (little-endian, see snapshot_tool.py):
+//   header:      magic "FBSNAP\0\0", u32 version, u32 facility count,
+//                u32 booking count, u32 name table size in bytes
+//   name table:  per facility u16 length + name bytes, padded to 8 bytes
+//   bookings:    fixed 24-byte records sorted by booking_id:
+//                u32 booking_id, u32 facility index, i64 start, i64 end
+const char SNAPSHOT_MAGIC[8] = {'F', 'B', 'S', 'N', 'A', 'P', '\0', '\0'};
+const uint32_t SNAPSHOT_VERSION = 1;
+const size_t SNAPSHOT_HEADER_SIZE = 24;
+const size_t SNAPSHOT_RECORD_SIZE = 24;
+
+// One journaled mutation: the booking's full state after the operation
+struct JournalRecord
+{
+    uint64_t seq;
+    const char *op; // "book", "change" or "extend"
+    Booking booking;
+};
 
 class JsonStorage
 {
@@ -18,9 +43,17 @@ private:
     std::string data_dir;
     std::string facilities_file;
     std::string bookings_file;
+    std::string journal_file;
+    std::string snapshot_file;
+    int journal_fd;
+    size_t journal_records;
+
+    bool write_file_atomic(const std::string &path, const std::string &contents);
+    bool sync_directory();
 
 public:
     JsonStorage(const std::string &dir = "data");
+    ~JsonStorage();
 
     // 初始化存储目录
     bool initialize();
@@ -33,9 +66,29 @@ public:
     bool save_bookings(const std::map<uint32_t, Booking> &bookings);
     bool load_bookings(std::map<uint32_t, Booking> &bookings);
 
+    // 二进制快照: mmap the file and load facilities and bookings in one pass.
+    // load_snapshot() returns false if there is none; a damaged one is renamed
+    // to snapshot.bin.corrupt.
+    bool has_snapshot();
+    bool save_snapshot(const std::map<std::string, Facility> &facilities,
+                       const std::map<uint32_t, Booking> &bookings);
+    bool load_snapshot(std::map<std::string, Facility> &facilities,
+                       std::map<uint32_t, Booking> &bookings);
+
     // 获取下一个可用的预订ID
     uint32_t get_next_booking_id();
 
+    // 追加日志: one JSON line per mutation, holding the booking's new state.
+    // append_journal() writes a whole batch at once; sync_journal() fsyncs it.
+    bool append_journal(const std::vector<JournalRecord> &records);
+    bool sync_journal();
+    size_t load_journal(std::vector<Booking> &records);
+    size_t journal_size() const;
+
+    // 快照: write the binary snapshot atomically, then truncate the journal
+    bool write_snapshot(const std::map<std::string, Facility> &facilities,
+                        const std::map<uint32_t, Booking> &bookings);
+
     // 工具函数
     bool file_exists(const std::string &filepath);
     bool create_directory(const std::string &dir);
@@ -0,0 +1,165 @@
+/**
+ * Logger
+ * Asynchronous structured logging: per-thread lock-free buffers drained by a background thread
+ */
+
+#ifndef LOGGER_H
+#define LOGGER_H
+
+#include <atomic>
+#include <condition_variable>
+#include <cstdint>
+#include <cstdio>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+enum class LogLevel : uint8_t
+{
+    DEBUG, // Per-request trace; subject to sampling
+    INFO,
+    WARN,
+    ERROR,
+    OFF
+};
+
+enum class LogFormat
+{
+    TEXT, // time LEVEL [thread] event key=value ...
+    JSON  // One JSON object per line
+};
+
+const size_t LOG_BUFFER_BYTES = 256 * 1024; // Per thread; must be a power of two
+const uint32_t LOG_FLUSH_INTERVAL_MS = 50;  // Longest a record waits in its buffer
+const size_t LOG_RECORD_MAX_BYTES = 1024;   // Longer records are truncated
+
+bool parse_log_level(const std::string &name, LogLevel &level);
+bool parse_log_format(const std::string &name, LogFormat &format);
+
+// Records are formatted on the calling thread into a small stack buffer and
+// copied into that thread's ring without locks or system calls; a single
+// background thread drains every ring and writes the records out. When a
+// ring is full the record is dropped and counted, so logging never blocks
+// a worker. A disabled level costs one relaxed load and a branch (see
+// SERVER_LOG below), and its arguments are never evaluated.
+class Logger
+{
+private:
+    // Single-producer (owning thread), single-consumer (drain thread) ring
+    // of [size: u32] [time us: i64] [level: u8] [body] records
+    struct ThreadBuffer
+    {
+        std::unique_ptr<uint8_t[]> data;
+        std::atomic<uint64_t> head{0}; // Bytes ever written, advanced by the owner
+        std::atomic<uint64_t> tail{0}; // Bytes ever drained, advanced by the drainer
+        std::atomic<bool> drain_requested{false};
+        uint32_t thread_index = 0;
+    };
+
+    std::atomic<uint8_t> min_level;
+    LogFormat format;
+    uint32_t sample_every; // Keep debug records of 1 in N request IDs
+    FILE *output;
+    bool owns_output;
+
+    std::mutex buffers_mutex; // Guards the list, not the rings
+    std::vector<std::unique_ptr<ThreadBuffer>> buffers;
+
+    std::thread drainer;
+    std::mutex wake_mutex;
+    std::condition_variable wake_cv;
+    bool running;
+    bool stopping;
+
+    std::atomic<uint64_t> records_written;
+    std::atomic<uint64_t> records_dropped;
+
+    static thread_local ThreadBuffer *local_buffer;
+    static thread_local bool request_sampled;
+    static thread_local uint32_t current_request;
+
+    Logger();
+    ThreadBuffer &thread_buffer();
+    size_t drain(ThreadBuffer &buffer, std::string &out);
+    void append_prefix(std::string &out, int64_t time_us, LogLevel level, uint32_t thread_index) const;
+    void run();
+
+    friend class LogRecord;
+    void submit(LogLevel level, const char *body, size_t size);
+
+public:
+    ~Logger();
+
+    static Logger &instance();
+
+    // Call before start(); path "-" (or empty) means standard output
+    bool configure(LogLevel level, LogFormat log_format, const std::string &path, uint32_t sample);
+    void start();
+    void stop(); // Drains everything still buffered
+
+    bool enabled(LogLevel level) const
+    {
+        return static_cast<uint8_t>(level) >= min_level.load(std::memory_order_relaxed) &&
+               (level != LogLevel::DEBUG || request_sampled);
+    }
+
+    // Tag this thread's following records with a request ID and decide
+    // whether its debug records are sampled
+    void set_request(uint32_t request_id)
+    {
+        current_request = request_id;
+        request_sampled = sample_every <= 1 || request_id % sample_every == 0;
+    }
+
+    // Stop tagging; the last sampling decision stays, so per-batch records
+    // are sampled along with the requests in the batch
+    void clear_request() { current_request = 0; }
+
+    LogLevel level() const { return static_cast<LogLevel>(min_level.load(std::memory_order_relaxed)); }
+    LogFormat output_format() const { return format; }
+    uint64_t written() const { return records_written; }
+    uint64_t dropped() const { return records_dropped; }
+};
+
+// Builds one record and submits it when destroyed:
+//     SERVER_LOG(LogLevel::DEBUG, "request").field("id", id).field("type", type);
+class LogRecord
+{
+private:
+    LogLevel level;
+    bool json;
+    size_t size;
+    char body[LOG_RECORD_MAX_BYTES];
+
+    void append(const char *text, size_t length);
+    void append_char(char c);
+    void append_escaped(const char *text, size_t length);
+    void begin_field(const char *key);
+
+public:
+    LogRecord(LogLevel level, const char *event);
+    ~LogRecord();
+
+    LogRecord(const LogRecord &) = delete;
+    LogRecord &operator=(const LogRecord &) = delete;
+
+    LogRecord &field(const char *key, uint64_t value);
+    LogRecord &field(const char *key, int64_t value);
+    LogRecord &field(const char *key, uint32_t value) { return field(key, static_cast<uint64_t>(value)); }
+    LogRecord &field(const char *key, int value) { return field(key, static_cast<int64_t>(value)); }
+    LogRecord &field(const char *key, double value);
+    LogRecord &field(const char *key, const char *value);
+    LogRecord &field(const char *key, const std::string &value);
+};
+
+// The record (and every argument after it) is skipped unless the level is enabled
+#define SERVER_LOG(level, event)                \
+    if (!Logger::instance().enabled(level))     \
+    {                                           \
+    }                                           \
+    else                                        \
+        LogRecord(level, event)
+
+#endif // LOGGER_H
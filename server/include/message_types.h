@@ -6,6 +6,7 @@
 #ifndef MESSAGE_TYPES_H
 #define MESSAGE_TYPES_H
 
+#include <cstddef>
 #include <cstdint>
 
 // Message type constants
@@ -17,11 +18,36 @@ enum MessageType : uint8_t
     MONITOR_FACILITY = 4,
     GET_LAST_BOOKING_TIME = 5,
     EXTEND_BOOKING = 6,
+    BATCH = 7,
+    STATS = 8, // Live server metrics; empty payload (see UDPServer::build_stats_response)
     RESPONSE_SUCCESS = 100,
-    RESPONSE_ERROR = 101
+    RESPONSE_ERROR = 101,
+    RESPONSE_BUSY = 102 // Request refused unprocessed: [message: string] [retry after ms: u32]
+};
+
+// Options a client may append after the payload (past payload_length),
+// each [option: u8] [value: u32]
+enum RequestOption : uint8_t
+{
+    OPTION_NONE = 0,     // Padding: an option slot the client reserved but did not use
+    OPTION_DEADLINE = 1, // Milliseconds from receipt until the client stops waiting
+    OPTION_ACK = 2       // Highest request_id up to which the client has finished every request
+};
+
+// Availability encodings, chosen by an optional trailing format byte on
+// QUERY_AVAILABILITY and MONITOR_FACILITY requests. Requests without it get
+// the slot list layout with no format byte in the reply.
+enum AvailabilityFormat : uint8_t
+{
+    FORMAT_SLOT_LIST = 0, // [count: u16] count x ([start: u32] [end: u32])
+    FORMAT_BITMAP = 1     // [days: u16] days x ([9:00 of day: u32] [free slot mask: u32])
 };
 
 // Maximum buffer size for UDP packets
 const size_t MAX_BUFFER_SIZE = 65507;
 
+// Operations per batch: few enough that a "not executed" reply for every
+// one of them always fits in the batch response
+const uint16_t MAX_BATCH_OPERATIONS = 1024;
+
 #endif // MESSAGE_TYPES_H
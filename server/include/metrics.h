@@ -0,0 +1,52 @@
+/**
+ * Metrics
+ * Lock-free request counters and latency histograms behind the STATS message
+ */
+
+#ifndef METRICS_H
+#define METRICS_H
+
+#include "message_types.h"
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <vector>
+
+// Bucket i counts latencies of [2^i, 2^(i+1)) microseconds; bucket 0 also
+// holds 0 and the last bucket is open-ended, from about 8 seconds up
+const size_t LATENCY_BUCKETS = 24;
+
+// Request types counted per type: 1 .. MAX_REQUEST_TYPE
+const uint8_t MAX_REQUEST_TYPE = STATS;
+
+class LatencyHistogram
+{
+private:
+    std::atomic<uint64_t> buckets[LATENCY_BUCKETS];
+
+public:
+    LatencyHistogram();
+
+    void record(std::chrono::steady_clock::duration elapsed);
+
+    // Add this histogram's counts to totals (resized to LATENCY_BUCKETS)
+    void add_to(std::vector<uint64_t> &totals) const;
+};
+
+// Per receiver shard, so workers of different shards never share a cache line
+struct RequestMetrics
+{
+    LatencyHistogram queue_wait;   // Receipt until a worker takes the task
+    LatencyHistogram handler_time; // Executing the request (cached replies excluded)
+    std::atomic<uint64_t> requests_by_type[MAX_REQUEST_TYPE + 1] = {};
+
+    void count_request(uint8_t message_type)
+    {
+        if (message_type >= 1 && message_type <= MAX_REQUEST_TYPE)
+        {
+            requests_by_type[message_type].fetch_add(1, std::memory_order_relaxed);
+        }
+    }
+};
+
+#endif // METRICS_H
@@ -7,22 +7,35 @@
 #define MONITOR_MANAGER_H
 
 #include "data_structures.h"
+#include "message_types.h"
+#include <atomic>
 #include <map>
+#include <mutex>
 #include <string>
 #include <vector>
 
+// Mutations of different facilities run concurrently and each notifies
+// its monitors, so the registrations are guarded by one mutex. It is held
+// only to read or update the lists, never while sending notifications.
 class MonitorManager
 {
 private:
+    std::mutex mutex;
     std::map<std::string, std::vector<ClientInfo>> monitors;
+    std::atomic<size_t> registrations; // Entries in monitors, readable without the mutex
+
+    void remove_expired(time_t now); // Called with the mutex held
 
 public:
     MonitorManager();
 
-    // Register a client for monitoring
+    // Register a client for monitoring; format selects the availability
+    // encoding of its notifications (see AvailabilityFormat)
     void register_monitor(const std::string &facility_name,
                           const sockaddr_in &client_addr,
-                          uint32_t duration_seconds);
+                          uint32_t duration_seconds,
+                          uint8_t format = FORMAT_SLOT_LIST,
+                          bool format_negotiated = false);
 
     // Notify all monitors for a facility about a booking change
     // Include updated availability information
@@ -33,6 +46,9 @@ public:
 
     // Clean up expired monitor registrations
     void cleanup_expired_monitors();
+
+    // Registrations held, including expired ones not yet cleaned up
+    size_t monitor_count() const { return registrations; }
 };
 
 #endif // MONITOR_MANAGER_H
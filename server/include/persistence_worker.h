@@ -0,0 +1,94 @@
+/**
+ * Persistence Worker
+ * Background thread that group-commits journal records and takes snapshots
+ */
+
+#ifndef PERSISTENCE_WORKER_H
+#define PERSISTENCE_WORKER_H
+
+#include "json_storage.h"
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+// When a mutation's reply may be sent, relative to its journal record
+enum class DurabilityMode
+{
+    FSYNC,   // After the record is fsynced (concurrent records share one fsync)
+    ENQUEUE, // As soon as the record is queued; the worker flushes right away
+    DELAY    // As soon as the record is queued; flushed within the commit delay
+};
+
+// Copies the data for a snapshot and returns the last sequence number the
+// copy includes. Must hold the data locks so no record can be enqueued meanwhile.
+using SnapshotCapture = std::function<uint64_t(std::map<std::string, Facility> &,
+                                               std::map<uint32_t, Booking> &)>;
+
+class PersistenceWorker
+{
+private:
+    JsonStorage &storage;
+    DurabilityMode mode;
+    std::chrono::milliseconds commit_delay;
+    SnapshotCapture capture;
+
+    std::thread worker;
+    std::mutex mutex;
+    std::condition_variable work_cv;    // Wakes the worker
+    std::condition_variable durable_cv; // Wakes callers waiting for their record
+    std::vector<JournalRecord> pending;
+    std::chrono::steady_clock::time_point first_pending_time;
+    uint64_t last_seq;      // Last sequence number handed out
+    uint64_t durable_seq;   // Every record up to here is on disk
+    uint64_t snapshot_seq;  // Every record up to here is in the snapshot
+    uint64_t abandoned_seq; // Failed records up to here were given up at shutdown
+    uint64_t snapshots_requested;
+    uint64_t snapshots_done;
+    bool running;
+    bool stopping;
+    bool abandon_failed; // Give up on failed writes instead of retrying them
+
+    // Statistics
+    std::atomic<uint64_t> batches_written;
+    std::atomic<uint64_t> records_written;
+    std::atomic<uint64_t> snapshots_written;
+    std::atomic<uint64_t> write_failures;
+
+    void run();
+    void take_snapshot();
+
+public:
+    PersistenceWorker(JsonStorage &storage, DurabilityMode mode,
+                      std::chrono::milliseconds commit_delay);
+    ~PersistenceWorker();
+
+    void start(SnapshotCapture capture);
+    void stop(); // Flushes everything still queued
+
+    // Queue a journal record (call with the data locks held, so the journal
+    // order matches the order mutations were applied) and get its sequence number
+    uint64_t enqueue(const char *op, const Booking &booking);
+
+    // Block until the record may be acknowledged under the durability mode.
+    // A failed journal write is retried until it succeeds, so this only
+    // returns false once shutdown gave up on the record.
+    bool wait_durable(uint64_t seq);
+
+    // Shutdown: fail records that cannot be written instead of retrying
+    // them, so callers waiting on a broken disk can finish
+    void abandon_failed_writes();
+
+    // Ask for a snapshot + journal truncation, optionally waiting for it
+    void request_snapshot(bool wait);
+
+    uint64_t last_sequence();
+    size_t journal_records(); // Records enqueued since the last snapshot
+    size_t pending_records(); // Records enqueued but not yet on disk
+    void print_statistics() const;
+};
+
+#endif // PERSISTENCE_WORKER_H
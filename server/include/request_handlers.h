@@ -10,6 +10,10 @@
 #include "facility_manager.h"
 #include "monitor_manager.h"
 #include <netinet/in.h>
+#include <functional>
+
+// Executes one sub-request of a batch: (message_type, payload) -> response
+using BatchDispatcher = std::function<ByteBuffer(uint8_t, ByteBuffer &)>;
 
 class RequestHandlers
 {
@@ -27,6 +31,12 @@ public:
     ByteBuffer handle_monitor_facility(ByteBuffer &request, const sockaddr_in &client_addr);
     ByteBuffer handle_get_last_booking_time(ByteBuffer &request);
     ByteBuffer handle_extend_booking(ByteBuffer &request);
+    ByteBuffer handle_batch(ByteBuffer &request, const BatchDispatcher &dispatch);
+
+private:
+    static bool is_supported_format(uint8_t format);
+    static bool is_batchable(uint8_t message_type);
+    static bool is_mutation(uint8_t message_type);
 };
 
 #endif // REQUEST_HANDLERS_H
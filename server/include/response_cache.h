@@ -0,0 +1,181 @@
+/**
+ * Response Cache
+ * Sharded, byte-bounded reply cache for at-most-once duplicate filtering
+ */
+
+#ifndef RESPONSE_CACHE_H
+#define RESPONSE_CACHE_H
+
+#include "data_structures.h"
+#include <atomic>
+#include <bitset>
+#include <cstdint>
+#include <deque>
+#include <mutex>
+#include <set>
+#include <unordered_map>
+#include <unordered_set>
+#include <vector>
+
+const size_t DEFAULT_CACHE_BYTES = 64 * 1024 * 1024;
+const size_t RESPONSE_CACHE_SHARDS = 16;
+const uint32_t RESPONSE_CACHE_TTL = 300; // Seconds a reply is kept for retransmissions
+const size_t REPLAY_WINDOW_BITS = 1024;   // Request IDs below a client's highest one that are tracked
+
+// Counters exposed for statistics
+struct ResponseCacheStats
+{
+    uint64_t hits;
+    uint64_t misses;
+    uint64_t evictions;   // Dropped early to stay within the byte budget
+    uint64_t expirations; // Dropped after RESPONSE_CACHE_TTL
+    uint64_t released;    // Dropped because the client acknowledged them
+    uint64_t entries;
+    uint64_t clients;
+    uint64_t bytes;
+};
+
+enum class CacheLookup
+{
+    MISS,
+    HIT,
+    IN_PROGRESS,  // Another copy is executing right now; its reply is not cached yet
+    ACKNOWLEDGED, // The client acknowledged it, so no one waits for a reply; ignore it
+    UNAVAILABLE,  // Marked in the replay window, but its reply was evicted
+    TOO_OLD       // Older than the replay window: it may have run, there is no telling
+};
+
+// Replies are hashed by (client, request_id) into shards chosen by client
+// address, each with its own lock and share of the byte budget. Every
+// shard keeps a time wheel with one bucket per second of insertion time:
+// expiry drains whole buckets as they age out, and when the shard is over
+// budget the oldest bucket is drained first, so neither needs a scan.
+//
+// Clients may acknowledge every request up to some ID. Those replies are
+// freed at once and the acknowledged ID is remembered, so a delayed copy
+// of such a request is recognised without keeping its reply.
+//
+// Each client also has a replay window in the style of IPsec: its highest
+// cached request ID plus a bitmap of the REPLAY_WINDOW_BITS IDs below it.
+// A request marked there whose reply was evicted is still known to have
+// run, and one older than the window may have run; neither is executed
+// a second time, and the caller tells the client its result is unknown.
+//
+// A lookup that misses claims the request: it stays in progress until
+// its reply is inserted (or the claim is released), and copies arriving
+// meanwhile get IN_PROGRESS instead of running it a second time.
+class ResponseCache
+{
+private:
+    struct Key
+    {
+        ClientAddr client;
+        uint32_t request_id; // 0 stands for the client's own record
+
+        bool operator==(const Key &other) const
+        {
+            return client.ip == other.client.ip && client.port == other.client.port &&
+                   request_id == other.request_id;
+        }
+    };
+
+    struct KeyHash
+    {
+        size_t operator()(const Key &key) const;
+    };
+
+    struct ClientHash
+    {
+        size_t operator()(const ClientAddr &client) const;
+    };
+
+    struct ClientEqual
+    {
+        bool operator()(const ClientAddr &a, const ClientAddr &b) const
+        {
+            return a.ip == b.ip && a.port == b.port;
+        }
+    };
+
+    struct Entry
+    {
+        std::vector<uint8_t> response;
+        uint64_t stamp = 0; // Matches the wheel slot that owns this entry
+    };
+
+    // Per-client bookkeeping; expires once the client is idle for the TTL
+    struct ClientState
+    {
+        std::set<uint32_t> request_ids; // Cached replies, oldest first
+        uint32_t acked_through = 0;
+        uint32_t highest_seen = 0;            // Top of the replay window (0: empty)
+        std::bitset<REPLAY_WINDOW_BITS> seen; // Bit i: request highest_seen - i was cached
+        uint64_t stamp = 0;
+        uint64_t tick = 0; // Second of the last refresh
+    };
+
+    struct WheelSlot
+    {
+        Key key;
+        uint64_t stamp;
+    };
+
+    struct Shard
+    {
+        std::mutex mutex;
+        std::unordered_map<Key, Entry, KeyHash> entries;
+        std::unordered_map<ClientAddr, ClientState, ClientHash, ClientEqual> clients;
+        std::unordered_set<Key, KeyHash> in_progress; // Claimed by a lookup, reply not inserted yet
+        std::vector<std::deque<WheelSlot>> wheel;     // Indexed by insertion second
+        uint64_t oldest_tick = 0;                 // Earliest second that may have entries
+        uint64_t next_stamp = 1;
+        size_t bytes = 0;
+    };
+
+    Shard shards[RESPONSE_CACHE_SHARDS];
+    size_t shard_budget;
+
+    std::atomic<uint64_t> hits;
+    std::atomic<uint64_t> misses;
+    std::atomic<uint64_t> evictions;
+    std::atomic<uint64_t> expirations;
+    std::atomic<uint64_t> released;
+    std::atomic<uint64_t> entry_count;
+    std::atomic<uint64_t> client_count;
+    std::atomic<uint64_t> byte_count;
+
+    Shard &shard_for(const ClientAddr &client);
+    static uint64_t now_tick();
+    static size_t entry_cost(size_t response_size);
+    static bool window_contains(const ClientState &state, uint32_t request_id);
+    static void window_mark(ClientState &state, uint32_t request_id);
+
+    // Called with the shard's mutex held
+    ClientState &touch_client(Shard &shard, const ClientAddr &client, uint64_t now);
+    void erase_entry(Shard &shard, const Key &key, std::atomic<uint64_t> &counter);
+    bool drop_slot(Shard &shard, const WheelSlot &slot, std::atomic<uint64_t> &counter);
+    void expire(Shard &shard, uint64_t now);
+    bool evict_oldest(Shard &shard, uint64_t now);
+
+public:
+    explicit ResponseCache(size_t byte_budget = DEFAULT_CACHE_BYTES);
+
+    // Copy the cached reply for a retransmitted request into response.
+    // On MISS the request is claimed as in progress: the caller must
+    // follow up with insert or release.
+    CacheLookup lookup(const ClientAddr &client, uint32_t request_id, std::vector<uint8_t> &response);
+
+    // Remember the reply to a claimed request, evicting the oldest replies if needed
+    void insert(const ClientAddr &client, uint32_t request_id, const uint8_t *data, size_t size);
+
+    // Drop the claim on a request that produced no reply to cache
+    void release(const ClientAddr &client, uint32_t request_id);
+
+    // The client has finished with every request up to acked_through
+    void acknowledge(const ClientAddr &client, uint32_t acked_through);
+
+    ResponseCacheStats stats() const;
+    size_t byte_budget() const { return shard_budget * RESPONSE_CACHE_SHARDS; }
+};
+
+#endif // RESPONSE_CACHE_H
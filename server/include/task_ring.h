@@ -0,0 +1,160 @@
+/**
+ * Task Ring
+ * Bounded multi-producer multi-consumer queue of preallocated request slots
+ */
+
+#ifndef TASK_RING_H
+#define TASK_RING_H
+
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <cstddef>
+#include <cstdint>
+#include <memory>
+#include <mutex>
+#include <vector>
+#include <netinet/in.h>
+
+// Datagrams up to this size are stored inside the slot; larger ones (big
+// BATCH requests) spill into the slot's overflow buffer
+const size_t TASK_SLOT_SIZE = 2048;
+
+// Slots per receiver; a datagram that finds the ring full is dropped
+const size_t TASK_RING_CAPACITY = 1024;
+
+// Request task structure (lives in a ring slot and is reused)
+struct RequestTask
+{
+    uint8_t inline_data[TASK_SLOT_SIZE];
+    std::vector<uint8_t> overflow;
+    size_t size = 0;
+    sockaddr_in client_addr;
+    std::chrono::steady_clock::time_point receive_time;
+
+    const uint8_t *data() const { return size > TASK_SLOT_SIZE ? overflow.data() : inline_data; }
+    void assign(const uint8_t *bytes, size_t length);
+};
+
+// Lock-free ring after Vyukov's bounded MPMC queue: each slot carries a
+// sequence number telling producers and consumers whose turn it is. Tasks
+// are filled and processed in place, so the ring allocates nothing per
+// packet. Consumers only take the mutex to sleep when the ring is empty.
+class TaskRing
+{
+private:
+    struct Slot
+    {
+        std::atomic<size_t> sequence;
+        RequestTask task;
+    };
+
+    std::unique_ptr<Slot[]> slots;
+    size_t mask;
+
+    alignas(64) std::atomic<size_t> enqueue_pos;
+    alignas(64) std::atomic<size_t> dequeue_pos;
+    alignas(64) std::atomic<size_t> high_water;
+    std::atomic<uint64_t> rejected; // Pushes that found the ring full
+
+    std::mutex wait_mutex;
+    std::condition_variable wait_cv;
+    std::atomic<size_t> sleepers;
+
+    bool ready() const; // The next slot to pop has been published
+
+public:
+    explicit TaskRing(size_t capacity = TASK_RING_CAPACITY); // Rounded up to a power of two
+
+    // Claim a free slot, let fill() write the task, then publish it.
+    // Returns false without calling fill() if the ring is full.
+    template <typename Fill>
+    bool try_push(Fill &&fill);
+
+    // Claim the oldest published task, let consume() process it in place,
+    // then free the slot. Returns false if no task is ready.
+    template <typename Consume>
+    bool try_pop(Consume &&consume);
+
+    // Wake consumers after publishing count tasks
+    void wake_consumers(size_t count);
+
+    // Block until a task is ready or stop is set
+    void wait(const std::atomic<bool> &stop);
+    void wake_all();
+
+    size_t capacity() const { return mask + 1; }
+    size_t depth() const; // Tasks claimed by producers but not yet by consumers
+    size_t high_water_mark() const { return high_water; }
+    uint64_t rejected_count() const { return rejected; }
+};
+
+template <typename Fill>
+bool TaskRing::try_push(Fill &&fill)
+{
+    size_t pos = enqueue_pos.load(std::memory_order_relaxed);
+    Slot *slot;
+    while (true)
+    {
+        slot = &slots[pos & mask];
+        size_t sequence = slot->sequence.load(std::memory_order_acquire);
+        intptr_t diff = static_cast<intptr_t>(sequence) - static_cast<intptr_t>(pos);
+        if (diff == 0)
+        {
+            if (enqueue_pos.compare_exchange_weak(pos, pos + 1, std::memory_order_relaxed))
+                break;
+        }
+        else if (diff < 0)
+        {
+            rejected++;
+            return false; // Full: the slot from the previous lap is not freed yet
+        }
+        else
+        {
+            pos = enqueue_pos.load(std::memory_order_relaxed);
+        }
+    }
+
+    fill(slot->task);
+    // seq_cst pairs with the sleeper count in wait() so no wake-up is lost
+    slot->sequence.store(pos + 1, std::memory_order_seq_cst);
+
+    size_t current = depth();
+    size_t peak = high_water.load(std::memory_order_relaxed);
+    while (current > peak && !high_water.compare_exchange_weak(peak, current, std::memory_order_relaxed))
+    {
+    }
+    return true;
+}
+
+template <typename Consume>
+bool TaskRing::try_pop(Consume &&consume)
+{
+    size_t pos = dequeue_pos.load(std::memory_order_relaxed);
+    Slot *slot;
+    while (true)
+    {
+        slot = &slots[pos & mask];
+        size_t sequence = slot->sequence.load(std::memory_order_acquire);
+        intptr_t diff = static_cast<intptr_t>(sequence) - static_cast<intptr_t>(pos + 1);
+        if (diff == 0)
+        {
+            if (dequeue_pos.compare_exchange_weak(pos, pos + 1, std::memory_order_relaxed))
+                break;
+        }
+        else if (diff < 0)
+        {
+            return false; // Empty, or the producer is still filling the slot
+        }
+        else
+        {
+            pos = dequeue_pos.load(std::memory_order_relaxed);
+        }
+    }
+
+    consume(slot->task);
+    slot->sequence.store(pos + mask + 1, std::memory_order_release);
+    return true;
+}
+
+#endif // TASK_RING_H
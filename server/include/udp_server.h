@@ -10,54 +10,101 @@
 #include "monitor_manager.h"
 #include "request_handlers.h"
 #include "data_structures.h"
+#include "datagram_io.h"
+#include "task_ring.h"
+#include "response_cache.h"
+#include "metrics.h"
 #include <map>
 #include <thread>
 #include <mutex>
-#include <queue>
 #include <condition_variable>
 #include <atomic>
 #include <vector>
 #include <functional>
+#include <memory>
 
-// Request task structure
-struct RequestTask
+// Load shedding: a new request gets a RESPONSE_BUSY reply instead of a
+// queue slot once the shard's queue is SHED_QUEUE_PERCENT full, or once
+// queued requests wait longer than the maximum queue delay
+const size_t SHED_QUEUE_PERCENT = 75;
+const uint32_t DEFAULT_MAX_QUEUE_DELAY_MS = 250;
+const uint32_t MIN_RETRY_AFTER_MS = 20;
+const uint32_t MAX_RETRY_AFTER_MS = 2000;
+
+// Header fields and options of a received request
+struct RequestOptions
+{
+    size_t frame_size = 0; // Header and payload, without the options
+    bool has_deadline = false;
+    uint32_t deadline_ms = 0;
+    bool has_ack = false;
+    uint32_t acked_through = 0;
+};
+
+// Reply produced by a worker, held until the worker flushes its batch
+struct PendingReply
 {
     std::vector<uint8_t> data;
     sockaddr_in client_addr;
-    time_t receive_time;
+};
+
+// One socket bound to the server port with its own receive thread, task
+// ring and worker group. With several receivers the sockets share the
+// port through SO_REUSEPORT; the kernel hashes each client's 4-tuple to
+// one socket, so a client always stays on one shard.
+struct ReceiverShard
+{
+    size_t index = 0;
+    int sockfd = -1;
+    std::thread receive_thread;
+    std::vector<std::thread> worker_threads;
+    TaskRing tasks;
+
+    std::atomic<uint64_t> received{0};
+    std::atomic<uint32_t> queue_delay_ms{0}; // How long the last task taken had waited
+    RequestMetrics metrics;
 };
 
 class UDPServer
 {
 private:
     int port;
-    int sockfd;
     bool use_at_most_once;
     float drop_rate; // Packet drop rate (0.0-1.0)
 
-    // Thread pool configuration
+    // Thread pool configuration (num_threads workers split across receivers)
     size_t num_threads;
-    std::vector<std::thread> worker_threads;
-    std::queue<RequestTask> task_queue;
-    std::mutex queue_mutex;
-    std::condition_variable queue_cv;
+    size_t num_receivers;
+    size_t io_batch; // Datagrams per recvmmsg/sendmmsg call
+    uint32_t max_queue_delay_ms; // 0 disables load shedding
+    std::vector<std::unique_ptr<ReceiverShard>> shards;
     std::atomic<bool> shutdown_flag;
+    std::chrono::steady_clock::time_point start_time;
 
     // Shared resources with thread-safe access
     FacilityManager facility_manager;
     MonitorManager monitor_manager;
-
-    // Response cache for at-most-once semantics (thread-safe)
-    std::map<ClientAddr, std::map<uint32_t, CachedResponse>> response_cache;
-    std::mutex cache_mutex;
+    ResponseCache response_cache; // Replies kept for at-most-once retransmissions
 
     // Statistics
     std::atomic<uint64_t> total_requests;
     std::atomic<uint64_t> processed_requests;
-    std::atomic<uint64_t> cached_responses;
+    std::atomic<uint64_t> shed_requests;
+    std::atomic<uint64_t> expired_requests;
+    std::atomic<uint64_t> ignored_duplicates;     // Acknowledged by the client already
+    std::atomic<uint64_t> in_progress_duplicates; // Arrived while the first copy was executing
+    std::atomic<uint64_t> unavailable_replies;    // Ran before, reply evicted
+    std::atomic<uint64_t> stale_requests;         // Older than the replay window
+    std::atomic<uint64_t> receive_calls;
+    std::atomic<uint64_t> send_calls;
+    std::atomic<uint64_t> responses_sent;
 
 public:
-    UDPServer(int port, bool at_most_once, size_t thread_count = 4, float drop_rate = 0.0f);
+    UDPServer(int port, bool at_most_once, size_t thread_count = 4, float drop_rate = 0.0f,
+              DurabilityMode durability = DurabilityMode::FSYNC, uint32_t commit_delay_ms = 5,
+              size_t receivers = 1, size_t io_batch = DEFAULT_IO_BATCH,
+              uint32_t max_queue_delay_ms = DEFAULT_MAX_QUEUE_DELAY_MS,
+              size_t cache_bytes = DEFAULT_CACHE_BYTES);
     ~UDPServer();
 
     // Start the server
@@ -67,18 +114,24 @@ public:
     void print_statistics() const;
 
 private:
-    bool initialize_socket();
-    void worker_thread_func();
-    void process_task(const RequestTask &task);
-    ByteBuffer process_request(ByteBuffer &request, const sockaddr_in &client_addr);
-    bool check_cache(const ClientAddr &client_key, uint32_t request_id,
-                     std::vector<uint8_t> &cached_response);
-    void cache_response(const ClientAddr &client_key, uint32_t request_id,
-                        const ByteBuffer &response);
-    void cleanup_old_cache_entries();
+    bool initialize_socket(ReceiverShard &shard);
+    void receive_loop(ReceiverShard &shard);
+    void worker_thread_func(ReceiverShard &shard);
+    void process_task(ReceiverShard &shard, const RequestTask &task, std::vector<PendingReply> &replies);
+    static RequestOptions parse_request_options(const uint8_t *data, size_t size);
+    static bool is_idempotent(uint8_t message_type);
+    ByteBuffer process_request(ByteBuffer &request, const sockaddr_in &client_addr, int sockfd);
+    ByteBuffer dispatch_operation(uint8_t message_type, ByteBuffer &request,
+                                  const sockaddr_in &client_addr, int sockfd);
+    bool should_shed(const ReceiverShard &shard, uint32_t &retry_after_ms) const;
+    std::vector<uint8_t> build_error_response(uint32_t request_id, const char *message) const;
+    std::vector<uint8_t> build_busy_response(uint32_t request_id, uint32_t retry_after_ms) const;
+    ByteBuffer build_stats_response();
     bool should_drop_packet() const; // Check if packet should be dropped
-    void send_response_with_drop_simulation(const std::vector<uint8_t> &response_data,
-                                            const sockaddr_in &client_addr);
+    void queue_response_with_drop_simulation(std::vector<PendingReply> &replies,
+                                             std::vector<uint8_t> response_data,
+                                             const sockaddr_in &client_addr);
+    void flush_responses(ReceiverShard &shard, std::vector<PendingReply> &replies);
 };
 
 #endif // UDP_SERVER_H
@@ -29,6 +29,12 @@ void ByteBuffer::write_uint32(uint32_t val)
     buffer.insert(buffer.end(), bytes, bytes + sizeof(net_val));
 }
 
+void ByteBuffer::write_uint64(uint64_t val)
+{
+    write_uint32(static_cast<uint32_t>(val >> 32));
+    write_uint32(static_cast<uint32_t>(val));
+}
+
 void ByteBuffer::write_time(time_t val)
 {
     write_uint32(static_cast<uint32_t>(val));
@@ -0,0 +1,55 @@
+/**
+ * Datagram I/O Implementation
+ */
+
+#include "../include/datagram_io.h"
+#include <sys/socket.h>
+#include <algorithm>
+#include <cerrno>
+
+// Linux accepts at most UIO_MAXIOV (1024) messages per call
+static const size_t MAX_MESSAGES_PER_CALL = 1024;
+
+size_t send_datagrams(int sockfd, const std::vector<OutgoingDatagram> &datagrams,
+                      uint64_t *syscalls)
+{
+    size_t count = std::min(datagrams.size(), MAX_MESSAGES_PER_CALL);
+    std::vector<mmsghdr> messages(count);
+    std::vector<iovec> iovecs(count);
+
+    size_t sent = 0;
+    size_t next = 0;
+    while (next < datagrams.size())
+    {
+        // Fill the headers for the next chunk
+        size_t chunk = std::min(datagrams.size() - next, MAX_MESSAGES_PER_CALL);
+        for (size_t i = 0; i < chunk; i++)
+        {
+            const OutgoingDatagram &datagram = datagrams[next + i];
+            iovecs[i].iov_base = const_cast<uint8_t *>(datagram.data);
+            iovecs[i].iov_len = datagram.size;
+            messages[i] = mmsghdr{};
+            messages[i].msg_hdr.msg_name = const_cast<sockaddr_in *>(&datagram.address);
+            messages[i].msg_hdr.msg_namelen = sizeof(datagram.address);
+            messages[i].msg_hdr.msg_iov = &iovecs[i];
+            messages[i].msg_hdr.msg_iovlen = 1;
+        }
+
+        int result = sendmmsg(sockfd, messages.data(), static_cast<unsigned int>(chunk), 0);
+        if (syscalls)
+        {
+            (*syscalls)++;
+        }
+        if (result < 0)
+        {
+            if (errno == EINTR)
+                continue;
+            next++; // The first datagram failed: skip it and go on
+            continue;
+        }
+        sent += static_cast<size_t>(result);
+        next += static_cast<size_t>(result);
+    }
+
+    return sent;
+}
@@ -3,12 +3,19 @@
  */
 
 #include "../include/facility_manager.h"
+#include "../include/byte_buffer.h"
+#include "../include/message_types.h"
+#include "../include/logger.h"
 #include <algorithm>
+#include <stdexcept>
 #include <iostream>
 
 FacilityManager::FacilityManager()
     : next_booking_id(1),
-      storage(std::make_unique<JsonStorage>("data"))
+      booking_count(0),
+      storage(std::make_unique<JsonStorage>("data")),
+      durability(DurabilityMode::FSYNC),
+      commit_delay(5)
 {
     // Initialize JSON storage
     if (!storage->initialize())
@@ -22,6 +29,21 @@ FacilityManager::FacilityManager()
     strftime(time_str, sizeof(time_str), "%Y-%m-%d %H:%M:%S %Z", tm_info);
 }
 
+FacilityManager::~FacilityManager()
+{
+    // Flush queued journal records before the data goes away
+    if (persistence)
+    {
+        persistence->stop();
+    }
+}
+
+void FacilityManager::set_durability(DurabilityMode mode, std::chrono::milliseconds delay)
+{
+    durability = mode;
+    commit_delay = delay;
+}
+
 void FacilityManager::initialize()
 {
     // First try to load data from disk
@@ -45,140 +67,607 @@ void FacilityManager::initialize()
         }
 
         std::cout << "Created " << facilities.size() << " default facilities" << std::endl;
-        save_to_disk(); // Save newly created facilities
+    }
+
+    for (const auto &pair : facilities)
+    {
+        facility_locks[pair.first]; // Constructs the facility's lock in place
+    }
+
+    // Snapshot new facilities or migrated JSON data, or fold the replayed
+    // journal into a fresh snapshot
+    if (storage && (!storage->has_snapshot() || storage->journal_size() > 0))
+    {
+        save_to_disk();
+    }
+
+    // From here on only the persistence worker touches storage
+    persistence = std::make_unique<PersistenceWorker>(*storage, durability, commit_delay);
+    persistence->start([this](std::map<std::string, Facility> &facilities_copy,
+                              std::map<uint32_t, Booking> &bookings_copy)
+                       { return capture_snapshot(facilities_copy, bookings_copy); });
+}
+
+void FacilityManager::begin_shutdown()
+{
+    if (persistence)
+    {
+        persistence->abandon_failed_writes();
     }
 }
 
 void FacilityManager::save_to_disk()
 {
-    std::lock_guard<std::mutex> lock(storage_mutex);
-    
+    if (persistence)
+    {
+        persistence->request_snapshot(true);
+        return;
+    }
+
+    // Only reached from initialize(), before any worker thread runs
     if (storage)
     {
-        // Acquire read locks for the data we're saving
-        std::shared_lock<std::shared_mutex> fac_lock(facilities_mutex);
-        std::shared_lock<std::shared_mutex> book_lock(bookings_mutex);
-        
-        storage->save_facilities(facilities);
-        storage->save_bookings(bookings_by_id);
+        // Snapshot everything and truncate the journal
+        std::map<uint32_t, Booking> bookings;
+        collect_bookings(bookings);
+        storage->write_snapshot(facilities, bookings);
     }
 }
 
 void FacilityManager::load_from_disk()
 {
-    std::lock_guard<std::mutex> storage_lock(storage_mutex);
-    
+    // Called from initialize() before any worker thread runs, so no locks
     if (storage)
     {
-        // Acquire write locks since we're modifying the data
-        std::unique_lock<std::shared_mutex> fac_lock(facilities_mutex);
-        std::unique_lock<std::shared_mutex> book_lock(bookings_mutex);
-        
-        storage->load_facilities(facilities);
-        storage->load_bookings(bookings_by_id);
+        std::map<uint32_t, Booking> bookings;
+        if (!storage->load_snapshot(facilities, bookings))
+        {
+            // Deployments from before the binary snapshot only have JSON
+            storage->load_facilities(facilities);
+            storage->load_bookings(bookings);
+        }
+
+        // Replay mutations made since the snapshot
+        std::vector<Booking> records;
+        storage->load_journal(records);
+        replay_journal(records, bookings);
+
+        for (auto &shard : booking_shards)
+        {
+            shard.bookings.clear();
+        }
+        for (const auto &pair : bookings)
+        {
+            booking_shard(pair.first).bookings.emplace(pair.first, pair.second);
+        }
+        booking_count = bookings.size();
 
         // Get next booking ID
-        next_booking_id = storage->get_next_booking_id();
+        next_booking_id = bookings.empty() ? 1 : bookings.rbegin()->first + 1;
+
+        rebuild_occupancy();
     }
 }
 
 bool FacilityManager::facility_exists(const std::string &name) const
 {
-    std::shared_lock<std::shared_mutex> lock(facilities_mutex);
     return facilities.find(name) != facilities.end();
 }
 
 const Facility &FacilityManager::get_facility(const std::string &name) const
 {
-    std::shared_lock<std::shared_mutex> lock(facilities_mutex);
+    std::shared_lock<std::shared_mutex> lock(facility_lock(name));
     return facilities.at(name);
 }
 
+std::shared_mutex &FacilityManager::facility_lock(const std::string &name) const
+{
+    return facility_locks.at(name);
+}
+
+FacilityManager::BookingShard &FacilityManager::booking_shard(uint32_t booking_id)
+{
+    return booking_shards[booking_id % BOOKING_SHARDS];
+}
+
+const FacilityManager::BookingShard &FacilityManager::booking_shard(uint32_t booking_id) const
+{
+    return booking_shards[booking_id % BOOKING_SHARDS];
+}
+
+Facility *FacilityManager::find_booking_facility(uint32_t booking_id)
+{
+    // A booking never moves to another facility, so the name read here
+    // stays valid after the shard lock is released
+    const BookingShard &shard = booking_shard(booking_id);
+    std::shared_lock<std::shared_mutex> lock(shard.mutex);
+    auto it = shard.bookings.find(booking_id);
+    if (it == shard.bookings.end())
+    {
+        return nullptr;
+    }
+    auto fac_it = facilities.find(it->second.facility_name);
+    return fac_it == facilities.end() ? nullptr : &fac_it->second;
+}
+
+void FacilityManager::collect_bookings(std::map<uint32_t, Booking> &bookings) const
+{
+    for (const auto &shard : booking_shards)
+    {
+        std::shared_lock<std::shared_mutex> lock(shard.mutex);
+        for (const auto &pair : shard.bookings)
+        {
+            bookings.emplace(pair.first, pair.second);
+        }
+    }
+}
+
 bool FacilityManager::time_ranges_overlap(time_t start1, time_t end1,
                                           time_t start2, time_t end2) const
 {
     return (start1 < end2) && (start2 < end1);
 }
 
+void FacilityManager::replay_journal(const std::vector<Booking> &records,
+                                     std::map<uint32_t, Booking> &bookings)
+{
+    if (records.empty())
+    {
+        return;
+    }
+
+    // Index facility bookings by ID so each record is applied in O(1)
+    std::unordered_map<uint32_t, Booking *> facility_bookings;
+    for (auto &pair : facilities)
+    {
+        for (auto &booking : pair.second.bookings)
+        {
+            facility_bookings[booking.booking_id] = &booking;
+        }
+    }
+
+    // Records hold the booking's full new state, so replay is idempotent
+    for (const auto &record : records)
+    {
+        auto fac_it = facilities.find(record.facility_name);
+        if (fac_it == facilities.end())
+        {
+            continue;
+        }
+
+        bookings[record.booking_id] = record;
+
+        auto it = facility_bookings.find(record.booking_id);
+        if (it != facility_bookings.end())
+        {
+            *it->second = record;
+        }
+        else
+        {
+            std::vector<Booking> &schedule = fac_it->second.bookings;
+            if (schedule.size() == schedule.capacity())
+            {
+                // Growing moves the vector, so re-point the index afterwards
+                schedule.reserve(schedule.size() * 2 + 1);
+                for (auto &booking : schedule)
+                {
+                    facility_bookings[booking.booking_id] = &booking;
+                }
+            }
+            schedule.push_back(record);
+            facility_bookings[record.booking_id] = &schedule.back();
+        }
+    }
+
+    std::cout << "Replayed " << records.size() << " journal records" << std::endl;
+}
+
+void FacilityManager::commit(uint64_t seq)
+{
+    // Called after the data locks are released
+    if (!persistence->wait_durable(seq))
+    {
+        // Never report success for a change that is not on disk
+        throw std::runtime_error("Journal write failed, the change was not saved");
+    }
+
+    if (journal_needs_compaction())
+    {
+        persistence->request_snapshot(false);
+    }
+}
+
+size_t FacilityManager::persistence_lag()
+{
+    return persistence ? persistence->pending_records() : 0;
+}
+
+size_t FacilityManager::journal_records()
+{
+    return persistence ? persistence->journal_records() : 0;
+}
+
+bool FacilityManager::journal_needs_compaction()
+{
+    size_t records = persistence->journal_records();
+    return records >= JOURNAL_COMPACT_MIN_RECORDS && records >= booking_count.load();
+}
+
+uint64_t FacilityManager::capture_snapshot(std::map<std::string, Facility> &facilities_copy,
+                                           std::map<uint32_t, Booking> &bookings_copy)
+{
+    // Mutations enqueue while holding their facility's lock exclusively, so
+    // while every facility lock is held the copy matches exactly the
+    // records up to last_sequence(). Locks are taken in name order.
+    std::vector<std::shared_lock<std::shared_mutex>> locks;
+    locks.reserve(facility_locks.size());
+    for (auto &pair : facility_locks)
+    {
+        locks.emplace_back(pair.second);
+    }
+
+    for (const auto &pair : facilities)
+    {
+        Facility &copy = facilities_copy[pair.first];
+        copy.name = pair.second.name;
+        copy.bookings = pair.second.bookings;
+    }
+    collect_bookings(bookings_copy);
+
+    return persistence->last_sequence();
+}
+
+time_t FacilityManager::slot_day_start(time_t t)
+{
+    // Occupancy updates alternate between a day and the next one, so
+    // remember the last two local days as [midnight, next midnight) ranges
+    struct CachedDay
+    {
+        time_t midnight = 1, next_midnight = 0, day_start = 0;
+    };
+    thread_local CachedDay cache[2];
+    thread_local int victim = 0;
+    for (const auto &day : cache)
+    {
+        if (t >= day.midnight && t < day.next_midnight)
+        {
+            return day.day_start;
+        }
+    }
+
+    struct tm tm_info;
+    localtime_r(&t, &tm_info);
+    tm_info.tm_hour = 0;
+    tm_info.tm_min = 0;
+    tm_info.tm_sec = 0;
+    tm_info.tm_isdst = -1;
+    struct tm next_day = tm_info;
+    next_day.tm_mday++;
+    struct tm slot_day = tm_info;
+    slot_day.tm_hour = FIRST_SLOT_HOUR;
+
+    CachedDay &day = cache[victim];
+    victim ^= 1;
+    day.midnight = mktime(&tm_info);
+    day.next_midnight = mktime(&next_day);
+    day.day_start = mktime(&slot_day);
+    return day.day_start;
+}
+
+void FacilityManager::update_occupancy(Facility &facility, time_t start_time, time_t end_time, int delta,
+                                       std::vector<time_t> *touched_days)
+{
+    // Visit every day whose slots can overlap [start_time, end_time)
+    for (time_t day_start = slot_day_start(start_time); day_start < end_time;
+         day_start = slot_day_start(day_start + 86400))
+    {
+        if (touched_days)
+        {
+            touched_days->push_back(day_start);
+        }
+
+        auto it = facility.occupancy.find(day_start);
+        for (int slot = 0; slot < SLOTS_PER_DAY; slot++)
+        {
+            time_t slot_start = day_start + slot * SLOT_DURATION;
+            if (!time_ranges_overlap(slot_start, slot_start + SLOT_DURATION, start_time, end_time))
+            {
+                continue;
+            }
+
+            if (it == facility.occupancy.end())
+            {
+                it = facility.occupancy.emplace(day_start, DayOccupancy()).first;
+            }
+
+            DayOccupancy &day = it->second;
+            day.count[slot] = static_cast<uint16_t>(day.count[slot] + delta);
+            if (day.count[slot] > 0)
+                day.busy_mask |= 1u << slot;
+            else
+                day.busy_mask &= ~(1u << slot);
+        }
+
+        if (it != facility.occupancy.end() && it->second.busy_mask == 0)
+        {
+            facility.occupancy.erase(it);
+        }
+
+        // Later days' slots start after today's last one ends
+        if (end_time <= day_start + SLOTS_PER_DAY * SLOT_DURATION)
+        {
+            break;
+        }
+    }
+}
+
+void FacilityManager::rebuild_occupancy()
+{
+    for (auto &pair : facilities)
+    {
+        Facility &facility = pair.second;
+        facility.occupancy.clear();
+        facility.last_booking_end = 0;
+        facility.by_start.clear();
+        facility.positions.clear();
+        facility.longest_booking = 0;
+        for (size_t i = 0; i < facility.bookings.size(); i++)
+        {
+            const Booking &booking = facility.bookings[i];
+            update_occupancy(facility, booking.start_time, booking.end_time, +1);
+            facility.last_booking_end = std::max(facility.last_booking_end, booking.end_time);
+            index_booking(facility, i);
+        }
+
+        // Publish a complete query view
+        std::vector<time_t> all_days;
+        all_days.reserve(facility.occupancy.size());
+        for (const auto &day : facility.occupancy)
+        {
+            all_days.push_back(day.first);
+        }
+        std::atomic_store(&facility.view, std::shared_ptr<const ScheduleView>());
+        publish_view(facility, all_days);
+    }
+}
+
+void FacilityManager::index_booking(Facility &facility, size_t position)
+{
+    const Booking &booking = facility.bookings[position];
+    facility.by_start.emplace(booking.start_time, position);
+    facility.positions[booking.booking_id] = position;
+    facility.longest_booking = std::max(facility.longest_booking, booking.end_time - booking.start_time);
+}
+
+void FacilityManager::reindex_booking_start(Facility &facility, size_t position, time_t old_start)
+{
+    const Booking &booking = facility.bookings[position];
+    auto range = facility.by_start.equal_range(old_start);
+    for (auto it = range.first; it != range.second; ++it)
+    {
+        if (it->second == position)
+        {
+            facility.by_start.erase(it);
+            break;
+        }
+    }
+    facility.by_start.emplace(booking.start_time, position);
+    facility.longest_booking = std::max(facility.longest_booking, booking.end_time - booking.start_time);
+}
+
+Booking *FacilityManager::find_facility_booking(Facility &facility, uint32_t booking_id)
+{
+    auto it = facility.positions.find(booking_id);
+    return it == facility.positions.end() ? nullptr : &facility.bookings[it->second];
+}
+
+bool FacilityManager::has_conflict(const Facility &facility, time_t start_time, time_t end_time,
+                                   uint32_t ignored_booking_id) const
+{
+    // Bookings never overlap each other, so this visits only the few
+    // neighbours of [start_time, end_time) whatever the facility's history
+    for (auto it = facility.by_start.upper_bound(start_time - facility.longest_booking);
+         it != facility.by_start.end() && it->first < end_time; ++it)
+    {
+        const Booking &other = facility.bookings[it->second];
+        if (other.booking_id != ignored_booking_id &&
+            time_ranges_overlap(start_time, end_time, other.start_time, other.end_time))
+        {
+            return true;
+        }
+    }
+    return false;
+}
+
+void FacilityManager::update_last_booking_end(Facility &facility, time_t old_end, time_t new_end)
+{
+    if (new_end >= facility.last_booking_end)
+    {
+        facility.last_booking_end = new_end;
+    }
+    else if (old_end == facility.last_booking_end)
+    {
+        // The latest booking ended earlier: only now is a rescan needed
+        facility.last_booking_end = 0;
+        for (const auto &booking : facility.bookings)
+        {
+            facility.last_booking_end = std::max(facility.last_booking_end, booking.end_time);
+        }
+    }
+}
+
+// Floor division, so days before the epoch map to their own chunks too
+static time_t schedule_chunk_id(time_t day_start)
+{
+    time_t id = day_start / SCHEDULE_CHUNK_SECONDS;
+    return (day_start % SCHEDULE_CHUNK_SECONDS < 0) ? id - 1 : id;
+}
+
+void FacilityManager::publish_view(Facility &facility, const std::vector<time_t> &touched_days)
+{
+    std::shared_ptr<const ScheduleView> old_view = std::atomic_load(&facility.view);
+    auto view = old_view ? std::make_shared<ScheduleView>(*old_view)
+                         : std::make_shared<ScheduleView>();
+
+    // Copy each touched chunk once, then refresh its days from the occupancy
+    std::unordered_map<time_t, std::shared_ptr<ScheduleChunk>> copied;
+    for (time_t day_start : touched_days)
+    {
+        time_t chunk_id = schedule_chunk_id(day_start);
+        auto copy_it = copied.find(chunk_id);
+        if (copy_it == copied.end())
+        {
+            auto old_chunk = view->chunks.find(chunk_id);
+            auto chunk = old_chunk != view->chunks.end()
+                             ? std::make_shared<ScheduleChunk>(*old_chunk->second)
+                             : std::make_shared<ScheduleChunk>();
+            copy_it = copied.emplace(chunk_id, std::move(chunk)).first;
+        }
+
+        auto day = facility.occupancy.find(day_start);
+        if (day != facility.occupancy.end())
+        {
+            copy_it->second->busy_masks[day_start] = day->second.busy_mask;
+        }
+        else
+        {
+            copy_it->second->busy_masks.erase(day_start);
+        }
+    }
+
+    for (auto &pair : copied)
+    {
+        if (pair.second->busy_masks.empty())
+        {
+            view->chunks.erase(pair.first);
+        }
+        else
+        {
+            view->chunks[pair.first] = std::move(pair.second);
+        }
+    }
+
+    view->last_booking_end = facility.last_booking_end;
+
+    std::atomic_store(&facility.view, std::shared_ptr<const ScheduleView>(std::move(view)));
+}
+
 std::vector<TimeSlot> FacilityManager::get_available_slots(
     const std::string &facility_name,
     const std::vector<uint32_t> &days)
 {
-    std::shared_lock<std::shared_mutex> lock(facilities_mutex);
-
     std::vector<TimeSlot> available_slots;
 
+    for (const auto &day : get_availability(facility_name, days))
+    {
+        for (int slot = 0; slot < SLOTS_PER_DAY; slot++)
+        {
+            if (day.free_mask & (1u << slot))
+            {
+                time_t slot_start = day.day_start + slot * SLOT_DURATION;
+                available_slots.push_back({slot_start, slot_start + SLOT_DURATION});
+            }
+        }
+    }
+
+    return available_slots;
+}
+
+std::vector<DayAvailability> FacilityManager::get_availability(
+    const std::string &facility_name,
+    const std::vector<uint32_t> &days)
+{
+    std::vector<DayAvailability> availability;
+
     auto it = facilities.find(facility_name);
     if (it == facilities.end())
     {
-        return available_slots;
+        return availability;
     }
 
-    const Facility &facility = it->second;
+    // Read the published view: never waits for writers of this facility
+    std::shared_ptr<const ScheduleView> view = std::atomic_load(&it->second.view);
+    availability.reserve(days.size());
 
-    // For each day, check 9 AM to 6 PM in 0.5-hour (30-minute) slots
+    // Each day is one hash lookup in the busy masks, independent of how
+    // many bookings the facility has
     // Note: All time operations use UTC+8 timezone set in main()
-    const int SLOT_DURATION = 1800;  // 30 minutes = 1800 seconds
-    const int SLOTS_PER_DAY = 18;    // 9 AM to 6 PM = 9 hours = 18 half-hour slots
-    
+    time_t now = time(nullptr);
     for (uint32_t day_offset : days)
     {
-        time_t day_start = time(nullptr) + (day_offset * 86400);
-
-        // localtime() uses the timezone set via TZ environment variable (UTC+8)
-        struct tm *tm_info = localtime(&day_start);
-        tm_info->tm_hour = 9;  // 9 AM in UTC+8
-        tm_info->tm_min = 0;
-        tm_info->tm_sec = 0;
-        time_t slot_start = mktime(tm_info);  // mktime() also respects TZ setting
+        time_t day_start = slot_day_start(now + (day_offset * 86400));
 
-        for (int slot = 0; slot < SLOTS_PER_DAY; slot++)
+        uint32_t free_mask = ALL_SLOTS_MASK;
+        if (view)
         {
-            time_t slot_end = slot_start + SLOT_DURATION;
-
-            bool is_available = true;
-            for (const auto &booking : facility.bookings)
+            auto chunk = view->chunks.find(schedule_chunk_id(day_start));
+            if (chunk != view->chunks.end())
             {
-                if (time_ranges_overlap(slot_start, slot_end,
-                                        booking.start_time, booking.end_time))
+                auto day_it = chunk->second->busy_masks.find(day_start);
+                if (day_it != chunk->second->busy_masks.end())
                 {
-                    is_available = false;
-                    break;
+                    free_mask &= ~day_it->second;
                 }
             }
+        }
 
-            if (is_available)
-            {
-                available_slots.push_back({slot_start, slot_end});
-            }
+        availability.push_back({day_start, free_mask});
+    }
 
-            slot_start = slot_end;
+    return availability;
+}
+
+void FacilityManager::write_availability(ByteBuffer &buffer,
+                                         const std::vector<DayAvailability> &availability,
+                                         uint8_t format)
+{
+    if (format == FORMAT_BITMAP)
+    {
+        buffer.write_uint16(static_cast<uint16_t>(availability.size()));
+        for (const auto &day : availability)
+        {
+            buffer.write_time(day.day_start);
+            buffer.write_uint32(day.free_mask);
         }
+        return;
     }
 
-    return available_slots;
+    size_t num_slots = 0;
+    for (const auto &day : availability)
+    {
+        num_slots += __builtin_popcount(day.free_mask);
+    }
+
+    buffer.write_uint16(static_cast<uint16_t>(num_slots));
+    for (const auto &day : availability)
+    {
+        for (int slot = 0; slot < SLOTS_PER_DAY; slot++)
+        {
+            if (day.free_mask & (1u << slot))
+            {
+                time_t slot_start = day.day_start + slot * SLOT_DURATION;
+                buffer.write_time(slot_start);
+                buffer.write_time(slot_start + SLOT_DURATION);
+            }
+        }
+    }
 }
 
 uint32_t FacilityManager::create_booking(const std::string &facility_name,
                                          time_t start_time, time_t end_time)
 {
-    std::unique_lock<std::shared_mutex> fac_lock(facilities_mutex);
-    std::unique_lock<std::shared_mutex> book_lock(bookings_mutex);
-    
     auto it = facilities.find(facility_name);
     if (it == facilities.end())
     {
         return 0;
     }
 
+    std::unique_lock<std::shared_mutex> fac_lock(facility_lock(facility_name));
+
     // Check for conflicts
-    for (const auto &booking : it->second.bookings)
+    if (has_conflict(it->second, start_time, end_time))
     {
-        if (time_ranges_overlap(start_time, end_time,
-                                booking.start_time, booking.end_time))
-        {
-            return 0;
-        }
+        return 0;
     }
 
     // Create booking
@@ -189,149 +678,166 @@ uint32_t FacilityManager::create_booking(const std::string &facility_name,
     new_booking.end_time = end_time;
 
     it->second.bookings.push_back(new_booking);
-    bookings_by_id[new_booking.booking_id] = new_booking;
+    index_booking(it->second, it->second.bookings.size() - 1);
+    std::vector<time_t> touched_days;
+    update_occupancy(it->second, start_time, end_time, +1, &touched_days);
+    update_last_booking_end(it->second, 0, end_time);
+    publish_view(it->second, touched_days);
+    {
+        BookingShard &shard = booking_shard(new_booking.booking_id);
+        std::unique_lock<std::shared_mutex> book_lock(shard.mutex);
+        shard.bookings.emplace(new_booking.booking_id, new_booking);
+    }
+    booking_count++;
+
+    uint64_t seq = persistence->enqueue("book", new_booking);
 
-    std::cout << "Created booking ID: " << new_booking.booking_id << std::endl;
+    SERVER_LOG(LogLevel::DEBUG, "booking_created").field("booking", new_booking.booking_id);
 
-    // Save to disk (will acquire its own locks)
+    // Wait for durability outside the lock
     fac_lock.unlock();
-    book_lock.unlock();
-    save_to_disk();
+    commit(seq);
 
     return new_booking.booking_id;
 }
 
 bool FacilityManager::change_booking(uint32_t booking_id, int32_t offset_minutes)
 {
-    std::unique_lock<std::shared_mutex> fac_lock(facilities_mutex);
-    std::unique_lock<std::shared_mutex> book_lock(bookings_mutex);
-    
-    auto it = bookings_by_id.find(booking_id);
-    if (it == bookings_by_id.end())
+    Facility *facility = find_booking_facility(booking_id);
+    if (!facility)
     {
         return false;
     }
 
-    Booking &booking = it->second;
+    std::unique_lock<std::shared_mutex> fac_lock(facility_lock(facility->name));
+
+    // The facility's schedule holds the authoritative copy of the booking
+    Booking *found = find_facility_booking(*facility, booking_id);
+    if (!found)
+    {
+        return false;
+    }
+
+    Booking &booking = *found;
     time_t new_start = booking.start_time + (offset_minutes * 60);
     time_t new_end = booking.end_time + (offset_minutes * 60);
 
     // Check for conflicts
-    auto fac_it = facilities.find(booking.facility_name);
-    for (const auto &other_booking : fac_it->second.bookings)
+    if (has_conflict(*facility, new_start, new_end, booking_id))
     {
-        if (other_booking.booking_id != booking_id)
-        {
-            if (time_ranges_overlap(new_start, new_end,
-                                    other_booking.start_time, other_booking.end_time))
-            {
-                return false;
-            }
-        }
+        return false;
     }
 
     // Update booking
+    std::vector<time_t> touched_days;
+    update_occupancy(*facility, booking.start_time, booking.end_time, -1, &touched_days);
+    update_occupancy(*facility, new_start, new_end, +1, &touched_days);
+    time_t old_start = booking.start_time;
+    time_t old_end = booking.end_time;
     booking.start_time = new_start;
     booking.end_time = new_end;
+    reindex_booking_start(*facility, facility->positions.at(booking_id), old_start);
+    update_last_booking_end(*facility, old_end, new_end);
+    publish_view(*facility, touched_days);
 
-    // Update in facility's booking list
-    for (auto &fac_booking : fac_it->second.bookings)
+    // Update the booking index
     {
-        if (fac_booking.booking_id == booking_id)
-        {
-            fac_booking.start_time = new_start;
-            fac_booking.end_time = new_end;
-            break;
-        }
+        BookingShard &shard = booking_shard(booking_id);
+        std::unique_lock<std::shared_mutex> book_lock(shard.mutex);
+        Booking &indexed = shard.bookings.at(booking_id);
+        indexed.start_time = new_start;
+        indexed.end_time = new_end;
     }
 
-    // Save to disk (will acquire its own locks)
+    uint64_t seq = persistence->enqueue("change", booking);
+
+    // Wait for durability outside the lock
     fac_lock.unlock();
-    book_lock.unlock();
-    save_to_disk();
+    commit(seq);
 
     return true;
 }
 
 bool FacilityManager::extend_booking(uint32_t booking_id, uint32_t minutes_to_extend)
 {
-    std::unique_lock<std::shared_mutex> fac_lock(facilities_mutex);
-    std::unique_lock<std::shared_mutex> book_lock(bookings_mutex);
-    
-    auto it = bookings_by_id.find(booking_id);
-    if (it == bookings_by_id.end())
+    Facility *facility = find_booking_facility(booking_id);
+    if (!facility)
     {
         return false;
     }
 
-    Booking &booking = it->second;
+    std::unique_lock<std::shared_mutex> fac_lock(facility_lock(facility->name));
+
+    // The facility's schedule holds the authoritative copy of the booking
+    Booking *found = find_facility_booking(*facility, booking_id);
+    if (!found)
+    {
+        return false;
+    }
+
+    Booking &booking = *found;
     time_t new_end = booking.end_time + (minutes_to_extend * 60);
 
     // Check for conflicts
-    auto fac_it = facilities.find(booking.facility_name);
-    for (const auto &other_booking : fac_it->second.bookings)
+    if (has_conflict(*facility, booking.start_time, new_end, booking_id))
     {
-        if (other_booking.booking_id != booking_id)
-        {
-            if (time_ranges_overlap(booking.start_time, new_end,
-                                    other_booking.start_time, other_booking.end_time))
-            {
-                return false;
-            }
-        }
+        return false;
     }
 
     // Extend booking
+    std::vector<time_t> touched_days;
+    update_occupancy(*facility, booking.start_time, booking.end_time, -1, &touched_days);
+    update_occupancy(*facility, booking.start_time, new_end, +1, &touched_days);
+    time_t old_end = booking.end_time;
     booking.end_time = new_end;
+    facility->longest_booking = std::max(facility->longest_booking, new_end - booking.start_time);
+    update_last_booking_end(*facility, old_end, new_end);
+    publish_view(*facility, touched_days);
 
-    // Update in facility's booking list
-    for (auto &fac_booking : fac_it->second.bookings)
+    // Update the booking index
     {
-        if (fac_booking.booking_id == booking_id)
-        {
-            fac_booking.end_time = new_end;
-            break;
-        }
+        BookingShard &shard = booking_shard(booking_id);
+        std::unique_lock<std::shared_mutex> book_lock(shard.mutex);
+        shard.bookings.at(booking_id).end_time = new_end;
     }
 
-    // Save to disk (will acquire its own locks)
+    uint64_t seq = persistence->enqueue("extend", booking);
+
+    // Wait for durability outside the lock
     fac_lock.unlock();
-    book_lock.unlock();
-    save_to_disk();
+    commit(seq);
 
     return true;
 }
 
 bool FacilityManager::booking_exists(uint32_t booking_id) const
 {
-    std::shared_lock<std::shared_mutex> lock(bookings_mutex);
-    return bookings_by_id.find(booking_id) != bookings_by_id.end();
+    const BookingShard &shard = booking_shard(booking_id);
+    std::shared_lock<std::shared_mutex> lock(shard.mutex);
+    return shard.bookings.find(booking_id) != shard.bookings.end();
 }
 
-const Booking &FacilityManager::get_booking(uint32_t booking_id) const
+std::optional<Booking> FacilityManager::get_booking(uint32_t booking_id) const
 {
-    std::shared_lock<std::shared_mutex> lock(bookings_mutex);
-    return bookings_by_id.at(booking_id);
+    // Copied under the lock: change and extend rewrite the times in place
+    const BookingShard &shard = booking_shard(booking_id);
+    std::shared_lock<std::shared_mutex> lock(shard.mutex);
+    auto it = shard.bookings.find(booking_id);
+    if (it == shard.bookings.end())
+    {
+        return std::nullopt;
+    }
+    return it->second;
 }
 
 time_t FacilityManager::get_last_booking_time(const std::string &facility_name) const
 {
-    std::shared_lock<std::shared_mutex> lock(facilities_mutex);
-    
     auto it = facilities.find(facility_name);
     if (it == facilities.end())
     {
         return 0;
     }
 
-    time_t last_end_time = 0;
-    for (const auto &booking : it->second.bookings)
-    {
-        if (booking.end_time > last_end_time)
-        {
-            last_end_time = booking.end_time;
-        }
-    }
-
-    return last_end_time;
+    std::shared_ptr<const ScheduleView> view = std::atomic_load(&it->second.view);
+    return view ? view->last_booking_end : 0;
 }
@@ -4,8 +4,15 @@
 
 #include "../include/json_storage.h"
 #include "../include/json.hpp"
+#include <cstdio>
 #include <fstream>
 #include <iostream>
+#include <cerrno>
+#include <cstring>
+#include <fcntl.h>
+#include <unistd.h>
+#include <chrono>
+#include <sys/mman.h>
 #include <sys/stat.h>
 #include <sys/types.h>
 
@@ -14,10 +21,72 @@ using json = nlohmann::json;
 JsonStorage::JsonStorage(const std::string &dir)
     : data_dir(dir),
       facilities_file(dir + "/facilities.json"),
-      bookings_file(dir + "/bookings.json")
+      bookings_file(dir + "/bookings.json"),
+      journal_file(dir + "/journal.jsonl"),
+      snapshot_file(dir + "/snapshot.bin"),
+      journal_fd(-1),
+      journal_records(0)
 {
 }
 
+JsonStorage::~JsonStorage()
+{
+    if (journal_fd >= 0)
+    {
+        close(journal_fd);
+    }
+}
+
+// Write all of data to fd, retrying on short writes
+static bool write_all(int fd, const char *data, size_t len)
+{
+    while (len > 0)
+    {
+        ssize_t written = write(fd, data, len);
+        if (written < 0)
+        {
+            if (errno == EINTR)
+                continue;
+            return false;
+        }
+        data += written;
+        len -= written;
+    }
+    return true;
+}
+
+bool JsonStorage::write_file_atomic(const std::string &path, const std::string &contents)
+{
+    // Write and fsync a temporary file, then rename it over the old one, so
+    // a crash never leaves a half-written snapshot behind
+    std::string tmp_path = path + ".tmp";
+    int fd = open(tmp_path.c_str(), O_WRONLY | O_CREAT | O_TRUNC, 0644);
+    if (fd < 0)
+    {
+        return false;
+    }
+    bool ok = write_all(fd, contents.data(), contents.size()) && fsync(fd) == 0;
+    close(fd);
+    if (!ok)
+    {
+        return false;
+    }
+    return std::rename(tmp_path.c_str(), path.c_str()) == 0;
+}
+
+bool JsonStorage::sync_directory()
+{
+    // Make renames in the data directory durable
+    int fd = open(data_dir.c_str(), O_RDONLY);
+    if (fd < 0)
+    {
+        return false;
+    }
+    bool ok = fsync(fd) == 0;
+    close(fd);
+    return ok;
+}
+
 bool JsonStorage::file_exists(const std::string &filepath)
 {
     struct stat buffer;
@@ -42,23 +111,6 @@ bool JsonStorage::initialize()
         return false;
     }
 
-    // Create empty files if they don't exist
-    if (!file_exists(facilities_file))
-    {
-        std::ofstream file(facilities_file);
-        file << "{}";
-        file.close();
-        std::cout << "Created facilities data file: " << facilities_file << std::endl;
-    }
-
-    if (!file_exists(bookings_file))
-    {
-        std::ofstream file(bookings_file);
-        file << "[]";
-        file.close();
-        std::cout << "Created bookings data file: " << bookings_file << std::endl;
-    }
-
     std::cout << "✓ JSON storage initialization complete: " << data_dir << std::endl;
     return true;
 }
@@ -92,11 +144,8 @@ bool JsonStorage::save_facilities(const std::map<std::string, Facility> &facilit
             j[facility.name] = facility_json;
         }
 
-        std::ofstream file(facilities_file);
-        file << j.dump(2); // Formatted output with 2-space indentation
-        file.close();
-
-        return true;
+        // Formatted output with 2-space indentation
+        return write_file_atomic(facilities_file, j.dump(2));
     }
     catch (const std::exception &e)
     {
@@ -172,11 +221,7 @@ bool JsonStorage::save_bookings(const std::map<uint32_t, Booking> &bookings)
             j.push_back(booking_json);
         }
 
-        std::ofstream file(bookings_file);
-        file << j.dump(2);
-        file.close();
-
-        return true;
+        return write_file_atomic(bookings_file, j.dump(2));
     }
     catch (const std::exception &e)
     {
@@ -222,6 +267,192 @@ bool JsonStorage::load_bookings(std::map<uint32_t, Booking> &bookings)
     }
 }
 
+// Little-endian field access for the binary snapshot
+static void put_le(std::string &out, uint64_t value, size_t width)
+{
+    for (size_t i = 0; i < width; i++)
+    {
+        out.push_back(static_cast<char>((value >> (8 * i)) & 0xFF));
+    }
+}
+
+static uint64_t get_le(const uint8_t *data, size_t width)
+{
+    uint64_t value = 0;
+    for (size_t i = 0; i < width; i++)
+    {
+        value |= static_cast<uint64_t>(data[i]) << (8 * i);
+    }
+    return value;
+}
+
+bool JsonStorage::has_snapshot()
+{
+    return file_exists(snapshot_file);
+}
+
+bool JsonStorage::save_snapshot(const std::map<std::string, Facility> &facilities,
+                                const std::map<uint32_t, Booking> &bookings)
+{
+    // Name table: facilities are referenced from booking records by index
+    std::map<std::string, uint32_t> facility_index;
+    std::string names;
+    for (const auto &pair : facilities)
+    {
+        facility_index.emplace(pair.first, static_cast<uint32_t>(facility_index.size()));
+        put_le(names, pair.first.size(), 2);
+        names += pair.first;
+    }
+    while (names.size() % 8 != 0)
+    {
+        names.push_back('\0');
+    }
+
+    std::string out;
+    out.reserve(SNAPSHOT_HEADER_SIZE + names.size() + bookings.size() * SNAPSHOT_RECORD_SIZE);
+    out.append(SNAPSHOT_MAGIC, sizeof(SNAPSHOT_MAGIC));
+    put_le(out, SNAPSHOT_VERSION, 4);
+    put_le(out, facilities.size(), 4);
+    put_le(out, bookings.size(), 4);
+    put_le(out, names.size(), 4);
+    out += names;
+
+    for (const auto &pair : bookings)
+    {
+        const Booking &booking = pair.second;
+        auto it = facility_index.find(booking.facility_name);
+        if (it == facility_index.end())
+        {
+            std::cerr << "Booking " << booking.booking_id << " refers to unknown facility "
+                      << booking.facility_name << std::endl;
+            return false;
+        }
+        put_le(out, booking.booking_id, 4);
+        put_le(out, it->second, 4);
+        put_le(out, static_cast<uint64_t>(booking.start_time), 8);
+        put_le(out, static_cast<uint64_t>(booking.end_time), 8);
+    }
+
+    if (!write_file_atomic(snapshot_file, out))
+    {
+        std::cerr << "Failed to save snapshot: " << std::strerror(errno) << std::endl;
+        return false;
+    }
+    return true;
+}
+
+bool JsonStorage::load_snapshot(std::map<std::string, Facility> &facilities,
+                                std::map<uint32_t, Booking> &bookings)
+{
+    auto started = std::chrono::steady_clock::now();
+
+    int fd = open(snapshot_file.c_str(), O_RDONLY);
+    if (fd < 0)
+    {
+        return false;
+    }
+    struct stat st;
+    if (fstat(fd, &st) != 0 || static_cast<size_t>(st.st_size) < SNAPSHOT_HEADER_SIZE)
+    {
+        close(fd);
+        std::cerr << "Snapshot is truncated: " << snapshot_file << std::endl;
+        std::rename(snapshot_file.c_str(), (snapshot_file + ".corrupt").c_str());
+        return false;
+    }
+    size_t size = static_cast<size_t>(st.st_size);
+    void *mapping = mmap(nullptr, size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (mapping == MAP_FAILED)
+    {
+        std::cerr << "Unable to map snapshot: " << std::strerror(errno) << std::endl;
+        return false;
+    }
+    madvise(mapping, size, MADV_SEQUENTIAL);
+
+    const uint8_t *data = static_cast<const uint8_t *>(mapping);
+    const char *error = nullptr;
+    uint32_t version = static_cast<uint32_t>(get_le(data + 8, 4));
+    uint32_t facility_count = static_cast<uint32_t>(get_le(data + 12, 4));
+    uint32_t booking_count = static_cast<uint32_t>(get_le(data + 16, 4));
+    size_t names_size = static_cast<size_t>(get_le(data + 20, 4));
+
+    facilities.clear();
+    bookings.clear();
+
+    if (std::memcmp(data, SNAPSHOT_MAGIC, sizeof(SNAPSHOT_MAGIC)) != 0)
+    {
+        error = "bad magic";
+    }
+    else if (version != SNAPSHOT_VERSION)
+    {
+        error = "unsupported version";
+    }
+    else if (size != SNAPSHOT_HEADER_SIZE + names_size +
+                          static_cast<size_t>(booking_count) * SNAPSHOT_RECORD_SIZE)
+    {
+        error = "size does not match header";
+    }
+    else
+    {
+        // Name table
+        std::vector<Facility *> by_index;
+        by_index.reserve(facility_count);
+        const uint8_t *pos = data + SNAPSHOT_HEADER_SIZE;
+        const uint8_t *names_end = pos + names_size;
+        for (uint32_t i = 0; i < facility_count && !error; i++)
+        {
+            size_t length = pos + 2 <= names_end ? static_cast<size_t>(get_le(pos, 2)) : 0;
+            if (pos + 2 + length > names_end)
+            {
+                error = "name table overflow";
+                break;
+            }
+            std::string name(reinterpret_cast<const char *>(pos + 2), length);
+            pos += 2 + length;
+
+            Facility &facility = facilities.emplace_hint(facilities.end(), name, Facility())->second;
+            facility.name = name;
+            by_index.push_back(&facility);
+        }
+
+        // Fixed-width booking records, already in booking_id order
+        const uint8_t *record = names_end;
+        for (uint32_t i = 0; i < booking_count && !error; i++, record += SNAPSHOT_RECORD_SIZE)
+        {
+            uint32_t index = static_cast<uint32_t>(get_le(record + 4, 4));
+            if (index >= by_index.size())
+            {
+                error = "booking refers to unknown facility";
+                break;
+            }
+            Booking booking;
+            booking.booking_id = static_cast<uint32_t>(get_le(record, 4));
+            booking.facility_name = by_index[index]->name;
+            booking.start_time = static_cast<time_t>(static_cast<int64_t>(get_le(record + 8, 8)));
+            booking.end_time = static_cast<time_t>(static_cast<int64_t>(get_le(record + 16, 8)));
+            by_index[index]->bookings.push_back(booking);
+            bookings.emplace_hint(bookings.end(), booking.booking_id, std::move(booking));
+        }
+    }
+
+    munmap(mapping, size);
+
+    if (error)
+    {
+        // Keep the damaged file for inspection instead of overwriting it
+        std::cerr << "Failed to load snapshot " << snapshot_file << ": " << error << std::endl;
+        std::rename(snapshot_file.c_str(), (snapshot_file + ".corrupt").c_str());
+        facilities.clear();
+        bookings.clear();
+        return false;
+    }
+
+    auto elapsed = std::chrono::duration<double, std::milli>(std::chrono::steady_clock::now() - started);
+    std::cout << "✓ Loaded " << facilities.size() << " facilities and " << bookings.size()
+              << " bookings from snapshot in " << elapsed.count() << " ms" << std::endl;
+    return true;
+}
+
 uint32_t JsonStorage::get_next_booking_id()
 {
     try
@@ -254,3 +485,131 @@ uint32_t JsonStorage::get_next_booking_id()
         return 1;
     }
 }
+
+bool JsonStorage::append_journal(const std::vector<JournalRecord> &records)
+{
+    try
+    {
+        if (journal_fd < 0)
+        {
+            journal_fd = open(journal_file.c_str(), O_WRONLY | O_CREAT | O_APPEND, 0644);
+            if (journal_fd < 0)
+            {
+                std::cerr << "Unable to open journal: " << journal_file << std::endl;
+                return false;
+            }
+        }
+
+        // Serialise the whole batch and hand it to the kernel in one write
+        std::string lines;
+        for (const auto &entry : records)
+        {
+            json record;
+            record["op"] = entry.op;
+            record["booking_id"] = entry.booking.booking_id;
+            record["facility_name"] = entry.booking.facility_name;
+            record["start_time"] = entry.booking.start_time;
+            record["end_time"] = entry.booking.end_time;
+            lines += record.dump();
+            lines += '\n';
+        }
+
+        off_t batch_start = lseek(journal_fd, 0, SEEK_END);
+        if (!write_all(journal_fd, lines.data(), lines.size()))
+        {
+            std::cerr << "Failed to write journal: " << std::strerror(errno) << std::endl;
+            // Cut off the partial batch, which would end replay mid-journal
+            // once the batch is written again after it
+            if (batch_start >= 0 && ftruncate(journal_fd, batch_start) != 0)
+            {
+                std::cerr << "Failed to truncate journal: " << std::strerror(errno) << std::endl;
+            }
+            return false;
+        }
+        journal_records += records.size();
+
+        return true;
+    }
+    catch (const std::exception &e)
+    {
+        std::cerr << "Failed to append journal records: " << e.what() << std::endl;
+        return false;
+    }
+}
+
+bool JsonStorage::sync_journal()
+{
+    return journal_fd < 0 || fdatasync(journal_fd) == 0;
+}
+
+size_t JsonStorage::load_journal(std::vector<Booking> &records)
+{
+    records.clear();
+    journal_records = 0;
+
+    if (!file_exists(journal_file))
+    {
+        return 0;
+    }
+
+    std::ifstream file(journal_file);
+    std::string line;
+    size_t lines = 0;
+
+    while (std::getline(file, line))
+    {
+        if (line.empty())
+        {
+            continue;
+        }
+        lines++;
+
+        try
+        {
+            json record = json::parse(line);
+            Booking booking;
+            booking.booking_id = record["booking_id"];
+            booking.facility_name = record["facility_name"];
+            booking.start_time = record["start_time"];
+            booking.end_time = record["end_time"];
+            records.push_back(booking);
+        }
+        catch (const std::exception &e)
+        {
+            // Only the last record can be torn by a crash mid-write
+            std::cerr << "Stopping journal replay at damaged record " << lines
+                      << ": " << e.what() << std::endl;
+            break;
+        }
+    }
+
+    journal_records = lines;
+    std::cout << "✓ Loaded " << records.size() << " journal records from file" << std::endl;
+    return lines;
+}
+
+size_t JsonStorage::journal_size() const
+{
+    return journal_records;
+}
+
+bool JsonStorage::write_snapshot(const std::map<std::string, Facility> &facilities,
+                                 const std::map<uint32_t, Booking> &bookings)
+{
+    if (!save_snapshot(facilities, bookings))
+    {
+        // Keep the journal: it still holds everything the snapshot missed
+        return false;
+    }
+
+    // Everything in the journal is now part of the snapshot
+    sync_directory();
+    if (journal_fd >= 0)
+    {
+        close(journal_fd);
+    }
+    journal_fd = open(journal_file.c_str(), O_WRONLY | O_CREAT | O_TRUNC | O_APPEND, 0644);
+    journal_records = 0;
+
+    return journal_fd >= 0 && fsync(journal_fd) == 0;
+}
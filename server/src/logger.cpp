@@ -0,0 +1,415 @@
+/**
+ * Logger Implementation
+ */
+
+#include "../include/logger.h"
+#include <algorithm>
+#include <chrono>
+#include <cinttypes>
+#include <cstring>
+#include <ctime>
+#include <iostream>
+
+static_assert((LOG_BUFFER_BYTES & (LOG_BUFFER_BYTES - 1)) == 0, "LOG_BUFFER_BYTES must be a power of two");
+
+// [size: u32] [time us: i64] [level: u8]
+static const size_t RECORD_HEADER_SIZE = 4 + 8 + 1;
+
+static const char *const LEVEL_NAMES[] = {"debug", "info", "warn", "error", "off"};
+static const char *const LEVEL_LABELS[] = {"DEBUG", "INFO ", "WARN ", "ERROR", "OFF  "};
+
+thread_local Logger::ThreadBuffer *Logger::local_buffer = nullptr;
+thread_local bool Logger::request_sampled = true;
+thread_local uint32_t Logger::current_request = 0;
+
+bool parse_log_level(const std::string &name, LogLevel &level)
+{
+    for (uint8_t i = 0; i <= static_cast<uint8_t>(LogLevel::OFF); ++i)
+    {
+        if (name == LEVEL_NAMES[i])
+        {
+            level = static_cast<LogLevel>(i);
+            return true;
+        }
+    }
+    return false;
+}
+
+bool parse_log_format(const std::string &name, LogFormat &format)
+{
+    if (name == "text")
+        format = LogFormat::TEXT;
+    else if (name == "json")
+        format = LogFormat::JSON;
+    else
+        return false;
+    return true;
+}
+
+// Copy into / out of a ring at a monotonically increasing position
+static void ring_write(uint8_t *ring, uint64_t position, const void *data, size_t size)
+{
+    size_t offset = static_cast<size_t>(position & (LOG_BUFFER_BYTES - 1));
+    size_t first = std::min(size, LOG_BUFFER_BYTES - offset);
+    std::memcpy(ring + offset, data, first);
+    std::memcpy(ring, static_cast<const uint8_t *>(data) + first, size - first);
+}
+
+static void ring_read(const uint8_t *ring, uint64_t position, void *data, size_t size)
+{
+    size_t offset = static_cast<size_t>(position & (LOG_BUFFER_BYTES - 1));
+    size_t first = std::min(size, LOG_BUFFER_BYTES - offset);
+    std::memcpy(data, ring + offset, first);
+    std::memcpy(static_cast<uint8_t *>(data) + first, ring, size - first);
+}
+
+Logger::Logger()
+    : min_level(static_cast<uint8_t>(LogLevel::INFO)), format(LogFormat::TEXT), sample_every(1),
+      output(stdout), owns_output(false), running(false), stopping(false),
+      records_written(0), records_dropped(0)
+{
+}
+
+Logger::~Logger()
+{
+    stop();
+    if (owns_output)
+    {
+        std::fclose(output);
+    }
+}
+
+Logger &Logger::instance()
+{
+    static Logger logger;
+    return logger;
+}
+
+bool Logger::configure(LogLevel level, LogFormat log_format, const std::string &path, uint32_t sample)
+{
+    if (!path.empty() && path != "-")
+    {
+        FILE *file = std::fopen(path.c_str(), "a");
+        if (!file)
+        {
+            std::cerr << "Unable to open log file " << path << ": " << std::strerror(errno) << std::endl;
+            return false;
+        }
+        if (owns_output)
+        {
+            std::fclose(output);
+        }
+        output = file;
+        owns_output = true;
+    }
+
+    min_level = static_cast<uint8_t>(level);
+    format = log_format;
+    sample_every = std::max<uint32_t>(sample, 1);
+    return true;
+}
+
+void Logger::start()
+{
+    std::lock_guard<std::mutex> lock(wake_mutex);
+    if (running)
+        return;
+
+    running = true;
+    stopping = false;
+    drainer = std::thread(&Logger::run, this);
+}
+
+void Logger::stop()
+{
+    {
+        std::lock_guard<std::mutex> lock(wake_mutex);
+        if (!running)
+            return;
+        stopping = true;
+    }
+    wake_cv.notify_all();
+
+    if (drainer.joinable())
+    {
+        drainer.join();
+    }
+
+    std::lock_guard<std::mutex> lock(wake_mutex);
+    running = false;
+}
+
+Logger::ThreadBuffer &Logger::thread_buffer()
+{
+    if (local_buffer == nullptr)
+    {
+        // First record from this thread: register a ring for it. The logger
+        // keeps the ring after the thread exits so it can still be drained.
+        auto buffer = std::make_unique<ThreadBuffer>();
+        buffer->data = std::make_unique<uint8_t[]>(LOG_BUFFER_BYTES);
+
+        std::lock_guard<std::mutex> lock(buffers_mutex);
+        buffer->thread_index = static_cast<uint32_t>(buffers.size());
+        local_buffer = buffer.get();
+        buffers.push_back(std::move(buffer));
+    }
+    return *local_buffer;
+}
+
+void Logger::submit(LogLevel level, const char *body, size_t size)
+{
+    ThreadBuffer &buffer = thread_buffer();
+    size_t needed = RECORD_HEADER_SIZE + size;
+
+    uint64_t head = buffer.head.load(std::memory_order_relaxed);
+    uint64_t tail = buffer.tail.load(std::memory_order_acquire);
+    if (head - tail + needed > LOG_BUFFER_BYTES)
+    {
+        // The drainer is behind: lose the record rather than wait
+        records_dropped++;
+        return;
+    }
+
+    uint8_t header[RECORD_HEADER_SIZE];
+    uint32_t record_size = static_cast<uint32_t>(size);
+    int64_t time_us = std::chrono::duration_cast<std::chrono::microseconds>(
+                          std::chrono::system_clock::now().time_since_epoch())
+                          .count();
+    std::memcpy(header, &record_size, 4);
+    std::memcpy(header + 4, &time_us, 8);
+    header[12] = static_cast<uint8_t>(level);
+
+    ring_write(buffer.data.get(), head, header, RECORD_HEADER_SIZE);
+    ring_write(buffer.data.get(), head + RECORD_HEADER_SIZE, body, size);
+    buffer.head.store(head + needed, std::memory_order_release);
+
+    // Past half full: drain now instead of at the next interval
+    if (head + needed - tail > LOG_BUFFER_BYTES / 2 &&
+        !buffer.drain_requested.exchange(true, std::memory_order_relaxed))
+    {
+        wake_cv.notify_one();
+    }
+}
+
+void Logger::append_prefix(std::string &out, int64_t time_us, LogLevel level, uint32_t thread_index) const
+{
+    char prefix[96];
+    int length;
+    if (format == LogFormat::JSON)
+    {
+        length = std::snprintf(prefix, sizeof(prefix), "{\"ts\":%" PRId64 ".%06" PRId64 ",\"level\":\"%s\",\"thread\":%u,",
+                               time_us / 1000000, time_us % 1000000,
+                               LEVEL_NAMES[static_cast<uint8_t>(level)], thread_index);
+    }
+    else
+    {
+        time_t seconds = static_cast<time_t>(time_us / 1000000);
+        struct tm local;
+        localtime_r(&seconds, &local);
+        char clock[32];
+        std::strftime(clock, sizeof(clock), "%Y-%m-%d %H:%M:%S", &local);
+        length = std::snprintf(prefix, sizeof(prefix), "%s.%03d %s [%u] ", clock,
+                               static_cast<int>(time_us % 1000000 / 1000),
+                               LEVEL_LABELS[static_cast<uint8_t>(level)], thread_index);
+    }
+    out.append(prefix, static_cast<size_t>(std::max(length, 0)));
+}
+
+size_t Logger::drain(ThreadBuffer &buffer, std::string &out)
+{
+    buffer.drain_requested.store(false, std::memory_order_relaxed);
+
+    uint64_t tail = buffer.tail.load(std::memory_order_relaxed);
+    uint64_t head = buffer.head.load(std::memory_order_acquire);
+    size_t count = 0;
+    while (tail < head)
+    {
+        uint8_t header[RECORD_HEADER_SIZE];
+        ring_read(buffer.data.get(), tail, header, RECORD_HEADER_SIZE);
+        uint32_t size;
+        int64_t time_us;
+        std::memcpy(&size, header, 4);
+        std::memcpy(&time_us, header + 4, 8);
+
+        append_prefix(out, time_us, static_cast<LogLevel>(header[12]), buffer.thread_index);
+        size_t start = out.size();
+        out.resize(start + size);
+        ring_read(buffer.data.get(), tail + RECORD_HEADER_SIZE, &out[start], size);
+        out.append(format == LogFormat::JSON ? "}\n" : "\n");
+
+        tail += RECORD_HEADER_SIZE + size;
+        count++;
+    }
+    buffer.tail.store(tail, std::memory_order_release);
+    return count;
+}
+
+void Logger::run()
+{
+    std::string out;
+    std::vector<ThreadBuffer *> snapshot;
+
+    while (true)
+    {
+        bool last_pass;
+        {
+            std::unique_lock<std::mutex> lock(wake_mutex);
+            wake_cv.wait_for(lock, std::chrono::milliseconds(LOG_FLUSH_INTERVAL_MS));
+            last_pass = stopping;
+        }
+
+        {
+            std::lock_guard<std::mutex> lock(buffers_mutex);
+            snapshot.clear();
+            for (auto &buffer : buffers)
+            {
+                snapshot.push_back(buffer.get());
+            }
+        }
+
+        size_t count = 0;
+        for (ThreadBuffer *buffer : snapshot)
+        {
+            count += drain(*buffer, out);
+        }
+        if (!out.empty())
+        {
+            std::fwrite(out.data(), 1, out.size(), output);
+            std::fflush(output);
+            out.clear();
+            records_written += count;
+        }
+
+        if (last_pass)
+            break;
+    }
+}
+
+LogRecord::LogRecord(LogLevel level, const char *event)
+    : level(level), json(Logger::instance().output_format() == LogFormat::JSON), size(0)
+{
+    if (json)
+    {
+        append("\"event\":", 8);
+        append_escaped(event, std::strlen(event));
+    }
+    else
+    {
+        append(event, std::strlen(event));
+    }
+
+    if (Logger::current_request != 0)
+    {
+        field("req", Logger::current_request);
+    }
+}
+
+LogRecord::~LogRecord()
+{
+    Logger::instance().submit(level, body, size);
+}
+
+void LogRecord::append(const char *text, size_t length)
+{
+    length = std::min(length, LOG_RECORD_MAX_BYTES - size);
+    std::memcpy(body + size, text, length);
+    size += length;
+}
+
+void LogRecord::append_char(char c)
+{
+    if (size < LOG_RECORD_MAX_BYTES)
+    {
+        body[size++] = c;
+    }
+}
+
+void LogRecord::append_escaped(const char *text, size_t length)
+{
+    append_char('"');
+    for (size_t i = 0; i < length; ++i)
+    {
+        unsigned char c = static_cast<unsigned char>(text[i]);
+        if (c == '"' || c == '\\')
+        {
+            append_char('\\');
+            append_char(static_cast<char>(c));
+        }
+        else if (c < 0x20)
+        {
+            char escaped[8];
+            int written = std::snprintf(escaped, sizeof(escaped), "\\u%04x", c);
+            append(escaped, static_cast<size_t>(written));
+        }
+        else
+        {
+            append_char(static_cast<char>(c));
+        }
+    }
+    append_char('"');
+}
+
+void LogRecord::begin_field(const char *key)
+{
+    if (json)
+    {
+        append_char(',');
+        append_char('"');
+        append(key, std::strlen(key));
+        append("\":", 2);
+    }
+    else
+    {
+        append_char(' ');
+        append(key, std::strlen(key));
+        append_char('=');
+    }
+}
+
+LogRecord &LogRecord::field(const char *key, uint64_t value)
+{
+    begin_field(key);
+    char digits[24];
+    int length = std::snprintf(digits, sizeof(digits), "%" PRIu64, value);
+    append(digits, static_cast<size_t>(length));
+    return *this;
+}
+
+LogRecord &LogRecord::field(const char *key, int64_t value)
+{
+    begin_field(key);
+    char digits[24];
+    int length = std::snprintf(digits, sizeof(digits), "%" PRId64, value);
+    append(digits, static_cast<size_t>(length));
+    return *this;
+}
+
+LogRecord &LogRecord::field(const char *key, double value)
+{
+    begin_field(key);
+    char digits[32];
+    int length = std::snprintf(digits, sizeof(digits), "%.6g", value);
+    append(digits, static_cast<size_t>(length));
+    return *this;
+}
+
+LogRecord &LogRecord::field(const char *key, const char *value)
+{
+    begin_field(key);
+    size_t length = std::strlen(value);
+    // Plain words stay unquoted in text output
+    if (json || length == 0 || std::strpbrk(value, " \"=\\\t\r\n") != nullptr)
+    {
+        append_escaped(value, length);
+    }
+    else
+    {
+        append(value, length);
+    }
+    return *this;
+}
+
+LogRecord &LogRecord::field(const char *key, const std::string &value)
+{
+    return field(key, value.c_str());
+}
@@ -3,6 +3,7 @@
  */
 
 #include "../include/udp_server.h"
+#include "../include/logger.h"
 #include <iostream>
 #include <string>
 #include <cstdlib>
@@ -23,7 +24,12 @@ int main(int argc, char *argv[])
 
     if (argc < 2)
     {
-        std::cerr << "Usage: " << argv[0] << " <port> [--semantic <at-least-once|at-most-once>] [--threads <count>] [--drop-rate <rate>]" << std::endl;
+        std::cerr << "Usage: " << argv[0] << " <port> [--semantic <at-least-once|at-most-once>] [--threads <count>] [--drop-rate <rate>]"
+                  << " [--durability <fsync|enqueue|delay>] [--commit-delay <ms>]"
+                  << " [--receivers <count>] [--io-batch <count>] [--max-queue-delay <ms>]"
+                  << " [--cache-mb <megabytes>]"
+                  << " [--log-level <debug|info|warn|error|off>] [--log-format <text|json>]"
+                  << " [--log-file <path>] [--log-sample <n>]" << std::endl;
         return 1;
     }
 
@@ -31,6 +37,16 @@ int main(int argc, char *argv[])
     bool use_at_most_once = false;
     size_t thread_count = std::thread::hardware_concurrency(); // Default to CPU core count
     float drop_rate = 0.0f;                                    // Default drop rate
+    DurabilityMode durability = DurabilityMode::FSYNC;         // Reply after fsync
+    int commit_delay_ms = 5;                                   // Batch window for delay mode
+    size_t receivers = 1;                                      // SO_REUSEPORT sockets
+    size_t io_batch = DEFAULT_IO_BATCH;                        // Datagrams per recvmmsg/sendmmsg
+    int max_queue_delay_ms = DEFAULT_MAX_QUEUE_DELAY_MS;       // Load shedding threshold, 0 = off
+    size_t cache_bytes = DEFAULT_CACHE_BYTES;                  // At-most-once reply cache budget
+    LogLevel log_level = LogLevel::INFO;                       // Per-request records are debug
+    LogFormat log_format = LogFormat::TEXT;
+    std::string log_file = "-";                                // Standard output
+    uint32_t log_sample = 1;                                   // Debug records of 1 in N requests
 
     if (thread_count == 0)
     {
@@ -78,9 +94,126 @@ int main(int argc, char *argv[])
             }
             i++; // Skip next argument
         }
+        else if (std::string(argv[i]) == "--durability" && i + 1 < argc)
+        {
+            std::string mode = argv[i + 1];
+            if (mode == "fsync")
+            {
+                durability = DurabilityMode::FSYNC;
+            }
+            else if (mode == "enqueue")
+            {
+                durability = DurabilityMode::ENQUEUE;
+            }
+            else if (mode == "delay")
+            {
+                durability = DurabilityMode::DELAY;
+            }
+            else
+            {
+                std::cerr << "Unknown durability mode: " << mode << std::endl;
+                return 1;
+            }
+            i++; // Skip next argument
+        }
+        else if (std::string(argv[i]) == "--receivers" && i + 1 < argc)
+        {
+            int count = std::atoi(argv[i + 1]);
+            if (count < 1)
+            {
+                std::cerr << "Receiver count must be at least 1" << std::endl;
+                return 1;
+            }
+            receivers = static_cast<size_t>(count);
+            i++; // Skip next argument
+        }
+        else if (std::string(argv[i]) == "--io-batch" && i + 1 < argc)
+        {
+            int count = std::atoi(argv[i + 1]);
+            if (count < 1 || count > 1024)
+            {
+                std::cerr << "I/O batch must be between 1 and 1024" << std::endl;
+                return 1;
+            }
+            io_batch = static_cast<size_t>(count);
+            i++; // Skip next argument
+        }
+        else if (std::string(argv[i]) == "--max-queue-delay" && i + 1 < argc)
+        {
+            max_queue_delay_ms = std::atoi(argv[i + 1]);
+            if (max_queue_delay_ms < 0)
+            {
+                std::cerr << "Max queue delay must not be negative" << std::endl;
+                return 1;
+            }
+            i++; // Skip next argument
+        }
+        else if (std::string(argv[i]) == "--cache-mb" && i + 1 < argc)
+        {
+            int megabytes = std::atoi(argv[i + 1]);
+            if (megabytes < 1)
+            {
+                std::cerr << "Cache size must be at least 1 MB" << std::endl;
+                return 1;
+            }
+            cache_bytes = static_cast<size_t>(megabytes) * 1024 * 1024;
+            i++; // Skip next argument
+        }
+        else if (std::string(argv[i]) == "--log-level" && i + 1 < argc)
+        {
+            if (!parse_log_level(argv[i + 1], log_level))
+            {
+                std::cerr << "Unknown log level: " << argv[i + 1] << std::endl;
+                return 1;
+            }
+            i++; // Skip next argument
+        }
+        else if (std::string(argv[i]) == "--log-format" && i + 1 < argc)
+        {
+            if (!parse_log_format(argv[i + 1], log_format))
+            {
+                std::cerr << "Unknown log format: " << argv[i + 1] << std::endl;
+                return 1;
+            }
+            i++; // Skip next argument
+        }
+        else if (std::string(argv[i]) == "--log-file" && i + 1 < argc)
+        {
+            log_file = argv[i + 1];
+            i++; // Skip next argument
+        }
+        else if (std::string(argv[i]) == "--log-sample" && i + 1 < argc)
+        {
+            int sample = std::atoi(argv[i + 1]);
+            if (sample < 1)
+            {
+                std::cerr << "Log sample rate must be at least 1" << std::endl;
+                return 1;
+            }
+            log_sample = static_cast<uint32_t>(sample);
+            i++; // Skip next argument
+        }
+        else if (std::string(argv[i]) == "--commit-delay" && i + 1 < argc)
+        {
+            commit_delay_ms = std::atoi(argv[i + 1]);
+            if (commit_delay_ms < 0)
+            {
+                std::cerr << "Commit delay must not be negative" << std::endl;
+                return 1;
+            }
+            i++; // Skip next argument
+        }
+    }
+
+    if (!Logger::instance().configure(log_level, log_format, log_file, log_sample))
+    {
+        return 1;
     }
+    Logger::instance().start();
 
-    UDPServer server(port, use_at_most_once, thread_count, drop_rate);
+    UDPServer server(port, use_at_most_once, thread_count, drop_rate,
+                     durability, static_cast<uint32_t>(commit_delay_ms), receivers, io_batch,
+                     static_cast<uint32_t>(max_queue_delay_ms), cache_bytes);
     server.start();
 
     return 0;
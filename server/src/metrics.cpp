@@ -0,0 +1,38 @@
+/**
+ * Metrics Implementation
+ */
+
+#include "../include/metrics.h"
+
+LatencyHistogram::LatencyHistogram()
+{
+    for (auto &bucket : buckets)
+    {
+        bucket.store(0, std::memory_order_relaxed);
+    }
+}
+
+void LatencyHistogram::record(std::chrono::steady_clock::duration elapsed)
+{
+    auto micros = std::chrono::duration_cast<std::chrono::microseconds>(elapsed).count();
+    size_t index = 0;
+    if (micros > 1)
+    {
+        // floor(log2(micros)): bucket i holds [2^i, 2^(i+1))
+        index = 63 - static_cast<size_t>(__builtin_clzll(static_cast<uint64_t>(micros)));
+    }
+    if (index >= LATENCY_BUCKETS)
+    {
+        index = LATENCY_BUCKETS - 1;
+    }
+    buckets[index].fetch_add(1, std::memory_order_relaxed);
+}
+
+void LatencyHistogram::add_to(std::vector<uint64_t> &totals) const
+{
+    totals.resize(LATENCY_BUCKETS, 0);
+    for (size_t i = 0; i < LATENCY_BUCKETS; ++i)
+    {
+        totals[i] += buckets[i].load(std::memory_order_relaxed);
+    }
+}
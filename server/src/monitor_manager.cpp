@@ -6,19 +6,26 @@
 #include "../include/facility_manager.h"
 #include "../include/byte_buffer.h"
 #include "../include/message_types.h"
+#include "../include/datagram_io.h"
+#include "../include/logger.h"
 #include <sys/socket.h>
-#include <iostream>
 #include <algorithm>
 
-MonitorManager::MonitorManager() {}
+MonitorManager::MonitorManager() : registrations(0) {}
 
 void MonitorManager::register_monitor(const std::string &facility_name,
                                       const sockaddr_in &client_addr,
-                                      uint32_t duration_seconds)
+                                      uint32_t duration_seconds,
+                                      uint8_t format,
+                                      bool format_negotiated)
 {
     ClientInfo client_info;
     client_info.address = client_addr;
     client_info.expiry_time = time(nullptr) + duration_seconds;
+    client_info.availability_format = format;
+    client_info.format_negotiated = format_negotiated;
+
+    std::lock_guard<std::mutex> lock(mutex);
 
     // Check if this client is already registered for this facility
     auto it = monitors.find(facility_name);
@@ -29,9 +36,11 @@ void MonitorManager::register_monitor(const std::string &facility_name,
             if (existing_client.address.sin_addr.s_addr == client_addr.sin_addr.s_addr &&
                 existing_client.address.sin_port == client_addr.sin_port)
             {
-                // Update expiry time for existing client
+                // Update expiry time and encoding for existing client
                 existing_client.expiry_time = client_info.expiry_time;
-                std::cout << "Updated monitor registration for " << facility_name << std::endl;
+                existing_client.availability_format = format;
+                existing_client.format_negotiated = format_negotiated;
+                SERVER_LOG(LogLevel::DEBUG, "monitor_updated").field("facility", facility_name);
                 return;
             }
         }
@@ -39,8 +48,9 @@ void MonitorManager::register_monitor(const std::string &facility_name,
 
     // Add new client
     monitors[facility_name].push_back(client_info);
+    registrations++;
 
-    std::cout << "Registered monitor for " << facility_name << std::endl;
+    SERVER_LOG(LogLevel::DEBUG, "monitor_registered").field("facility", facility_name);
 }
 
 void MonitorManager::notify_monitors(const std::string &facility_name,
@@ -48,18 +58,17 @@ void MonitorManager::notify_monitors(const std::string &facility_name,
                                      int sockfd,
                                      FacilityManager &facility_manager)
 {
-    // First cleanup expired monitors
-    cleanup_expired_monitors();
-
-    auto it = monitors.find(facility_name);
-    if (it == monitors.end())
-        return;
-
-    time_t now = time(nullptr);
-    std::vector<ClientInfo> &clients = it->second;
+    // Copy the live registrations, then build and send without the lock
+    std::vector<ClientInfo> clients;
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        remove_expired(time(nullptr));
 
-    if (clients.empty())
-        return;
+        auto it = monitors.find(facility_name);
+        if (it == monitors.end() || it->second.empty())
+            return;
+        clients = it->second;
+    }
 
     // Build notification message with booking change info AND updated availability
     ByteBuffer notification;
@@ -94,60 +103,64 @@ void MonitorManager::notify_monitors(const std::string &facility_name,
         notification.write_time(change.old_end_time);
     }
 
-    // Include updated availability for the next 7 days
+    // Include updated availability for the next 7 days, encoded once per
+    // format actually used by the subscribers
     std::vector<uint32_t> days = {0, 1, 2, 3, 4, 5, 6};
-    std::vector<TimeSlot> available_slots = facility_manager.get_available_slots(facility_name, days);
+    std::vector<DayAvailability> availability = facility_manager.get_availability(facility_name, days);
 
-    notification.write_uint16(static_cast<uint16_t>(available_slots.size()));
-    for (const auto &slot : available_slots)
-    {
-        notification.write_time(slot.start_time);
-        notification.write_time(slot.end_time);
-    }
+    // Index 0: legacy slot list without a format byte; 1 + format: negotiated
+    ByteBuffer encoded[3];
+    bool built[3] = {false, false, false};
 
-    // Send to all active monitors
-    int sent_count = 0;
-    auto client_it = clients.begin();
-    while (client_it != clients.end())
+    // Collect one datagram per active monitor, then send them all at once
+    std::vector<OutgoingDatagram> datagrams;
+    datagrams.reserve(clients.size());
+    for (const auto &client : clients)
     {
-        if (now < client_it->expiry_time)
+        size_t variant = client.format_negotiated ? 1 + client.availability_format : 0;
+        ByteBuffer &message = encoded[variant];
+        if (!built[variant])
         {
-            ssize_t sent = sendto(sockfd, notification.data(), notification.size(), 0,
-                                  (struct sockaddr *)&client_it->address, sizeof(client_it->address));
-
-            if (sent > 0)
+            message.write_bytes(notification.data(), notification.size());
+            if (client.format_negotiated)
             {
-                sent_count++;
+                message.write_uint8(client.availability_format);
             }
-            ++client_it;
-        }
-        else
-        {
-            client_it = clients.erase(client_it);
+            FacilityManager::write_availability(message, availability, client.availability_format);
+            built[variant] = true;
         }
+
+        datagrams.push_back({message.data(), message.size(), client.address});
     }
 
+    size_t sent_count = send_datagrams(sockfd, datagrams);
+
     if (sent_count > 0)
     {
-        std::cout << "Sent booking change notification to " << sent_count
-                  << " monitoring client(s) for " << facility_name
-                  << " (Operation: " << operation_msg << ")" << std::endl;
+        SERVER_LOG(LogLevel::DEBUG, "monitors_notified")
+            .field("facility", facility_name)
+            .field("operation", operation_msg)
+            .field("clients", static_cast<uint64_t>(sent_count));
     }
 }
 
 void MonitorManager::cleanup_expired_monitors()
 {
-    time_t now = time(nullptr);
+    std::lock_guard<std::mutex> lock(mutex);
+    remove_expired(time(nullptr));
+}
 
+void MonitorManager::remove_expired(time_t now)
+{
     for (auto &pair : monitors)
     {
         auto &clients = pair.second;
-        clients.erase(
-            std::remove_if(clients.begin(), clients.end(),
-                           [now](const ClientInfo &info)
-                           {
-                               return now >= info.expiry_time;
-                           }),
-            clients.end());
+        auto expired = std::remove_if(clients.begin(), clients.end(),
+                                      [now](const ClientInfo &info)
+                                      {
+                                          return now >= info.expiry_time;
+                                      });
+        registrations -= static_cast<size_t>(clients.end() - expired);
+        clients.erase(expired, clients.end());
     }
 }
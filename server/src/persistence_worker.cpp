@@ -0,0 +1,247 @@
+/**
+ * Persistence Worker Implementation
+ */
+
+#include "../include/persistence_worker.h"
+#include "../include/logger.h"
+#include <algorithm>
+#include <iostream>
+
+// Pause before writing a failed batch again
+static const std::chrono::milliseconds JOURNAL_RETRY_DELAY(1000);
+
+PersistenceWorker::PersistenceWorker(JsonStorage &storage, DurabilityMode mode,
+                                     std::chrono::milliseconds commit_delay)
+    : storage(storage), mode(mode), commit_delay(commit_delay),
+      last_seq(0), durable_seq(0), snapshot_seq(0), abandoned_seq(0),
+      snapshots_requested(0), snapshots_done(0),
+      running(false), stopping(false), abandon_failed(false),
+      batches_written(0), records_written(0), snapshots_written(0), write_failures(0)
+{
+}
+
+PersistenceWorker::~PersistenceWorker()
+{
+    stop();
+}
+
+void PersistenceWorker::start(SnapshotCapture snapshot_capture)
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    if (running)
+        return;
+
+    capture = std::move(snapshot_capture);
+    running = true;
+    stopping = false;
+    worker = std::thread(&PersistenceWorker::run, this);
+}
+
+void PersistenceWorker::stop()
+{
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        if (!running)
+            return;
+        stopping = true;
+    }
+    work_cv.notify_all();
+
+    if (worker.joinable())
+    {
+        worker.join();
+    }
+
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        running = false;
+    }
+    durable_cv.notify_all();
+
+    print_statistics();
+}
+
+uint64_t PersistenceWorker::enqueue(const char *op, const Booking &booking)
+{
+    uint64_t seq;
+    bool wake;
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        seq = ++last_seq;
+        if (pending.empty())
+        {
+            first_pending_time = std::chrono::steady_clock::now();
+        }
+        pending.push_back({seq, op, booking});
+        // In DELAY mode the worker is already timing the open batch
+        wake = mode != DurabilityMode::DELAY || pending.size() == 1;
+    }
+    if (wake)
+    {
+        work_cv.notify_one();
+    }
+    return seq;
+}
+
+bool PersistenceWorker::wait_durable(uint64_t seq)
+{
+    if (mode != DurabilityMode::FSYNC)
+        return true;
+
+    std::unique_lock<std::mutex> lock(mutex);
+    durable_cv.wait(lock, [&]
+                    { return durable_seq >= seq || abandoned_seq >= seq || !running; });
+    return durable_seq >= seq;
+}
+
+void PersistenceWorker::abandon_failed_writes()
+{
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        abandon_failed = true;
+    }
+    work_cv.notify_all();
+}
+
+void PersistenceWorker::request_snapshot(bool wait)
+{
+    std::unique_lock<std::mutex> lock(mutex);
+    if (!running)
+        return;
+
+    uint64_t ticket = ++snapshots_requested;
+    work_cv.notify_one();
+
+    if (wait)
+    {
+        durable_cv.wait(lock, [&]
+                        { return snapshots_done >= ticket || !running; });
+    }
+}
+
+uint64_t PersistenceWorker::last_sequence()
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    return last_seq;
+}
+
+size_t PersistenceWorker::journal_records()
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    return static_cast<size_t>(last_seq - snapshot_seq);
+}
+
+size_t PersistenceWorker::pending_records()
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    return static_cast<size_t>(last_seq - durable_seq);
+}
+
+void PersistenceWorker::print_statistics() const
+{
+    uint64_t batches = batches_written;
+    uint64_t records = records_written;
+    std::cout << "Persistence: " << records << " journal records in " << batches
+              << " batches (" << (batches ? static_cast<double>(records) / batches : 0.0)
+              << " per fsync), " << snapshots_written << " snapshots, "
+              << write_failures << " failed journal writes" << std::endl;
+}
+
+void PersistenceWorker::run()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+
+    while (true)
+    {
+        work_cv.wait(lock, [&]
+                     { return stopping || !pending.empty() || snapshots_requested > snapshots_done; });
+
+        // Hold the batch open until the commit delay expires
+        if (mode == DurabilityMode::DELAY && !stopping && !pending.empty())
+        {
+            work_cv.wait_until(lock, first_pending_time + commit_delay, [&]
+                               { return stopping || snapshots_requested > snapshots_done; });
+        }
+
+        if (!pending.empty())
+        {
+            std::vector<JournalRecord> batch;
+            batch.swap(pending);
+            lock.unlock();
+
+            // One write and one fsync for every record that arrived meanwhile
+            bool written = storage.append_journal(batch) && storage.sync_journal();
+            if (written)
+            {
+                batches_written++;
+                records_written += batch.size();
+            }
+            else
+            {
+                write_failures++;
+                SERVER_LOG(LogLevel::ERROR, "journal_write_failed").field("records", static_cast<uint64_t>(batch.size()));
+            }
+
+            lock.lock();
+            if (written)
+            {
+                durable_seq = std::max(durable_seq, batch.back().seq);
+                durable_cv.notify_all();
+            }
+            else if (!stopping && !abandon_failed)
+            {
+                // Not on disk, so its callers keep waiting: put the batch back
+                // ahead of anything queued meanwhile and write it again later
+                pending.insert(pending.begin(), batch.begin(), batch.end());
+                work_cv.wait_for(lock, JOURNAL_RETRY_DELAY, [&]
+                                 { return stopping || abandon_failed; });
+            }
+            else
+            {
+                // Shutting down: give up and tell the waiters their records
+                // never reached the disk
+                SERVER_LOG(LogLevel::ERROR, "journal_records_lost").field("records", static_cast<uint64_t>(batch.size()));
+                abandoned_seq = std::max(abandoned_seq, batch.back().seq);
+                durable_cv.notify_all();
+            }
+        }
+
+        if (snapshots_requested > snapshots_done)
+        {
+            uint64_t ticket = snapshots_requested;
+            lock.unlock();
+            take_snapshot();
+            lock.lock();
+            snapshots_done = ticket;
+            durable_cv.notify_all();
+        }
+
+        if (stopping && pending.empty())
+            break;
+    }
+}
+
+void PersistenceWorker::take_snapshot()
+{
+    // Copy under the data locks, then serialise without holding them
+    std::map<std::string, Facility> facilities;
+    std::map<uint32_t, Booking> bookings;
+    uint64_t covered = capture(facilities, bookings);
+
+    if (!storage.write_snapshot(facilities, bookings))
+    {
+        SERVER_LOG(LogLevel::WARN, "snapshot_failed");
+        return;
+    }
+    snapshots_written++;
+
+    // Records still queued but already in the snapshot need no journal entry
+    std::lock_guard<std::mutex> lock(mutex);
+    pending.erase(std::remove_if(pending.begin(), pending.end(),
+                                 [covered](const JournalRecord &record)
+                                 { return record.seq <= covered; }),
+                  pending.end());
+    snapshot_seq = std::max(snapshot_seq, covered);
+    durable_seq = std::max(durable_seq, covered);
+    durable_cv.notify_all();
+}
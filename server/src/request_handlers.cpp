@@ -4,7 +4,8 @@
 
 #include "../include/request_handlers.h"
 #include "../include/message_types.h"
-#include <iostream>
+#include "../include/logger.h"
+#include <stdexcept>
 
 RequestHandlers::RequestHandlers(FacilityManager &fm, MonitorManager &mm)
     : facility_manager(fm), monitor_manager(mm) {}
@@ -20,10 +21,21 @@ ByteBuffer RequestHandlers::handle_query_availability(ByteBuffer &request)
         days.push_back(request.read_uint32());
     }
 
-    std::cout << "Query availability for " << facility_name << std::endl;
+    // Optional trailing byte selects the availability encoding
+    bool format_negotiated = request.remaining() > 0;
+    uint8_t format = format_negotiated ? request.read_uint8() : static_cast<uint8_t>(FORMAT_SLOT_LIST);
+
+    SERVER_LOG(LogLevel::DEBUG, "query_availability").field("facility", facility_name);
 
     ByteBuffer response;
 
+    if (!is_supported_format(format))
+    {
+        response.write_uint8(RESPONSE_ERROR);
+        response.write_string("Unsupported availability format");
+        return response;
+    }
+
     if (!facility_manager.facility_exists(facility_name))
     {
         response.write_uint8(RESPONSE_ERROR);
@@ -31,16 +43,14 @@ ByteBuffer RequestHandlers::handle_query_availability(ByteBuffer &request)
         return response;
     }
 
-    std::vector<TimeSlot> slots = facility_manager.get_available_slots(facility_name, days);
+    std::vector<DayAvailability> availability = facility_manager.get_availability(facility_name, days);
 
     response.write_uint8(RESPONSE_SUCCESS);
-    response.write_uint16(static_cast<uint16_t>(slots.size()));
-
-    for (const auto &slot : slots)
+    if (format_negotiated)
     {
-        response.write_time(slot.start_time);
-        response.write_time(slot.end_time);
+        response.write_uint8(format);
     }
+    FacilityManager::write_availability(response, availability, format);
 
     return response;
 }
@@ -51,7 +61,7 @@ ByteBuffer RequestHandlers::handle_book_facility(ByteBuffer &request)
     time_t start_time = request.read_time();
     time_t end_time = request.read_time();
 
-    std::cout << "Book facility: " << facility_name << std::endl;
+    SERVER_LOG(LogLevel::DEBUG, "book_facility").field("facility", facility_name);
 
     ByteBuffer response;
 
@@ -82,7 +92,7 @@ ByteBuffer RequestHandlers::handle_change_booking(ByteBuffer &request)
     uint32_t booking_id = request.read_uint32();
     int32_t offset_minutes = static_cast<int32_t>(request.read_uint32());
 
-    std::cout << "Change booking: " << booking_id << std::endl;
+    SERVER_LOG(LogLevel::DEBUG, "change_booking").field("booking", booking_id);
 
     ByteBuffer response;
 
@@ -105,10 +115,21 @@ ByteBuffer RequestHandlers::handle_monitor_facility(ByteBuffer &request,
     std::string facility_name = request.read_string();
     uint32_t duration_seconds = request.read_uint32();
 
-    std::cout << "Monitor facility: " << facility_name << std::endl;
+    // Optional trailing byte selects the availability encoding of notifications
+    bool format_negotiated = request.remaining() > 0;
+    uint8_t format = format_negotiated ? request.read_uint8() : static_cast<uint8_t>(FORMAT_SLOT_LIST);
+
+    SERVER_LOG(LogLevel::DEBUG, "monitor_facility").field("facility", facility_name);
 
     ByteBuffer response;
 
+    if (!is_supported_format(format))
+    {
+        response.write_uint8(RESPONSE_ERROR);
+        response.write_string("Unsupported availability format");
+        return response;
+    }
+
     if (!facility_manager.facility_exists(facility_name))
     {
         response.write_uint8(RESPONSE_ERROR);
@@ -116,7 +137,8 @@ ByteBuffer RequestHandlers::handle_monitor_facility(ByteBuffer &request,
         return response;
     }
 
-    monitor_manager.register_monitor(facility_name, client_addr, duration_seconds);
+    monitor_manager.register_monitor(facility_name, client_addr, duration_seconds,
+                                     format, format_negotiated);
 
     response.write_uint8(RESPONSE_SUCCESS);
     response.write_string("Monitoring registered successfully");
@@ -128,7 +150,7 @@ ByteBuffer RequestHandlers::handle_get_last_booking_time(ByteBuffer &request)
 {
     std::string facility_name = request.read_string();
 
-    std::cout << "Get last booking time for: " << facility_name << std::endl;
+    SERVER_LOG(LogLevel::DEBUG, "get_last_booking_time").field("facility", facility_name);
 
     ByteBuffer response;
 
@@ -161,7 +183,7 @@ ByteBuffer RequestHandlers::handle_extend_booking(ByteBuffer &request)
     uint32_t booking_id = request.read_uint32();
     uint32_t minutes_to_extend = request.read_uint32();
 
-    std::cout << "Extend booking: " << booking_id << std::endl;
+    SERVER_LOG(LogLevel::DEBUG, "extend_booking").field("booking", booking_id);
 
     ByteBuffer response;
 
@@ -172,11 +194,135 @@ ByteBuffer RequestHandlers::handle_extend_booking(ByteBuffer &request)
         return response;
     }
 
-    const Booking &booking = facility_manager.get_booking(booking_id);
+    // Bookings are never removed, so it is still there
+    std::optional<Booking> booking = facility_manager.get_booking(booking_id);
 
     response.write_uint8(RESPONSE_SUCCESS);
-    response.write_time(booking.end_time);
+    response.write_time(booking->end_time);
     response.write_string("Booking extended successfully");
 
     return response;
 }
+
+bool RequestHandlers::is_supported_format(uint8_t format)
+{
+    return format == FORMAT_SLOT_LIST || format == FORMAT_BITMAP;
+}
+
+bool RequestHandlers::is_mutation(uint8_t message_type)
+{
+    return message_type == BOOK_FACILITY || message_type == CHANGE_BOOKING || message_type == EXTEND_BOOKING;
+}
+
+bool RequestHandlers::is_batchable(uint8_t message_type)
+{
+    switch (message_type)
+    {
+    case QUERY_AVAILABILITY:
+    case BOOK_FACILITY:
+    case CHANGE_BOOKING:
+    case GET_LAST_BOOKING_TIME:
+    case EXTEND_BOOKING:
+        return true;
+    default:
+        return false;
+    }
+}
+
+ByteBuffer RequestHandlers::handle_batch(ByteBuffer &request, const BatchDispatcher &dispatch)
+{
+    uint16_t num_ops = request.read_uint16();
+    if (num_ops > MAX_BATCH_OPERATIONS)
+    {
+        ByteBuffer response;
+        response.write_uint8(RESPONSE_ERROR);
+        response.write_string("Too many operations in batch");
+        return response;
+    }
+
+    // Validate the whole framing before executing anything, so a malformed
+    // batch never leaves earlier operations half-applied
+    struct SubRequest
+    {
+        uint8_t type;
+        size_t offset;
+        uint16_t length;
+    };
+    std::vector<SubRequest> sub_requests;
+    sub_requests.reserve(num_ops);
+    for (uint16_t i = 0; i < num_ops; i++)
+    {
+        SubRequest sub;
+        sub.type = request.read_uint8();
+        sub.length = request.read_uint16();
+        sub.offset = request.position();
+        if (request.remaining() < sub.length)
+            throw std::runtime_error("Buffer underflow");
+        request.set_position(sub.offset + sub.length);
+        sub_requests.push_back(sub);
+    }
+
+    SERVER_LOG(LogLevel::DEBUG, "batch").field("operations", num_ops);
+
+    // Leave room for request_id, status and operation count
+    const size_t max_body_size = MAX_BUFFER_SIZE - 4 - 1 - 2;
+    // Every operation still to come keeps room for a "not executed" reply,
+    // so a reply is never replaced after its operation has committed
+    static const char NOT_EXECUTED[] = "Not executed: batch response full";
+    const size_t not_executed_size = 2 + 1 + 2 + sizeof(NOT_EXECUTED) - 1;
+    // Largest reply a book/change/extend can produce
+    const size_t mutation_reply_max = 64;
+    ByteBuffer body;
+    bool full = false;
+
+    for (size_t i = 0; i < sub_requests.size(); i++)
+    {
+        const SubRequest &sub = sub_requests[i];
+        size_t available = max_body_size - body.size() - (sub_requests.size() - 1 - i) * not_executed_size;
+        ByteBuffer sub_response;
+
+        // Later operations may depend on earlier ones, so once one is
+        // skipped the rest are skipped too
+        full = full || (is_mutation(sub.type) && available < 2 + mutation_reply_max);
+
+        if (!full && !is_batchable(sub.type))
+        {
+            sub_response.write_uint8(RESPONSE_ERROR);
+            sub_response.write_string("Operation not allowed in batch");
+        }
+        else if (!full)
+        {
+            try
+            {
+                ByteBuffer sub_request(request.data() + sub.offset, sub.length);
+                sub_response = dispatch(sub.type, sub_request);
+            }
+            catch (const std::exception &e)
+            {
+                sub_response = ByteBuffer();
+                sub_response.write_uint8(RESPONSE_ERROR);
+                sub_response.write_string(std::string("Server error: ") + e.what());
+            }
+        }
+
+        // Only replies to reads or failed operations can be too large here:
+        // dropping them loses no committed work
+        if (full || 2 + sub_response.size() > available)
+        {
+            full = true;
+            sub_response = ByteBuffer();
+            sub_response.write_uint8(RESPONSE_ERROR);
+            sub_response.write_string(NOT_EXECUTED);
+        }
+
+        body.write_uint16(static_cast<uint16_t>(sub_response.size()));
+        body.write_bytes(sub_response.data(), sub_response.size());
+    }
+
+    ByteBuffer response;
+    response.write_uint8(RESPONSE_SUCCESS);
+    response.write_uint16(num_ops);
+    response.write_bytes(body.data(), body.size());
+
+    return response;
+}
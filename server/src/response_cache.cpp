@@ -0,0 +1,345 @@
+/**
+ * Response Cache Implementation
+ */
+
+#include "../include/response_cache.h"
+#include <chrono>
+
+// One bucket per second of insertion time; one more than the TTL so a
+// bucket is always drained before it is reused
+static const size_t WHEEL_SIZE = RESPONSE_CACHE_TTL + 1;
+
+// Rough bookkeeping per entry (hash node, index node, wheel slot, vector
+// header) and per client (hash node, replay window)
+static const size_t ENTRY_OVERHEAD = 128;
+static const size_t CLIENT_OVERHEAD = 128 + REPLAY_WINDOW_BITS / 8;
+
+static uint64_t mix_client(const ClientAddr &client)
+{
+    return (static_cast<uint64_t>(client.ip) << 16 | client.port) * 0x9E3779B97F4A7C15ULL;
+}
+
+size_t ResponseCache::KeyHash::operator()(const Key &key) const
+{
+    return static_cast<size_t>(mix_client(key.client) ^ (key.request_id * 0xC2B2AE3D27D4EB4FULL));
+}
+
+size_t ResponseCache::ClientHash::operator()(const ClientAddr &client) const
+{
+    return static_cast<size_t>(mix_client(client));
+}
+
+ResponseCache::ResponseCache(size_t byte_budget)
+    : shard_budget(byte_budget / RESPONSE_CACHE_SHARDS),
+      hits(0), misses(0), evictions(0), expirations(0), released(0),
+      entry_count(0), client_count(0), byte_count(0)
+{
+    uint64_t now = now_tick();
+    for (Shard &shard : shards)
+    {
+        shard.wheel.resize(WHEEL_SIZE);
+        shard.oldest_tick = now;
+    }
+}
+
+ResponseCache::Shard &ResponseCache::shard_for(const ClientAddr &client)
+{
+    // By client, so all of a client's replies share one shard
+    return shards[(mix_client(client) >> 32) % RESPONSE_CACHE_SHARDS];
+}
+
+uint64_t ResponseCache::now_tick()
+{
+    auto since_start = std::chrono::steady_clock::now().time_since_epoch();
+    return static_cast<uint64_t>(std::chrono::duration_cast<std::chrono::seconds>(since_start).count());
+}
+
+size_t ResponseCache::entry_cost(size_t response_size)
+{
+    return response_size + ENTRY_OVERHEAD;
+}
+
+bool ResponseCache::window_contains(const ClientState &state, uint32_t request_id)
+{
+    if (state.highest_seen == 0 || request_id > state.highest_seen)
+        return false;
+    uint32_t age = state.highest_seen - request_id;
+    return age < REPLAY_WINDOW_BITS && state.seen.test(age);
+}
+
+void ResponseCache::window_mark(ClientState &state, uint32_t request_id)
+{
+    if (request_id > state.highest_seen)
+    {
+        uint32_t advance = request_id - state.highest_seen;
+        if (advance >= REPLAY_WINDOW_BITS)
+            state.seen.reset();
+        else
+            state.seen <<= advance;
+        state.highest_seen = request_id;
+        state.seen.set(0);
+    }
+    else if (state.highest_seen - request_id < REPLAY_WINDOW_BITS)
+    {
+        state.seen.set(state.highest_seen - request_id);
+    }
+}
+
+ResponseCache::ClientState &ResponseCache::touch_client(Shard &shard, const ClientAddr &client, uint64_t now)
+{
+    auto result = shard.clients.try_emplace(client);
+    ClientState &state = result.first->second;
+    if (result.second)
+    {
+        shard.bytes += CLIENT_OVERHEAD;
+        byte_count += CLIENT_OVERHEAD;
+        client_count++;
+    }
+
+    // At most one live wheel slot per client, moved forward once a second
+    if (state.stamp == 0 || state.tick != now)
+    {
+        state.stamp = shard.next_stamp++;
+        state.tick = now;
+        shard.wheel[now % WHEEL_SIZE].push_back({Key{client, 0}, state.stamp});
+    }
+    return state;
+}
+
+void ResponseCache::erase_entry(Shard &shard, const Key &key, std::atomic<uint64_t> &counter)
+{
+    auto it = shard.entries.find(key);
+    if (it == shard.entries.end())
+        return;
+
+    size_t cost = entry_cost(it->second.response.size());
+    shard.bytes -= cost;
+    byte_count -= cost;
+    entry_count--;
+    counter++;
+    shard.entries.erase(it);
+}
+
+bool ResponseCache::drop_slot(Shard &shard, const WheelSlot &slot, std::atomic<uint64_t> &counter)
+{
+    if (slot.key.request_id == 0)
+    {
+        // The client has been idle for the TTL: forget it with its replies
+        auto it = shard.clients.find(slot.key.client);
+        if (it == shard.clients.end() || it->second.stamp != slot.stamp)
+            return false; // Refreshed since this slot was queued
+
+        for (uint32_t request_id : it->second.request_ids)
+        {
+            erase_entry(shard, Key{slot.key.client, request_id}, counter);
+        }
+        shard.bytes -= CLIENT_OVERHEAD;
+        byte_count -= CLIENT_OVERHEAD;
+        client_count--;
+        shard.clients.erase(it);
+        return true;
+    }
+
+    auto it = shard.entries.find(slot.key);
+    if (it == shard.entries.end() || it->second.stamp != slot.stamp)
+        return false; // Replaced or released since this slot was queued
+
+    auto client_it = shard.clients.find(slot.key.client);
+    if (client_it != shard.clients.end())
+    {
+        client_it->second.request_ids.erase(slot.key.request_id);
+    }
+    erase_entry(shard, slot.key, counter);
+    return true;
+}
+
+void ResponseCache::expire(Shard &shard, uint64_t now)
+{
+    if (now >= shard.oldest_tick + WHEEL_SIZE)
+    {
+        // Idle for longer than the TTL: everything has expired
+        for (auto &bucket : shard.wheel)
+        {
+            for (const WheelSlot &slot : bucket)
+            {
+                drop_slot(shard, slot, expirations);
+            }
+            bucket.clear();
+        }
+        shard.oldest_tick = now + 1 - RESPONSE_CACHE_TTL;
+        return;
+    }
+
+    while (shard.oldest_tick + RESPONSE_CACHE_TTL <= now)
+    {
+        auto &bucket = shard.wheel[shard.oldest_tick % WHEEL_SIZE];
+        for (const WheelSlot &slot : bucket)
+        {
+            drop_slot(shard, slot, expirations);
+        }
+        bucket.clear();
+        shard.oldest_tick++;
+    }
+}
+
+bool ResponseCache::evict_oldest(Shard &shard, uint64_t now)
+{
+    while (shard.oldest_tick <= now)
+    {
+        auto &bucket = shard.wheel[shard.oldest_tick % WHEEL_SIZE];
+        while (!bucket.empty())
+        {
+            WheelSlot slot = bucket.front();
+            bucket.pop_front();
+            if (slot.key.request_id == 0)
+            {
+                // Replies go before the record of a client that still has
+                // some, which would lose its replay window along with them
+                auto it = shard.clients.find(slot.key.client);
+                if (it != shard.clients.end() && it->second.stamp == slot.stamp &&
+                    !it->second.request_ids.empty())
+                {
+                    it->second.tick = now;
+                    shard.wheel[now % WHEEL_SIZE].push_back(slot);
+                    continue;
+                }
+            }
+            if (drop_slot(shard, slot, evictions))
+                return true;
+        }
+        if (shard.oldest_tick == now)
+            break;
+        shard.oldest_tick++;
+    }
+    return false;
+}
+
+CacheLookup ResponseCache::lookup(const ClientAddr &client, uint32_t request_id, std::vector<uint8_t> &response)
+{
+    Shard &shard = shard_for(client);
+    std::lock_guard<std::mutex> lock(shard.mutex);
+    expire(shard, now_tick());
+
+    Key key{client, request_id};
+    auto client_it = shard.clients.find(client);
+    if (client_it != shard.clients.end())
+    {
+        const ClientState &state = client_it->second;
+        if (request_id <= state.acked_through)
+            return CacheLookup::ACKNOWLEDGED;
+
+        auto it = shard.entries.find(key);
+        if (it != shard.entries.end())
+        {
+            response = it->second.response;
+            hits++;
+            return CacheLookup::HIT;
+        }
+    }
+    // Checked before the window, which only learns of a request once its reply is in
+    if (!shard.in_progress.insert(key).second)
+        return CacheLookup::IN_PROGRESS;
+    if (client_it != shard.clients.end())
+    {
+        const ClientState &state = client_it->second;
+        CacheLookup refused = CacheLookup::MISS;
+        if (window_contains(state, request_id))
+            refused = CacheLookup::UNAVAILABLE;
+        // Too old to tell: refuse rather than risk running it twice
+        else if (request_id + REPLAY_WINDOW_BITS <= state.highest_seen)
+            refused = CacheLookup::TOO_OLD;
+        if (refused != CacheLookup::MISS)
+        {
+            shard.in_progress.erase(key);
+            return refused;
+        }
+    }
+
+    misses++;
+    return CacheLookup::MISS;
+}
+
+void ResponseCache::insert(const ClientAddr &client, uint32_t request_id, const uint8_t *data, size_t size)
+{
+    size_t cost = entry_cost(size);
+    Shard &shard = shard_for(client);
+    std::lock_guard<std::mutex> lock(shard.mutex);
+    Key key{client, request_id};
+    shard.in_progress.erase(key);
+    if (cost + CLIENT_OVERHEAD > shard_budget)
+        return;
+
+    uint64_t now = now_tick();
+    expire(shard, now);
+
+    ClientState &state = touch_client(shard, client, now);
+    Entry &entry = shard.entries[key];
+    if (entry.stamp != 0)
+    {
+        // Replacing a reply: its old wheel slot goes stale and is skipped
+        // when reached
+        size_t old_cost = entry_cost(entry.response.size());
+        shard.bytes -= old_cost;
+        byte_count -= old_cost;
+    }
+    else
+    {
+        entry_count++;
+        state.request_ids.insert(request_id);
+        window_mark(state, request_id);
+    }
+    entry.response.assign(data, data + size);
+    entry.stamp = shard.next_stamp++;
+    shard.wheel[now % WHEEL_SIZE].push_back({key, entry.stamp});
+    shard.bytes += cost;
+    byte_count += cost;
+
+    while (shard.bytes > shard_budget && evict_oldest(shard, now))
+    {
+    }
+}
+
+void ResponseCache::release(const ClientAddr &client, uint32_t request_id)
+{
+    Shard &shard = shard_for(client);
+    std::lock_guard<std::mutex> lock(shard.mutex);
+    shard.in_progress.erase(Key{client, request_id});
+}
+
+void ResponseCache::acknowledge(const ClientAddr &client, uint32_t acked_through)
+{
+    Shard &shard = shard_for(client);
+    std::lock_guard<std::mutex> lock(shard.mutex);
+    uint64_t now = now_tick();
+    expire(shard, now);
+
+    // A client that never cached a reply has nothing to release or guard
+    if (shard.clients.find(client) == shard.clients.end())
+        return;
+
+    ClientState &state = touch_client(shard, client, now);
+    if (acked_through > state.acked_through)
+    {
+        state.acked_through = acked_through;
+        auto end = state.request_ids.upper_bound(acked_through);
+        for (auto it = state.request_ids.begin(); it != end; ++it)
+        {
+            erase_entry(shard, Key{client, *it}, released);
+        }
+        state.request_ids.erase(state.request_ids.begin(), end);
+    }
+}
+
+ResponseCacheStats ResponseCache::stats() const
+{
+    ResponseCacheStats result;
+    result.hits = hits;
+    result.misses = misses;
+    result.evictions = evictions;
+    result.expirations = expirations;
+    result.released = released;
+    result.entries = entry_count;
+    result.clients = client_count;
+    result.bytes = byte_count;
+    return result;
+}
@@ -0,0 +1,93 @@
+/**
+ * Task Ring Implementation
+ */
+
+#include "../include/task_ring.h"
+#include <cstring>
+
+void RequestTask::assign(const uint8_t *bytes, size_t length)
+{
+    size = length;
+    if (length <= TASK_SLOT_SIZE)
+    {
+        std::memcpy(inline_data, bytes, length);
+        if (!overflow.empty())
+        {
+            // Give back the memory of an earlier oversized datagram
+            std::vector<uint8_t>().swap(overflow);
+        }
+    }
+    else
+    {
+        overflow.assign(bytes, bytes + length);
+    }
+}
+
+TaskRing::TaskRing(size_t capacity)
+    : enqueue_pos(0), dequeue_pos(0), high_water(0), rejected(0), sleepers(0)
+{
+    size_t size = 2;
+    while (size < capacity)
+    {
+        size <<= 1;
+    }
+    mask = size - 1;
+
+    slots.reset(new Slot[size]);
+    for (size_t i = 0; i < size; ++i)
+    {
+        slots[i].sequence.store(i, std::memory_order_relaxed);
+    }
+}
+
+bool TaskRing::ready() const
+{
+    size_t pos = dequeue_pos.load(std::memory_order_seq_cst);
+    return slots[pos & mask].sequence.load(std::memory_order_seq_cst) == pos + 1;
+}
+
+size_t TaskRing::depth() const
+{
+    size_t head = dequeue_pos.load(std::memory_order_relaxed);
+    size_t tail = enqueue_pos.load(std::memory_order_relaxed);
+    return tail > head ? tail - head : 0;
+}
+
+void TaskRing::wake_consumers(size_t count)
+{
+    if (count == 0 || sleepers.load(std::memory_order_seq_cst) == 0)
+        return;
+
+    // Taking the mutex orders this wake-up after any consumer that is between
+    // registering as a sleeper and blocking; notify after releasing it so the
+    // woken thread does not block on the mutex straight away
+    {
+        std::lock_guard<std::mutex> lock(wait_mutex);
+    }
+    if (count > 1)
+    {
+        wait_cv.notify_all();
+    }
+    else
+    {
+        wait_cv.notify_one();
+    }
+}
+
+void TaskRing::wait(const std::atomic<bool> &stop)
+{
+    if (ready() || stop)
+        return;
+
+    std::unique_lock<std::mutex> lock(wait_mutex);
+    sleepers.fetch_add(1, std::memory_order_seq_cst);
+    wait_cv.wait(lock, [&]
+                 { return ready() || stop; });
+    sleepers.fetch_sub(1, std::memory_order_seq_cst);
+}
+
+void TaskRing::wake_all()
+{
+    std::lock_guard<std::mutex> lock(wait_mutex);
+    wait_cv.notify_all();
+}
@@ -4,34 +4,51 @@
 
 #include "../include/udp_server.h"
 #include "../include/message_types.h"
+#include "../include/logger.h"
 #include <sys/socket.h>
 #include <arpa/inet.h>
 #include <unistd.h>
 #include <iostream>
+#include <algorithm>
+#include <cerrno>
 #include <cstring>
 #include <chrono>
 
-UDPServer::UDPServer(int port, bool at_most_once, size_t thread_count, float drop_rate)
-    : port(port), sockfd(-1), use_at_most_once(at_most_once),
-      drop_rate(drop_rate), num_threads(thread_count), shutdown_flag(false),
-      total_requests(0), processed_requests(0), cached_responses(0)
+UDPServer::UDPServer(int port, bool at_most_once, size_t thread_count, float drop_rate,
+                     DurabilityMode durability, uint32_t commit_delay_ms, size_t receivers,
+                     size_t io_batch, uint32_t max_queue_delay_ms, size_t cache_bytes)
+    : port(port), use_at_most_once(at_most_once),
+      drop_rate(drop_rate), num_threads(thread_count), num_receivers(receivers ? receivers : 1),
+      io_batch(io_batch ? io_batch : 1), max_queue_delay_ms(max_queue_delay_ms),
+      shutdown_flag(false), start_time(std::chrono::steady_clock::now()), response_cache(cache_bytes),
+      total_requests(0), processed_requests(0), shed_requests(0), expired_requests(0),
+      ignored_duplicates(0), in_progress_duplicates(0), unavailable_replies(0), stale_requests(0),
+      receive_calls(0), send_calls(0), responses_sent(0)
 {
 
     // Initialize random seed for packet dropping
     srand(time(nullptr));
 
+    facility_manager.set_durability(durability, std::chrono::milliseconds(commit_delay_ms));
     facility_manager.initialize();
 
-    std::cout << "Initializing server with " << num_threads << " worker threads" << std::endl;
+    std::cout << "Initializing server with " << num_threads << " worker threads and "
+              << num_receivers << " receivers" << std::endl;
     if (drop_rate > 0.0f)
     {
         std::cout << "Packet drop rate: " << (drop_rate * 100.0f) << "%" << std::endl;
     }
 
-    // Create worker threads
-    for (size_t i = 0; i < num_threads; ++i)
+    // Create the receiver shards, splitting the workers between them
+    for (size_t i = 0; i < num_receivers; ++i)
     {
-        worker_threads.emplace_back(&UDPServer::worker_thread_func, this);
+        shards.push_back(std::make_unique<ReceiverShard>());
+        shards.back()->index = i;
+    }
+    for (size_t i = 0; i < std::max(num_threads, num_receivers); ++i)
+    {
+        ReceiverShard &shard = *shards[i % num_receivers];
+        shard.worker_threads.emplace_back(&UDPServer::worker_thread_func, this, std::ref(shard));
     }
 }
 
@@ -39,35 +56,66 @@ UDPServer::~UDPServer()
 {
     // Signal all threads to stop
     shutdown_flag = true;
-    queue_cv.notify_all();
-
-    // Wait for all threads to finish
-    for (auto &thread : worker_threads)
+    // A worker may be waiting on a journal write that keeps failing
+    facility_manager.begin_shutdown();
+    for (auto &shard : shards)
     {
-        if (thread.joinable())
+        shard->tasks.wake_all();
+
+        // Wake a receive thread blocked in recvmmsg
+        if (shard->sockfd >= 0)
         {
-            thread.join();
+            shutdown(shard->sockfd, SHUT_RDWR);
         }
     }
 
-    if (sockfd >= 0)
+    // Wait for all threads to finish
+    for (auto &shard : shards)
     {
-        close(sockfd);
+        if (shard->receive_thread.joinable())
+        {
+            shard->receive_thread.join();
+        }
+        for (auto &thread : shard->worker_threads)
+        {
+            if (thread.joinable())
+            {
+                thread.join();
+            }
+        }
+
+        if (shard->sockfd >= 0)
+        {
+            close(shard->sockfd);
+        }
     }
 
     std::cout << "\nServer shutdown complete." << std::endl;
     print_statistics();
 }
 
-bool UDPServer::initialize_socket()
+bool UDPServer::initialize_socket(ReceiverShard &shard)
 {
-    sockfd = socket(AF_INET, SOCK_DGRAM, 0);
+    int sockfd = socket(AF_INET, SOCK_DGRAM, 0);
     if (sockfd < 0)
     {
         std::cerr << "Error creating socket" << std::endl;
         return false;
     }
 
+    if (num_receivers > 1)
+    {
+        // Every receiver binds the same port; the kernel spreads clients
+        // across the sockets by hashing their 4-tuple
+        int enable = 1;
+        if (setsockopt(sockfd, SOL_SOCKET, SO_REUSEPORT, &enable, sizeof(enable)) < 0)
+        {
+            std::cerr << "Error enabling SO_REUSEPORT: " << std::strerror(errno) << std::endl;
+            close(sockfd);
+            return false;
+        }
+    }
+
     sockaddr_in server_addr{};
     server_addr.sin_family = AF_INET;
     server_addr.sin_addr.s_addr = INADDR_ANY;
@@ -80,219 +128,231 @@ bool UDPServer::initialize_socket()
         return false;
     }
 
+    shard.sockfd = sockfd;
     return true;
 }
 
-bool UDPServer::check_cache(const ClientAddr &client_key, uint32_t request_id,
-                            std::vector<uint8_t> &cached_response)
-{
-    std::lock_guard<std::mutex> lock(cache_mutex);
-
-    auto client_it = response_cache.find(client_key);
-    if (client_it != response_cache.end())
-    {
-        auto request_it = client_it->second.find(request_id);
-        if (request_it != client_it->second.end())
-        {
-            cached_response = request_it->second.response_data;
-            cached_responses++;
-            return true;
-        }
-    }
-    return false;
-}
-
-void UDPServer::cache_response(const ClientAddr &client_key, uint32_t request_id,
-                               const ByteBuffer &response)
+ByteBuffer UDPServer::dispatch_operation(uint8_t message_type, ByteBuffer &request,
+                                         const sockaddr_in &client_addr, int sockfd)
 {
-    std::lock_guard<std::mutex> lock(cache_mutex);
+    ByteBuffer response;
+    std::string affected_facility; // Track which facility was affected
 
-    CachedResponse cached;
-    cached.response_data.assign(response.data(), response.data() + response.size());
-    cached.timestamp = time(nullptr);
+    // Create thread-local request handler
+    RequestHandlers handlers(facility_manager, monitor_manager);
 
-    response_cache[client_key][request_id] = cached;
+    switch (message_type)
+    {
+    case QUERY_AVAILABILITY:
+        response = handlers.handle_query_availability(request);
+        break;
 
-    // Cleanup old entries if cache grows too large
-    if (response_cache.size() > 1000)
+    case BOOK_FACILITY:
     {
-        cleanup_old_cache_entries();
-    }
-}
+        // Save facility name and time info before processing
+        size_t saved_pos = request.position();
+        affected_facility = request.read_string();
+        time_t start_time = request.read_time();
+        time_t end_time = request.read_time();
+        request.set_position(saved_pos);
 
-void UDPServer::cleanup_old_cache_entries()
-{
-    // Called with cache_mutex already locked
-    time_t now = time(nullptr);
-    const time_t MAX_CACHE_AGE = 300; // 5 minutes
+        response = handlers.handle_book_facility(request);
 
-    for (auto client_it = response_cache.begin(); client_it != response_cache.end();)
-    {
-        auto &requests = client_it->second;
-        for (auto req_it = requests.begin(); req_it != requests.end();)
+        // If booking successful, notify monitors
+        if (response.data()[0] == RESPONSE_SUCCESS && !affected_facility.empty())
         {
-            if (now - req_it->second.timestamp > MAX_CACHE_AGE)
-            {
-                req_it = requests.erase(req_it);
-            }
-            else
-            {
-                ++req_it;
-            }
+            // Extract booking ID from response
+            ByteBuffer resp_copy(response.data(), response.size());
+            resp_copy.read_uint8(); // Skip status
+            uint32_t booking_id = resp_copy.read_uint32();
+
+            // Create booking change notification
+            BookingChange change;
+            change.operation = OP_BOOK;
+            change.booking_id = booking_id;
+            change.start_time = start_time;
+            change.end_time = end_time;
+            change.old_start_time = 0;
+            change.old_end_time = 0;
+
+            monitor_manager.notify_monitors(affected_facility, change, sockfd, facility_manager);
         }
+        break;
+    }
 
-        if (requests.empty())
+    case CHANGE_BOOKING:
+    {
+        // Get booking info before processing
+        size_t saved_pos = request.position();
+        uint32_t booking_id = request.read_uint32();
+        request.set_position(saved_pos);
+
+        std::optional<Booking> old_booking = facility_manager.get_booking(booking_id);
+        if (old_booking)
         {
-            client_it = response_cache.erase(client_it);
+            affected_facility = old_booking->facility_name;
         }
-        else
+
+        response = handlers.handle_change_booking(request);
+
+        // If change successful, notify monitors
+        if (response.data()[0] == RESPONSE_SUCCESS && !affected_facility.empty())
         {
-            ++client_it;
+            // Bookings are never removed, so it is still there
+            std::optional<Booking> new_booking = facility_manager.get_booking(booking_id);
+
+            BookingChange change;
+            change.operation = OP_CHANGE;
+            change.booking_id = booking_id;
+            change.start_time = new_booking->start_time;
+            change.end_time = new_booking->end_time;
+            change.old_start_time = old_booking->start_time;
+            change.old_end_time = old_booking->end_time;
+
+            monitor_manager.notify_monitors(affected_facility, change, sockfd, facility_manager);
         }
+        break;
     }
-}
 
-ByteBuffer UDPServer::process_request(ByteBuffer &request, const sockaddr_in &client_addr)
-{
-    uint32_t request_id = request.read_uint32();
-    uint8_t message_type = request.read_uint8();
-    request.read_uint16(); // payload_length (for protocol consistency)
+    case MONITOR_FACILITY:
+        response = handlers.handle_monitor_facility(request, client_addr);
+        break;
 
-    std::cout << "[Thread " << std::this_thread::get_id() << "] Processing request ID: "
-              << request_id << ", Type: " << (int)message_type << std::endl;
+    case GET_LAST_BOOKING_TIME:
+        response = handlers.handle_get_last_booking_time(request);
+        break;
 
-    ByteBuffer response;
-    std::string affected_facility; // Track which facility was affected
-
-    // Create thread-local request handler
-    RequestHandlers handlers(facility_manager, monitor_manager);
-
-    try
+    case EXTEND_BOOKING:
     {
-        switch (message_type)
-        {
-        case QUERY_AVAILABILITY:
-            response = handlers.handle_query_availability(request);
-            break;
+        // Get booking info before processing
+        size_t saved_pos = request.position();
+        uint32_t booking_id = request.read_uint32();
+        request.set_position(saved_pos);
 
-        case BOOK_FACILITY:
+        std::optional<Booking> old_booking = facility_manager.get_booking(booking_id);
+        if (old_booking)
         {
-            // Save facility name and time info before processing
-            size_t saved_pos = request.position();
-            affected_facility = request.read_string();
-            time_t start_time = request.read_time();
-            time_t end_time = request.read_time();
-            request.set_position(saved_pos);
-
-            response = handlers.handle_book_facility(request);
-
-            // If booking successful, notify monitors
-            if (response.data()[0] == RESPONSE_SUCCESS && !affected_facility.empty())
-            {
-                // Extract booking ID from response
-                ByteBuffer resp_copy(response.data(), response.size());
-                resp_copy.read_uint8(); // Skip status
-                uint32_t booking_id = resp_copy.read_uint32();
-
-                // Create booking change notification
-                BookingChange change;
-                change.operation = OP_BOOK;
-                change.booking_id = booking_id;
-                change.start_time = start_time;
-                change.end_time = end_time;
-                change.old_start_time = 0;
-                change.old_end_time = 0;
-
-                monitor_manager.notify_monitors(affected_facility, change, sockfd, facility_manager);
-            }
-            break;
+            affected_facility = old_booking->facility_name;
         }
 
-        case CHANGE_BOOKING:
-        {
-            // Get booking info before processing
-            size_t saved_pos = request.position();
-            uint32_t booking_id = request.read_uint32();
-            request.set_position(saved_pos);
+        response = handlers.handle_extend_booking(request);
 
-            Booking old_booking;
-            if (facility_manager.booking_exists(booking_id))
-            {
-                old_booking = facility_manager.get_booking(booking_id);
-                affected_facility = old_booking.facility_name;
-            }
+        // If extension successful, notify monitors
+        if (response.data()[0] == RESPONSE_SUCCESS && !affected_facility.empty())
+        {
+            // Bookings are never removed, so it is still there
+            std::optional<Booking> new_booking = facility_manager.get_booking(booking_id);
+
+            BookingChange change;
+            change.operation = OP_EXTEND;
+            change.booking_id = booking_id;
+            change.start_time = new_booking->start_time;
+            change.end_time = new_booking->end_time;
+            change.old_start_time = old_booking->start_time;
+            change.old_end_time = old_booking->end_time;
+
+            monitor_manager.notify_monitors(affected_facility, change, sockfd, facility_manager);
+        }
+        break;
+    }
 
-            response = handlers.handle_change_booking(request);
+    case STATS:
+        response = build_stats_response();
+        break;
 
-            // If change successful, notify monitors
-            if (response.data()[0] == RESPONSE_SUCCESS && !affected_facility.empty())
-            {
-                const Booking &new_booking = facility_manager.get_booking(booking_id);
+    default:
+        response.write_uint8(RESPONSE_ERROR);
+        response.write_string("Unknown message type");
+        break;
+    }
 
-                BookingChange change;
-                change.operation = OP_CHANGE;
-                change.booking_id = booking_id;
-                change.start_time = new_booking.start_time;
-                change.end_time = new_booking.end_time;
-                change.old_start_time = old_booking.start_time;
-                change.old_end_time = old_booking.end_time;
+    return response;
+}
 
-                monitor_manager.notify_monitors(affected_facility, change, sockfd, facility_manager);
-            }
+RequestOptions UDPServer::parse_request_options(const uint8_t *data, size_t size)
+{
+    RequestOptions options;
+    options.frame_size = size;
+
+    const size_t header_size = 4 + 1 + 2;
+    const size_t option_size = 1 + 4;
+    if (size < header_size)
+        return options;
+
+    uint16_t payload_length;
+    std::memcpy(&payload_length, data + 5, sizeof(payload_length));
+    size_t frame_size = header_size + ntohs(payload_length);
+    if (frame_size >= size || (size - frame_size) % option_size != 0)
+        return options; // No options (or a client that fills payload_length differently)
+
+    RequestOptions parsed;
+    parsed.frame_size = frame_size;
+    for (size_t pos = frame_size; pos < size; pos += option_size)
+    {
+        uint32_t value;
+        std::memcpy(&value, data + pos + 1, sizeof(value));
+        switch (data[pos])
+        {
+        case OPTION_NONE:
             break;
-        }
-
-        case MONITOR_FACILITY:
-            response = handlers.handle_monitor_facility(request, client_addr);
+        case OPTION_DEADLINE:
+            parsed.has_deadline = true;
+            parsed.deadline_ms = ntohl(value);
             break;
-
-        case GET_LAST_BOOKING_TIME:
-            response = handlers.handle_get_last_booking_time(request);
+        case OPTION_ACK:
+            parsed.has_ack = true;
+            parsed.acked_through = ntohl(value);
             break;
+        default:
+            return options; // Unknown option: treat the bytes as payload
+        }
+    }
+    return parsed;
+}
 
-        case EXTEND_BOOKING:
-        {
-            // Get booking info before processing
-            size_t saved_pos = request.position();
-            uint32_t booking_id = request.read_uint32();
-            request.set_position(saved_pos);
-
-            Booking old_booking;
-            if (facility_manager.booking_exists(booking_id))
-            {
-                old_booking = facility_manager.get_booking(booking_id);
-                affected_facility = old_booking.facility_name;
-            }
+bool UDPServer::is_idempotent(uint8_t message_type)
+{
+    // Running these twice gives the same result: a monitor registration
+    // only refreshes its expiry. A batch may contain anything.
+    switch (message_type)
+    {
+    case QUERY_AVAILABILITY:
+    case MONITOR_FACILITY:
+    case GET_LAST_BOOKING_TIME:
+    case STATS:
+        return true;
+    default:
+        return false;
+    }
+}
 
-            response = handlers.handle_extend_booking(request);
+ByteBuffer UDPServer::process_request(ByteBuffer &request, const sockaddr_in &client_addr, int sockfd)
+{
+    uint32_t request_id = request.read_uint32();
+    uint8_t message_type = request.read_uint8();
+    request.read_uint16(); // payload_length (for protocol consistency)
 
-            // If extension successful, notify monitors
-            if (response.data()[0] == RESPONSE_SUCCESS && !affected_facility.empty())
-            {
-                const Booking &new_booking = facility_manager.get_booking(booking_id);
+    SERVER_LOG(LogLevel::DEBUG, "request").field("type", message_type);
 
-                BookingChange change;
-                change.operation = OP_EXTEND;
-                change.booking_id = booking_id;
-                change.start_time = new_booking.start_time;
-                change.end_time = new_booking.end_time;
-                change.old_start_time = old_booking.start_time;
-                change.old_end_time = old_booking.end_time;
+    ByteBuffer response;
 
-                monitor_manager.notify_monitors(affected_facility, change, sockfd, facility_manager);
-            }
-            break;
+    try
+    {
+        if (message_type == BATCH)
+        {
+            // Create thread-local request handler
+            RequestHandlers handlers(facility_manager, monitor_manager);
+            response = handlers.handle_batch(request, [this, &client_addr, sockfd](uint8_t sub_type, ByteBuffer &sub_request)
+                                             { return dispatch_operation(sub_type, sub_request, client_addr, sockfd); });
         }
-
-        default:
-            response.write_uint8(RESPONSE_ERROR);
-            response.write_string("Unknown message type");
-            break;
+        else
+        {
+            response = dispatch_operation(message_type, request, client_addr, sockfd);
         }
     }
     catch (const std::exception &e)
     {
-        std::cerr << "Error processing request: " << e.what() << std::endl;
+        SERVER_LOG(LogLevel::ERROR, "request_failed").field("type", message_type).field("error", e.what());
         response = ByteBuffer();
         response.write_uint8(RESPONSE_ERROR);
         response.write_string(std::string("Server error: ") + e.what());
@@ -308,137 +368,381 @@ ByteBuffer UDPServer::process_request(ByteBuffer &request, const sockaddr_in &cl
     return final_response;
 }
 
-void UDPServer::worker_thread_func()
+void UDPServer::worker_thread_func(ReceiverShard &shard)
 {
-    std::cout << "Worker thread " << std::this_thread::get_id() << " started" << std::endl;
+    SERVER_LOG(LogLevel::INFO, "worker_started").field("receiver", static_cast<uint64_t>(shard.index));
+
+    std::vector<PendingReply> replies;
 
     while (!shutdown_flag)
     {
-        RequestTask task;
-
+        // Wait for task or shutdown signal
+        shard.tasks.wait(shutdown_flag);
+
+        // Take an even share of the backlog (at most io_batch tasks) so the
+        // replies go out in one sendmmsg without starving the other workers.
+        // Each task is processed in its ring slot, which is then reused.
+        size_t workers = shard.worker_threads.size();
+        size_t share = (shard.tasks.depth() + workers - 1) / workers;
+        size_t count = std::min(io_batch, std::max<size_t>(share, 1));
+        for (size_t i = 0; i < count; ++i)
         {
-            std::unique_lock<std::mutex> lock(queue_mutex);
-
-            // Wait for task or shutdown signal
-            queue_cv.wait(lock, [this]
-                          { return !task_queue.empty() || shutdown_flag; });
-
-            if (shutdown_flag && task_queue.empty())
+            if (!shard.tasks.try_pop([&](const RequestTask &task)
+                                     {
+                                         auto waited = std::chrono::steady_clock::now() - task.receive_time;
+                                         shard.metrics.queue_wait.record(waited);
+                                         shard.queue_delay_ms = static_cast<uint32_t>(
+                                             std::chrono::duration_cast<std::chrono::milliseconds>(waited).count());
+                                         process_task(shard, task, replies); }))
             {
                 break;
             }
-
-            if (!task_queue.empty())
-            {
-                task = std::move(task_queue.front());
-                task_queue.pop();
-            }
-            else
-            {
-                continue;
-            }
         }
-
-        // Process the task outside the lock
-        process_task(task);
+        Logger::instance().clear_request();
+        flush_responses(shard, replies);
     }
 
-    std::cout << "Worker thread " << std::this_thread::get_id() << " stopped" << std::endl;
+    SERVER_LOG(LogLevel::INFO, "worker_stopped").field("receiver", static_cast<uint64_t>(shard.index));
 }
 
-void UDPServer::process_task(const RequestTask &task)
+void UDPServer::process_task(ReceiverShard &shard, const RequestTask &task, std::vector<PendingReply> &replies)
 {
     try
     {
-        const uint8_t *buffer = task.data.data();
-        size_t buffer_len = task.data.size();
+        const uint8_t *buffer = task.data();
+        RequestOptions options = parse_request_options(buffer, task.size);
 
         uint32_t request_id;
         std::memcpy(&request_id, buffer, sizeof(request_id));
         request_id = ntohl(request_id);
+        Logger::instance().set_request(request_id);
+
+        // The client has stopped waiting for this copy and retransmitted or
+        // given up: any reply would be thrown away, so skip the work
+        if (options.has_deadline &&
+            std::chrono::steady_clock::now() > task.receive_time + std::chrono::milliseconds(options.deadline_ms))
+        {
+            expired_requests++;
+            SERVER_LOG(LogLevel::DEBUG, "deadline_expired").field("deadline_ms", options.deadline_ms);
+            return;
+        }
 
         ClientAddr client_key;
         client_key.ip = task.client_addr.sin_addr.s_addr;
         client_key.port = task.client_addr.sin_port;
 
-        ByteBuffer request(buffer, buffer_len);
-        ByteBuffer response = process_request(request, task.client_addr);
+        // At-most-once: a retransmitted request gets the original reply
+        // instead of being executed again. Idempotent requests are simply
+        // executed again, so their replies are never stored.
+        bool deduplicate = use_at_most_once && task.size > 4 && !is_idempotent(buffer[4]);
 
-        // Cache response if using at-most-once
-        if (use_at_most_once)
+        // Replies the client has acknowledged are no longer needed
+        if (use_at_most_once && options.has_ack && options.acked_through < request_id)
         {
-            cache_response(client_key, request_id, response);
+            response_cache.acknowledge(client_key, options.acked_through);
         }
-        // For at-least-once, we still cache to detect duplicates for logging
-        else
+
+        if (deduplicate)
         {
-            cache_response(client_key, request_id, response);
+            std::vector<uint8_t> cached;
+            CacheLookup cache_result = response_cache.lookup(client_key, request_id, cached);
+            if (cache_result == CacheLookup::HIT)
+            {
+                SERVER_LOG(LogLevel::DEBUG, "duplicate_resent");
+                queue_response_with_drop_simulation(replies, std::move(cached), task.client_addr);
+                return;
+            }
+            if (cache_result == CacheLookup::IN_PROGRESS)
+            {
+                // The first copy is still executing; the client retransmits
+                // again later and gets its cached reply then
+                in_progress_duplicates++;
+                SERVER_LOG(LogLevel::DEBUG, "duplicate_in_progress");
+                return;
+            }
+            if (cache_result == CacheLookup::ACKNOWLEDGED)
+            {
+                // A delayed copy of a request the client has finished with
+                ignored_duplicates++;
+                SERVER_LOG(LogLevel::DEBUG, "duplicate_ignored");
+                return;
+            }
+            if (cache_result == CacheLookup::UNAVAILABLE || cache_result == CacheLookup::TOO_OLD)
+            {
+                // The client is still waiting: tell it the outcome is unknown
+                // instead of leaving it to time out as if the packet was lost
+                bool too_old = cache_result == CacheLookup::TOO_OLD;
+                (too_old ? stale_requests : unavailable_replies)++;
+                SERVER_LOG(LogLevel::DEBUG, too_old ? "duplicate_too_old" : "duplicate_unavailable");
+                queue_response_with_drop_simulation(
+                    replies,
+                    build_error_response(request_id, too_old ? "Request too old to check, it may already have been processed"
+                                                             : "Request already processed, result unavailable"),
+                    task.client_addr);
+                return;
+            }
+        }
+
+        ByteBuffer request(buffer, options.frame_size);
+        auto started = std::chrono::steady_clock::now();
+        ByteBuffer response;
+        try
+        {
+            response = process_request(request, task.client_addr, shard.sockfd);
+        }
+        catch (...)
+        {
+            // No reply to cache: let a retransmission try again
+            if (deduplicate)
+            {
+                response_cache.release(client_key, request_id);
+            }
+            throw;
+        }
+        shard.metrics.handler_time.record(std::chrono::steady_clock::now() - started);
+        shard.metrics.count_request(options.frame_size > 4 ? buffer[4] : 0);
+
+        // Only non-idempotent requests in at-most-once mode look a reply up again
+        if (deduplicate)
+        {
+            response_cache.insert(client_key, request_id, response.data(), response.size());
         }
 
-        // Send response
-        send_response_with_drop_simulation(std::vector<uint8_t>(response.data(), response.data() + response.size()),
-                                           task.client_addr);
+        // Queue the response; the worker sends its whole batch at once
+        queue_response_with_drop_simulation(replies,
+                                            std::vector<uint8_t>(response.data(), response.data() + response.size()),
+                                            task.client_addr);
     }
     catch (const std::exception &e)
     {
-        std::cerr << "[Thread " << std::this_thread::get_id()
-                  << "] Error: " << e.what() << std::endl;
+        SERVER_LOG(LogLevel::ERROR, "task_failed").field("error", e.what());
     }
 }
 
 void UDPServer::start()
 {
-    if (!initialize_socket())
+    for (auto &shard : shards)
     {
-        return;
+        if (!initialize_socket(*shard))
+        {
+            return;
+        }
     }
 
     std::cout << "\n=== Multi-threaded UDP Server ===" << std::endl;
     std::cout << "Server listening on port " << port << std::endl;
     std::cout << "Invocation semantic: " << (use_at_most_once ? "at-most-once" : "at-least-once") << std::endl;
     std::cout << "Worker threads: " << num_threads << std::endl;
+    std::cout << "Receivers: " << num_receivers << (num_receivers > 1 ? " (SO_REUSEPORT)" : "") << std::endl;
+    std::cout << "I/O batch: " << io_batch << " datagrams per recvmmsg/sendmmsg" << std::endl;
+    if (max_queue_delay_ms > 0)
+    {
+        std::cout << "Load shedding: queue " << SHED_QUEUE_PERCENT << "% full or "
+                  << max_queue_delay_ms << " ms queue delay" << std::endl;
+    }
     std::cout << "====================================\n"
               << std::endl;
 
-    uint8_t buffer[MAX_BUFFER_SIZE];
+    // The calling thread serves the first receiver
+    for (size_t i = 1; i < shards.size(); ++i)
+    {
+        shards[i]->receive_thread = std::thread(&UDPServer::receive_loop, this, std::ref(*shards[i]));
+    }
+    receive_loop(*shards[0]);
+}
+
+void UDPServer::receive_loop(ReceiverShard &shard)
+{
+    // One full-size buffer per message so any batch can be drained at once
+    std::vector<uint8_t> buffers(io_batch * MAX_BUFFER_SIZE);
+    std::vector<sockaddr_in> addresses(io_batch);
+    std::vector<iovec> iovecs(io_batch);
+    std::vector<mmsghdr> messages(io_batch);
+    std::vector<PendingReply> busy_replies;
 
     while (!shutdown_flag)
     {
-        sockaddr_in client_addr{};
-        socklen_t client_len = sizeof(client_addr);
+        for (size_t i = 0; i < io_batch; ++i)
+        {
+            iovecs[i].iov_base = buffers.data() + i * MAX_BUFFER_SIZE;
+            iovecs[i].iov_len = MAX_BUFFER_SIZE;
+            messages[i] = mmsghdr{};
+            messages[i].msg_hdr.msg_name = &addresses[i];
+            messages[i].msg_hdr.msg_namelen = sizeof(addresses[i]);
+            messages[i].msg_hdr.msg_iov = &iovecs[i];
+            messages[i].msg_hdr.msg_iovlen = 1;
+        }
 
-        ssize_t recv_len = recvfrom(sockfd, buffer, MAX_BUFFER_SIZE, 0,
-                                    (struct sockaddr *)&client_addr, &client_len);
+        // Block for the first datagram, then take whatever else is queued
+        int count = recvmmsg(shard.sockfd, messages.data(), static_cast<unsigned int>(io_batch),
+                             MSG_WAITFORONE, nullptr);
+        receive_calls++;
 
-        if (recv_len < 0)
+        if (count < 0)
         {
-            if (!shutdown_flag)
+            if (!shutdown_flag && errno != EINTR)
             {
-                std::cerr << "Error receiving data" << std::endl;
+                SERVER_LOG(LogLevel::ERROR, "receive_failed").field("error", std::strerror(errno));
             }
             continue;
         }
 
-        total_requests++;
+        size_t queued = 0;
+        auto now = std::chrono::steady_clock::now();
+        for (int i = 0; i < count; ++i)
+        {
+            size_t recv_len = messages[i].msg_len;
+            const uint8_t *buffer = buffers.data() + i * MAX_BUFFER_SIZE;
+
+            total_requests++;
+            shard.received++;
 
-        std::cout << "\n--- Received " << recv_len << " bytes from "
-                  << inet_ntoa(client_addr.sin_addr) << ":" << ntohs(client_addr.sin_port)
-                  << " (Total: " << total_requests << ")" << std::endl;
+            if (recv_len >= sizeof(uint32_t))
+            {
+                uint32_t request_id;
+                std::memcpy(&request_id, buffer, sizeof(request_id));
+                Logger::instance().set_request(ntohl(request_id));
+            }
+            SERVER_LOG(LogLevel::DEBUG, "received")
+                .field("bytes", static_cast<uint64_t>(recv_len))
+                .field("ip", inet_ntoa(addresses[i].sin_addr))
+                .field("port", ntohs(addresses[i].sin_port));
+
+            // Refuse the request cheaply while the workers are saturated; it is
+            // neither executed nor cached, so the client simply sends it again
+            // STATS is never shed: it is how an operator sees the overload
+            uint32_t retry_after_ms;
+            if (recv_len >= sizeof(uint32_t) && !(recv_len > 4 && buffer[4] == STATS) &&
+                should_shed(shard, retry_after_ms))
+            {
+                uint32_t request_id;
+                std::memcpy(&request_id, buffer, sizeof(request_id));
+                shed_requests++;
+                queue_response_with_drop_simulation(busy_replies,
+                                                    build_busy_response(ntohl(request_id), retry_after_ms),
+                                                    addresses[i]);
+                continue;
+            }
 
-        // Create task and add to queue
-        RequestTask task;
-        task.data.assign(buffer, buffer + recv_len);
-        task.client_addr = client_addr;
-        task.receive_time = time(nullptr);
+            // Copy into a free ring slot; with the ring full the datagram is
+            // dropped and the client's retransmission tries again later
+            bool pushed = shard.tasks.try_push([&](RequestTask &task)
+                                               {
+                                                   task.assign(buffer, recv_len);
+                                                   task.client_addr = addresses[i];
+                                                   task.receive_time = now; });
+            if (pushed)
+            {
+                queued++;
+            }
+            else
+            {
+                SERVER_LOG(LogLevel::WARN, "queue_full")
+                    .field("ip", inet_ntoa(addresses[i].sin_addr))
+                    .field("port", ntohs(addresses[i].sin_port));
+            }
+        }
 
+        Logger::instance().clear_request();
+        shard.tasks.wake_consumers(queued);
+        flush_responses(shard, busy_replies);
+    }
+}
+
+bool UDPServer::should_shed(const ReceiverShard &shard, uint32_t &retry_after_ms) const
+{
+    if (max_queue_delay_ms == 0)
+        return false;
+
+    size_t depth = shard.tasks.depth();
+    uint32_t delay = shard.queue_delay_ms;
+    bool full = depth * 100 >= shard.tasks.capacity() * SHED_QUEUE_PERCENT;
+    // The delay only counts while there is a backlog for every worker
+    bool slow = depth >= shard.worker_threads.size() && delay > max_queue_delay_ms;
+    if (!full && !slow)
+        return false;
+
+    // A new request would wait about as long as the last one taken did
+    retry_after_ms = std::min(std::max(delay, MIN_RETRY_AFTER_MS), MAX_RETRY_AFTER_MS);
+    return true;
+}
+
+std::vector<uint8_t> UDPServer::build_error_response(uint32_t request_id, const char *message) const
+{
+    ByteBuffer response;
+    response.write_uint32(request_id);
+    response.write_uint8(RESPONSE_ERROR);
+    response.write_string(message);
+    return std::vector<uint8_t>(response.data(), response.data() + response.size());
+}
+
+std::vector<uint8_t> UDPServer::build_busy_response(uint32_t request_id, uint32_t retry_after_ms) const
+{
+    ByteBuffer response;
+    response.write_uint32(request_id);
+    response.write_uint8(RESPONSE_BUSY);
+    response.write_string("Server busy, retry later");
+    response.write_uint32(retry_after_ms);
+    return std::vector<uint8_t>(response.data(), response.data() + response.size());
+}
+
+ByteBuffer UDPServer::build_stats_response()
+{
+    // Counters summed over all shards at the moment of the request; the
+    // client derives rates and percentiles from successive snapshots
+    uint64_t queue_rejected = 0;
+    uint32_t queue_depth = 0, queue_capacity = 0, queue_high_water = 0;
+    std::vector<uint64_t> by_type(MAX_REQUEST_TYPE, 0);
+    std::vector<uint64_t> queue_wait, handler_time;
+    for (const auto &shard : shards)
+    {
+        queue_depth += static_cast<uint32_t>(shard->tasks.depth());
+        queue_capacity += static_cast<uint32_t>(shard->tasks.capacity());
+        queue_high_water += static_cast<uint32_t>(shard->tasks.high_water_mark());
+        queue_rejected += shard->tasks.rejected_count();
+        for (uint8_t type = 1; type <= MAX_REQUEST_TYPE; ++type)
         {
-            std::lock_guard<std::mutex> lock(queue_mutex);
-            task_queue.push(std::move(task));
+            by_type[type - 1] += shard->metrics.requests_by_type[type].load(std::memory_order_relaxed);
         }
+        shard->metrics.queue_wait.add_to(queue_wait);
+        shard->metrics.handler_time.add_to(handler_time);
+    }
+    ResponseCacheStats cache = response_cache.stats();
+    auto uptime = std::chrono::duration_cast<std::chrono::seconds>(std::chrono::steady_clock::now() - start_time);
 
-        // Notify one worker thread
-        queue_cv.notify_one();
+    ByteBuffer response;
+    response.write_uint8(RESPONSE_SUCCESS);
+    response.write_uint32(static_cast<uint32_t>(uptime.count()));
+    response.write_uint64(total_requests);
+    response.write_uint64(processed_requests);
+    response.write_uint64(shed_requests);
+    response.write_uint64(expired_requests);
+    response.write_uint64(ignored_duplicates);
+    response.write_uint64(unavailable_replies);
+    response.write_uint64(stale_requests);
+    response.write_uint64(in_progress_duplicates);
+    response.write_uint32(queue_depth);
+    response.write_uint32(queue_capacity);
+    response.write_uint32(queue_high_water);
+    response.write_uint64(queue_rejected);
+    response.write_uint32(static_cast<uint32_t>(cache.entries));
+    response.write_uint32(static_cast<uint32_t>(cache.clients));
+    response.write_uint64(cache.bytes);
+    response.write_uint64(cache.hits);
+    response.write_uint64(cache.misses);
+    response.write_uint32(static_cast<uint32_t>(monitor_manager.monitor_count()));
+    response.write_uint32(static_cast<uint32_t>(facility_manager.total_bookings()));
+    response.write_uint32(static_cast<uint32_t>(facility_manager.persistence_lag()));
+    response.write_uint32(static_cast<uint32_t>(facility_manager.journal_records()));
+    for (const std::vector<uint64_t> *list : {&by_type, &queue_wait, &handler_time})
+    {
+        response.write_uint16(static_cast<uint16_t>(list->size()));
+        for (uint64_t value : *list)
+        {
+            response.write_uint64(value);
+        }
     }
+    return response;
 }
 
 void UDPServer::print_statistics() const
@@ -446,8 +750,43 @@ void UDPServer::print_statistics() const
     std::cout << "\n=== Server Statistics ===" << std::endl;
     std::cout << "Total requests received: " << total_requests << std::endl;
     std::cout << "Requests processed: " << processed_requests << std::endl;
-    std::cout << "Cached responses served: " << cached_responses << std::endl;
+    ResponseCacheStats cache = response_cache.stats();
+    std::cout << "Cached responses served: " << cache.hits << " (misses " << cache.misses
+              << ", evicted " << cache.evictions << ", expired " << cache.expirations << ")" << std::endl;
+    std::cout << "Response cache: " << cache.entries << " entries for " << cache.clients << " clients, "
+              << cache.bytes << " of " << response_cache.byte_budget() << " bytes, "
+              << cache.released << " released by client acks" << std::endl;
+    std::cout << "Duplicates ignored (already acknowledged): " << ignored_duplicates << std::endl;
+    std::cout << "Duplicates dropped while the original was executing: " << in_progress_duplicates << std::endl;
+    std::cout << "Duplicates answered with an unknown outcome: " << unavailable_replies
+              << " reply evicted, " << stale_requests << " older than the replay window" << std::endl;
+    std::cout << "Requests shed (busy): " << shed_requests << std::endl;
+    std::cout << "Requests skipped past deadline: " << expired_requests << std::endl;
     std::cout << "Worker threads: " << num_threads << std::endl;
+    std::cout << "Log records written: " << Logger::instance().written()
+              << ", dropped (buffer full): " << Logger::instance().dropped() << std::endl;
+    uint64_t receives = receive_calls;
+    uint64_t sends = send_calls;
+    std::cout << "Datagrams per recvmmsg: "
+              << (receives ? static_cast<double>(total_requests) / receives : 0.0)
+              << ", replies per sendmmsg: "
+              << (sends ? static_cast<double>(responses_sent) / sends : 0.0) << std::endl;
+    if (shards.size() > 1)
+    {
+        std::cout << "Requests per receiver:";
+        for (const auto &shard : shards)
+        {
+            std::cout << " " << shard->received;
+        }
+        std::cout << std::endl;
+    }
+    for (const auto &shard : shards)
+    {
+        std::cout << "Task queue " << shard->index << ": depth " << shard->tasks.depth()
+                  << ", high-water mark " << shard->tasks.high_water_mark()
+                  << " of " << shard->tasks.capacity()
+                  << ", dropped when full " << shard->tasks.rejected_count() << std::endl;
+    }
     std::cout << "========================\n"
               << std::endl;
 }
@@ -459,27 +798,44 @@ bool UDPServer::should_drop_packet() const
     return (rand() % 100) < (drop_rate * 100.0f);
 }
 
-void UDPServer::send_response_with_drop_simulation(const std::vector<uint8_t> &response_data,
-                                                   const sockaddr_in &client_addr)
+void UDPServer::queue_response_with_drop_simulation(std::vector<PendingReply> &replies,
+                                                    std::vector<uint8_t> response_data,
+                                                    const sockaddr_in &client_addr)
 {
     // Simulate packet drop
     if (should_drop_packet())
     {
-        std::cout << "[DROP] Simulated response packet drop (" << response_data.size() << " bytes)" << std::endl;
+        SERVER_LOG(LogLevel::DEBUG, "reply_dropped").field("bytes", static_cast<uint64_t>(response_data.size()));
         return; // Don't send the response
     }
 
-    // Send response normally
-    ssize_t sent = sendto(sockfd, response_data.data(), response_data.size(), 0,
-                          (struct sockaddr *)&client_addr, sizeof(client_addr));
+    replies.push_back({std::move(response_data), client_addr});
+}
 
-    if (sent < 0)
+void UDPServer::flush_responses(ReceiverShard &shard, std::vector<PendingReply> &replies)
+{
+    if (replies.empty())
+        return;
+
+    std::vector<OutgoingDatagram> datagrams;
+    datagrams.reserve(replies.size());
+    for (const PendingReply &reply : replies)
     {
-        std::cerr << "Error sending response" << std::endl;
+        datagrams.push_back({reply.data.data(), reply.data.size(), reply.client_addr});
     }
-    else
+
+    uint64_t calls = 0;
+    size_t sent = send_datagrams(shard.sockfd, datagrams, &calls);
+    send_calls += calls;
+    responses_sent += sent;
+
+    if (sent < replies.size())
     {
-        std::cout << "[Thread " << std::this_thread::get_id()
-                  << "] Sent " << sent << " bytes response" << std::endl;
+        SERVER_LOG(LogLevel::ERROR, "send_failed")
+            .field("unsent", static_cast<uint64_t>(replies.size() - sent))
+            .field("error", std::strerror(errno));
     }
+    SERVER_LOG(LogLevel::DEBUG, "replies_sent").field("count", static_cast<uint64_t>(sent));
+
+    replies.clear();
 }
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+二进制快照转换/查看工具
+在 data/*.json 与服务器的二进制快照 data/snapshot.bin 之间互相转换
+
+快照格式 (小端序, 与 server/include/json_storage.h 保持一致):
+  header:     magic "FBSNAP\\0\\0", u32 version, u32 facility_count,
+              u32 booking_count, u32 name_table_size
+  name table: 每个设施 u16 长度 + 名称字节, 补齐到 8 字节
+  bookings:   按 booking_id 排序的 24 字节定长记录:
+              u32 booking_id, u32 facility_index, i64 start_time, i64 end_time
+
+快照之后的变更记录在 data/journal.jsonl (每行一个预订的完整新状态),
+服务器启动时在快照之上重放。to-json 和 to-binary 同样先重放日志,
+to-binary 写入新快照后清空日志, 与服务器压缩日志的做法一致。
+已有 snapshot.bin 时 to-binary 以它为基础 (服务器迁移到二进制快照后
+不再更新 JSON 文件); 只有加 --force 才会改用 JSON 文件重建并覆盖它。
+转换时服务器不能在运行。
+"""
+
+import json
+import os
+import struct
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+USAGE = ("用法: python snapshot_tool.py to-binary <data_dir> [--force] | to-json <data_dir> "
+         "| inspect <snapshot.bin>")
+
+SNAPSHOT_MAGIC = b"FBSNAP\0\0"
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct("<8sIIII")
+RECORD = struct.Struct("<IIqq")
+NAME_LENGTH = struct.Struct("<H")
+
+SERVER_TZ = timezone(timedelta(hours=8))
+
+Booking = Dict[str, object]
+
+
+def load_json(data_dir: str) -> Tuple[List[str], List[Booking]]:
+    """Read facility names and bookings from facilities.json / bookings.json."""
+    with open(os.path.join(data_dir, "facilities.json"), encoding="utf-8") as f:
+        facilities = json.load(f)
+    bookings_path = os.path.join(data_dir, "bookings.json")
+    if os.path.exists(bookings_path):
+        with open(bookings_path, encoding="utf-8") as f:
+            bookings = json.load(f)
+    else:
+        # Fall back to the per-facility copies
+        bookings = [b for facility in facilities.values() for b in facility.get("bookings", [])]
+    names = set(facilities) | {b["facility_name"] for b in bookings}
+    return sorted(names), sorted(bookings, key=lambda b: b["booking_id"])
+
+
+def encode_snapshot(names: List[str], bookings: List[Booking]) -> bytes:
+    """Marshal facilities and bookings into the binary snapshot format."""
+    index = {name: i for i, name in enumerate(names)}
+    table = bytearray()
+    for name in names:
+        encoded = name.encode("utf-8")
+        table += NAME_LENGTH.pack(len(encoded)) + encoded
+    table += b"\0" * (-len(table) % 8)
+
+    out = bytearray(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(names), len(bookings), len(table)))
+    out += table
+    for b in bookings:
+        out += RECORD.pack(b["booking_id"], index[b["facility_name"]], b["start_time"], b["end_time"])
+    return bytes(out)
+
+
+def decode_snapshot(data: bytes) -> Tuple[int, List[str], List[Booking]]:
+    """Parse a binary snapshot; raises ValueError if it is malformed."""
+    if len(data) < HEADER.size:
+        raise ValueError("快照文件过短")
+    magic, version, facility_count, booking_count, table_size = HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("不是快照文件 (magic 不匹配)")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照版本: {version}")
+    if len(data) != HEADER.size + table_size + booking_count * RECORD.size:
+        raise ValueError("文件大小与 header 不一致")
+
+    names = []
+    pos = HEADER.size
+    table_end = pos + table_size
+    for _ in range(facility_count):
+        if pos + NAME_LENGTH.size > table_end:
+            raise ValueError("设施名称表越界")
+        (length,) = NAME_LENGTH.unpack_from(data, pos)
+        pos += NAME_LENGTH.size
+        if pos + length > table_end:
+            raise ValueError("设施名称表越界")
+        names.append(data[pos:pos + length].decode("utf-8"))
+        pos += length
+
+    bookings = []
+    for booking_id, index, start, end in RECORD.iter_unpack(data[table_end:]):
+        if index >= len(names):
+            raise ValueError(f"预订 {booking_id} 引用了不存在的设施 {index}")
+        bookings.append({"booking_id": booking_id, "facility_name": names[index],
+                         "start_time": start, "end_time": end})
+    return version, names, bookings
+
+
+def load_journal(data_dir: str) -> List[Booking]:
+    """Read journal.jsonl; stops at a damaged (torn) last record like the server."""
+    path = os.path.join(data_dir, "journal.jsonl")
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                records.append({key: record[key] for key in ("booking_id", "facility_name",
+                                                             "start_time", "end_time")})
+            except (json.JSONDecodeError, KeyError, TypeError):
+                print(f"警告: 日志第 {number} 行已损坏, 忽略其后的记录")
+                break
+    return records
+
+
+def replay_journal(names: List[str], bookings: List[Booking], records: List[Booking]) -> List[Booking]:
+    """Apply journal records on top of the bookings, as the server does at startup."""
+    by_id = {b["booking_id"]: b for b in bookings}
+    known = set(names)
+    for record in records:
+        # The server skips records of facilities it does not have
+        if record["facility_name"] in known:
+            by_id[record["booking_id"]] = record
+    return sorted(by_id.values(), key=lambda b: b["booking_id"])
+
+
+def write_file_atomic(path: str, contents: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(contents)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def to_binary(data_dir: str, force: bool = False):
+    path = os.path.join(data_dir, "snapshot.bin")
+    if os.path.exists(path) and not force:
+        # The server keeps its state in the snapshot; the JSON files may be stale
+        with open(path, "rb") as f:
+            try:
+                _, names, bookings = decode_snapshot(f.read())
+            except ValueError as e:
+                raise ValueError(f"无法读取已有的 {path} ({e}); 如确需用 JSON 文件重建, 请加 --force")
+        print(f"以已有的 {path} 为基础 (如需用 JSON 文件重建, 请加 --force)")
+    else:
+        names, bookings = load_json(data_dir)
+    records = load_journal(data_dir)
+    bookings = replay_journal(names, bookings, records)
+    write_file_atomic(path, encode_snapshot(names, bookings))
+    if records:
+        # The records are now in the snapshot; replaying them again over it would be redundant
+        write_file_atomic(os.path.join(data_dir, "journal.jsonl"), b"")
+    print(f"✓ 已写入 {path}: {len(names)} 个设施, {len(bookings)} 个预订"
+          f" (含 {len(records)} 条日志记录)")
+
+
+def to_json(data_dir: str):
+    with open(os.path.join(data_dir, "snapshot.bin"), "rb") as f:
+        _, names, bookings = decode_snapshot(f.read())
+    records = load_journal(data_dir)
+    bookings = replay_journal(names, bookings, records)
+
+    # Same layout as the server's JSON files
+    facilities = {name: {"name": name, "bookings": []} for name in names}
+    for b in bookings:
+        facilities[b["facility_name"]]["bookings"].append(b)
+    for filename, value in (("facilities.json", facilities), ("bookings.json", bookings)):
+        text = json.dumps(value, indent=2, sort_keys=True, ensure_ascii=False)
+        write_file_atomic(os.path.join(data_dir, filename), text.encode("utf-8"))
+    print(f"✓ 已导出到 {data_dir}/facilities.json, bookings.json: "
+          f"{len(names)} 个设施, {len(bookings)} 个预订 (含 {len(records)} 条日志记录)")
+
+
+def format_time(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, SERVER_TZ).strftime("%Y-%m-%d %H:%M")
+
+
+def inspect(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    version, names, bookings = decode_snapshot(data)
+
+    print(f"快照: {path} ({len(data)} 字节, 版本 {version})")
+    print(f"设施: {len(names)}, 预订: {len(bookings)}")
+    records = load_journal(os.path.dirname(path) or ".")
+    if records:
+        print(f"注意: journal.jsonl 中还有 {len(records)} 条未压缩的日志记录, 未计入以下统计")
+    if bookings:
+        ids = [b["booking_id"] for b in bookings]
+        print(f"预订ID范围: {ids[0]} - {ids[-1]}")
+        print(f"时间范围: {format_time(min(b['start_time'] for b in bookings))} - "
+              f"{format_time(max(b['end_time'] for b in bookings))}")
+
+    counts = {name: 0 for name in names}
+    for b in bookings:
+        counts[b["facility_name"]] += 1
+    print(f"\n{'设施':<24}{'预订数':>10}")
+    for name in names:
+        print(f"{name:<24}{counts[name]:>10}")
+
+
+if __name__ == "__main__":
+    commands = {"to-binary": to_binary, "to-json": to_json, "inspect": inspect}
+    args = sys.argv[1:]
+    force = "--force" in args
+    if force:
+        args.remove("--force")
+    if len(args) != 2 or args[0] not in commands or (force and args[0] != "to-binary"):
+        print(USAGE)
+        sys.exit(1)
+    try:
+        if force:
+            to_binary(args[1], force=True)
+        else:
+            commands[args[0]](args[1])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"错误: {e}")
+        sys.exit(1)